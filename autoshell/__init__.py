@@ -1,10 +1,32 @@
-from . import cisco
-from . import hp
-from . import common
-from . import connectors
-from . import modules
-from . import __main__
+import sys
+import importlib
+
 from . import __version__
 
 name = "autoshell"
 __version__ = __version__.version
+
+
+# Subpackages which are imported the first time they are used (ie:
+#  autoshell.common.hosts) instead of when autoshell is imported. This keeps
+#  netmiko, paramiko, and jinja2 from being imported just to show the help
+#  menu or to use autoshell.common in a script.
+_LAZY_SUBPACKAGES = ["cisco", "hp", "common", "connectors", "modules",
+                     "__main__"]
+
+
+def __getattr__(attribute):
+    """
+    autoshell.__getattr__ is called for attributes which don't exist yet
+    and imports the lazy subpackages on first use (Python 3.7+).
+    """
+    if attribute in _LAZY_SUBPACKAGES:
+        return importlib.import_module("." + attribute, __name__)
+    raise AttributeError("module '%s' has no attribute '%s'"
+                         % (__name__, attribute))
+
+
+# Module __getattr__ is not supported before Python 3.7. Import everything.
+if sys.version_info < (3, 7):
+    for _subpackage in _LAZY_SUBPACKAGES:
+        importlib.import_module("." + _subpackage, __name__)
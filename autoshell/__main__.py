@@ -5,15 +5,19 @@
 import os
 import sys
 import json
+import signal
 import logging
 import argparse
-import importlib
 
 # Autoshell Libraries
 from . import common
-from . import connectors
 from . import modules
-from . import __version__
+# The package replaces its __version__ module with the version string, so
+#  import the version from the module itself
+from .__version__ import version
+#  autoshell.connectors (and with it netmiko and paramiko) is imported when
+#  it is first needed by build_hosts() or '-v' so '-h' and mistyped
+#  arguments don't have to wait for it
 
 # --- Start all three logging systems
 # log (shared) is used for shared logging of autoshell core components
@@ -24,6 +28,10 @@ datalog = logging.getLogger("data")
 modlog = logging.getLogger("modules")
 
 
+# Seconds between SSH keepalives sent on connections held open by the daemon
+DAEMON_KEEPALIVE = 30
+
+
 # Logging initial setup. More setup is done in autoshell.start_logging
 #  after arg processing
 consoleHandler = logging.StreamHandler()
@@ -37,18 +45,88 @@ consoleHandler.setFormatter(format)
 log.addHandler(consoleHandler)
 
 
-def run_modules(modules, ball):
+def run_modules(modules, ball, streams=None):
     """
     autoshell.run_modules takes control after the initial connections
     complete. It hands control of the MainThread to each module (in order)
     a waits for return of control from each module before moving on to the
-    next one.
+    next one. If modules are streaming (see autoshell.start_streams), any
+    hosts a module added (like crawl) are streamed to them before the next
+    module is run.
     """
     log.debug("autoshell.run_modules: Processing imported modules")
     for module in modules:
+        # Modules which only stream hosts may not have a run() function
+        if "run" not in module["module"].__dict__:
+            log.debug("autoshell.run_modules:\
+ Module (%s) has no 'run' function. Skipping." % module["name"])
+            continue
         log.info("autoshell.run_modules: Running module (%s)" % module["name"])
         # Call the module's run() function and hand it the ball
         module["module"].run(ball)
+        if streams:
+            stream_modules(streams, ball)
+
+
+def start_streams(modules, ball):
+    """
+    autoshell.start_streams starts an autoqueue for each module with a
+    run_host() function and returns them (with the set of hosts already
+    handed to them) for autoshell.stream_modules.
+    """
+    streams = {"queues": [], "fed": set()}
+    for module in modules:
+        log.info("autoshell.start_streams: Streaming hosts to module (%s)"
+                 % module["name"])
+        streams["queues"].append(common.autoqueue.autoqueue(
+            10, _run_host, (module, ball)))
+    return streams
+
+
+def stream_modules(streams, ball):
+    """
+    autoshell.stream_modules feeds each host to the run_host() function of
+    the streaming modules as soon as the host connects, instead of waiting
+    for all connection attempts to complete. Hosts which were already fed to
+    them are skipped. It blocks until all connection attempts (including
+    hosts added by the modules while streaming) are complete and all the
+    run_host() calls have returned.
+    """
+    log.debug("autoshell.stream_modules: Streaming hosts to modules")
+    while True:
+        new_hosts = False
+        for host in ball.hosts.as_completed():
+            if host not in streams["fed"]:
+                streams["fed"].add(host)
+                new_hosts = True
+                for queue in streams["queues"]:
+                    queue.put(host)
+        # Wait for the modules to finish with the hosts handed to them
+        for queue in streams["queues"]:
+            queue.block(kill=False)
+        # If the modules added no new hosts while we waited, we are done
+        if not new_hosts:
+            break
+    # All connection attempts are complete. Make sure the connector
+    #  threads are idle before moving on.
+    ball.hosts.block()
+
+
+def stop_streams(streams):
+    """
+    autoshell.stop_streams stops the autoqueues started by
+    autoshell.start_streams once no more hosts will be streamed.
+    """
+    for queue in streams["queues"]:
+        queue.block()
+
+
+def _run_host(parent, host, module, ball):
+    """
+    autoshell._run_host is the worker function used by stream_modules to
+    call a module's run_host() function with a single connected host.
+    """
+    module["module"].run_host(ball, host)
 
 
 def load_modules(modules, ball):
@@ -71,14 +149,13 @@ def load_modules(modules, ball):
  Module (%s) has no 'load' function. Skipping loading." % module["name"])
 
 
-def main(args, modules):
+def build_hosts(args, keepalive=None):
     """
-    autoshell.main is the primary execution process for autoshell; calling
-    all the different autoshell libraries to assemble credentials and
-    connectors, connect to the hosts, pass control to the modules, then
-    disconnect from the hosts.
+    autoshell.build_hosts assembles the credentials and connectors from the
+    args and instantiates the hosts_class instance with them. No host
+    addresses are loaded yet.
     """
-    log.debug("autoshell.main: Starting main process")
+    from . import connectors
     # Pull credentials from expressions or direct UI
     credentials = common.credentials.parse_credentials(
         args.credentials)
@@ -90,10 +167,41 @@ def main(args, modules):
     # Check timeout argument to see if it was set
     if not args.timeout:
         args.timeout = 30
+    # Check retries argument to see if it was set (0 disables retries)
+    if args.retries is None:
+        args.retries = 2
+    # Check channels argument to see if it was set
+    if not args.channels:
+        args.channels = 1
+    # Phase-specific timeouts which were set in the args
+    timeouts = {}
+    for key in common.hosts.TIMEOUT_KEYS:
+        timeouts.update({key: args.__dict__.get(key)})
+    # Limits used to pace logins so AAA servers don't get overwhelmed
+    limiter = common.ratelimit.limiter(
+        rate_limits=common.ratelimit.parse_limits(args.rate_limit),
+        max_logins=common.ratelimit.parse_limits(args.max_logins))
+    # Hosts which must never be connected to, whether loaded or crawled
+    exclusions = common.exclusions.parse_exclusions(args.exclude)
     # Instantiate hosts with credentials and connectors, no host addresses yet
     hosts_instance = common.hosts.hosts_class(credentials,
                                               connector_dict,
-                                              args.timeout)
+                                              args.timeout,
+                                              prescan=args.prescan,
+                                              timeouts=timeouts,
+                                              keepalive=keepalive,
+                                              channels=args.channels,
+                                              limiter=limiter,
+                                              retries=args.retries,
+                                              exclusions=exclusions)
+    return credentials, hosts_instance
+
+
+def run_job(args, modules, hosts_instance, credentials):
+    """
+    autoshell.run_job loads the modules, connects to the addresses in the
+    args, and passes control to the modules. Connections are left open.
+    """
     # ball is a namespace object used to store all the main data in the program
     #  to make passing those data to modules easier.
     # Here, ball is instantiated as a simple ad-hoc namespace object instance
@@ -105,36 +213,132 @@ def main(args, modules):
     ))()
     # Load all the modules with user-provided data for error checking, etc..
     load_modules(modules, ball)
+    # Modules with a run_host() function are fed hosts as soon as they
+    #  connect instead of waiting for all the connections to complete
+    streaming = []
+    for module in modules:
+        if "run_host" in module["module"].__dict__:
+            streaming.append(module)
     # Load the host addresses into the hosts instance, starting the
     #  process of connecting to each user-provided host using connectors
-    hosts_instance.load(args.addresses)
-    # After control is returned from the host instance, pass control to
-    #  each module in the order in which they were input in the args
-    run_modules(modules, ball)
+    if streaming:
+        streams = start_streams(streaming, ball)
+        hosts_instance.load(args.addresses, block=False)
+        stream_modules(streams, ball)
+        # After the connections complete, pass control to each module in
+        #  the order in which they were input in the args. Hosts added by
+        #  the modules (like crawl) are still streamed.
+        run_modules(modules, ball, streams)
+        stop_streams(streams)
+    else:
+        hosts_instance.load(args.addresses)
+        # After control is returned from the host instance, pass control to
+        #  each module in the order in which they were input in the args
+        run_modules(modules, ball)
+    return ball
+
+
+def dump_hostinfo(hosts_instance):
+    """
+    autoshell.dump_hostinfo dumps the .info of all the hosts to the datalog
+    formatted as JSON.
+    """
+    data = []  # Compile all host info into this list
+    for host in hosts_instance.hosts:
+        # Have the host update its .info var from its other attributes
+        host.update_info()
+        # If there is any info in .info
+        if host.info:
+            data.append(host.info)
+    # Dump host info to datalog formatted as JSON
+    datalog.info(json.dumps(data, indent=4))
+
+
+def dump_metrics():
+    """
+    autoshell.dump_metrics dumps the metrics of all the autoqueues (queue
+    and thread pool usage, wait and service times) to the datalog formatted
+    as JSON.
+    """
+    datalog.info(json.dumps(common.autoqueue.all_metrics(), indent=4))
+
+
+def main(args, modules):
+    """
+    autoshell.main is the primary execution process for autoshell; calling
+    all the different autoshell libraries to assemble credentials and
+    connectors, connect to the hosts, pass control to the modules, then
+    disconnect from the hosts.
+    """
+    log.debug("autoshell.main: Starting main process")
+    credentials, hosts_instance = build_hosts(args)
+    run_job(args, modules, hosts_instance, credentials)
     # Once control is returned from run_modules, gracefully disconnect from
     #  all the hosts
     hosts_instance.disconnect_all()
     # If we are to dump all the host info
     if args.dump_hostinfo:
-        data = []  # Compile all host info into this list
-        for host in hosts_instance.hosts:
-            # Have the host update its .info var from its other attributes
-            host.update_info()
-            # If there is any info in .info
-            if host.info:
-                data.append(host.info)
-        # Dump host info to datalog formatted as JSON
-        datalog.info(json.dumps(data, indent=4))
+        dump_hostinfo(hosts_instance)
+    # If we are to dump the autoqueue metrics
+    if args.dump_metrics:
+        dump_metrics()
     # Graceful exit for compiled versions
     sys.exit()
 
 
-def import_modules(startlogs, parser, config_file_data):
+def daemon(args, modules):
     """
-    autoshell.import_modules finds the "modules" directory and adds it into
-    sys.path, then finds each module argument imports it into the program,
-    and allows the modules to insert parser options. autoshell.import_modules
-    then hands back a list of dictionaries containing the imported modules
+    autoshell.daemon connects to the hosts like autoshell.main, but instead
+    of disconnecting it keeps the connections open (with keepalives) and
+    serves jobs from clients (autoshell --client) on a Unix socket. Each job
+    is parsed like a normal run and its modules are run against the
+    daemon's hosts. Any addresses in the job are added to those hosts.
+    """
+    log.debug("autoshell.daemon: Starting daemon process")
+    credentials, hosts_instance = build_hosts(
+        args, keepalive=DAEMON_KEEPALIVE)
+    run_job(args, modules, hosts_instance, credentials)
+
+    def job(request):
+        # Relative paths in the job are relative to the client
+        os.chdir(request["cwd"])
+        startlogs = []
+        parser, job_args, job_modules = parse_args(
+            startlogs, ["autoshell"] + request["argv"])
+        # Without commands, cmd would prompt for them on the daemon's stdin
+        for module in job_modules:
+            if module["name"] == "cmd" and not job_args.command:
+                log.error("autoshell.daemon:\
+ Jobs using the cmd module must give their commands with '-C'")
+                sys.exit(1)
+        # Don't hand modules connections which have died since the last job.
+        #  Their hosts are forgotten so the job reconnects them if it names
+        #  them again.
+        hosts_instance.check_connections()
+        # Only report metrics for this job. The connector queues keep
+        #  running (and reporting), reset to count this job only.
+        common.autoqueue.clear_metrics()
+        run_job(job_args, job_modules, hosts_instance, credentials)
+        if job_args.dump_hostinfo:
+            dump_hostinfo(hosts_instance)
+        if job_args.dump_metrics:
+            dump_metrics()
+    # Shut down gracefully (disconnecting from hosts) when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    try:
+        common.daemon.serve(args.daemon, job)
+    finally:
+        hosts_instance.disconnect_all()
+    sys.exit()
+
+
+def import_modules(startlogs, parser, module_names):
+    """
+    autoshell.import_modules imports each module named (by
+    autoshell.prescan_args and the config files) using the common.plugins
+    registry, and allows the modules to insert parser options.
+    autoshell.import_modules then hands back a list of dictionaries
+    containing the imported modules
     """
 
     modules = []  # List of dictionaries containing modules
@@ -142,65 +346,11 @@ def import_modules(startlogs, parser, config_file_data):
         "level": "debug",
         "message": "autoshell.import_modules: Starting module imports"
     })
-    # ##### Add Paths ######
-    # Check if we have a directory in this file's working directory
-    #  named "modules"
-    modules_path = os.path.join(
-        os.path.split(os.path.abspath(__file__))[0], "modules")
-    if os.path.isdir(modules_path):
-        # If so, then add that path to the beginning of sys.path so we can
-        #  import from it
-        sys.path = [modules_path] + sys.path
-    # ######################
-    module_names = []  # List of modules names
-    # ##### Find modules from args and import them ######
-    index = 0  # For keeping track of which arg word we are on
-    for word in sys.argv:
-        # If we see "-m" or "--module" as an arg and there is a word after it
-        if (word == "-m" or word == "--module") and len(sys.argv) > index + 1:
-            module_names.append(sys.argv[index + 1])
-        index += 1
-    if "modules" in config_file_data:
-        if type(config_file_data["modules"]) == list:
-            module_names = module_names + config_file_data["modules"]
-        elif type(config_file_data["modules"]) == str:
-            module_names.append(config_file_data["modules"])
-        elif isinstance(config_file_data["modules"], str):
-            # type(u"") is for Py2 unicode compatibility
-            module_names.append(config_file_data["modules"])
-    # ######################
     for name in module_names:
+        modname = name
         try:
-            # Check if the module is a file path
-            isfile = os.path.isfile(name)
-            # Check if the module is a directory path
-            isdir = os.path.isdir(name)
-            # If the arg was a file or directory path
-            if isfile or isdir:
-                startlogs.append({
-                    "level": "debug",
-                    "message": "autoshell.import_modules:\
- Module ({}) is a file".format(name)
-                })
-                # Build the absolute path
-                fullpath = os.path.abspath(name)
-                # Split it into the filename and directory path
-                path, filename = os.path.split(fullpath)
-                # Add the directory into sys.path
-                sys.path.append(path)
-                # And use the filename to create the module name
-                modname = filename.replace(".py", "")
-            # If the args was not a file or directory path
-            else:
-                startlogs.append({
-                    "level": "debug",
-                    "message": "autoshell.import_modules:\
- Module ({}) is not a file".format(name)
-                })
-                # Just use the name for the import
-                modname = name
-            # Import the module by its name
-            module = importlib.import_module(modname)
+            # Find the module (bundled, file path, or plugin) and import it
+            modname, module = common.plugins.import_module(name)
             # If the module has a add_parser_options() function inside
             if "add_parser_options" in module.__dict__:
                 startlogs.append({
@@ -347,23 +497,92 @@ def merge_args(primary_value, secondary_value):
             return primary_value
 
 
-def get_config_files(startlogs):
+def prescan_args(argv):
+    """
+    autoshell.prescan_args walks argv once (before the parser exists) and
+    returns the config files ("-f") and modules ("-m") it names, since both
+    are needed to build the parser. The "--config_file=file" form is found
+    too, but not "-ffile" since other short options (like "-ml") start
+    with the same letters.
+    """
+    found = {"config_files": [], "modules": []}
+    options = {
+        "-f": "config_files", "--config_file": "config_files",
+        "-m": "modules", "--module": "modules"
+    }
+    words = iter(argv[1:])
+    for word in words:
+        if word in options:
+            # The value is the next word (if there is one), which is
+            #  consumed so it is not mistaken for an option itself
+            value = next(words, None)
+            if value is not None:
+                found[options[word]].append(value)
+        elif word.startswith("--") and "=" in word:
+            option, value = word.split("=", 1)
+            if option in options:
+                found[options[option]].append(value)
+    return found
+
+
+def module_names(prescan, config_file_data):
+    """
+    autoshell.module_names returns the names of the modules to import: those
+    from the command-line followed by those from the config files.
+    """
+    names = list(prescan["modules"])
+    config_modules = config_file_data.get("modules")
+    if type(config_modules) == list:
+        names += config_modules
+    elif isinstance(config_modules, str):
+        # isinstance() is for Py2 unicode compatibility
+        names.append(config_modules)
+    return names
+
+
+def load_config_file(startlogs, filename):
+    """
+    autoshell.load_config_file returns the parsed contents of a config file.
+    Parsed config files are cached (see common.cache) by the digest of their
+    contents, so an unchanged config file is only parsed through
+    common.expressions the first time it is used. Config files which define
+    credentials are not cached, so the credentials are never copied out of
+    the file (vaults are the fast way to load many credentials).
+    """
+    with open(filename, "rb") as f:
+        check = common.cache.digest(f.read())
+    name = os.path.abspath(filename)
+    data = common.cache.load("config", name, check)
+    if type(data) == dict and "credentials" in data:
+        # Cached by an earlier version which cached credentials
+        common.cache.discard("config", name)
+        data = None
+    if data is not None:
+        startlogs.append({
+            "level": "debug",
+            "message": "autoshell.load_config_file:\
+ Using cached parse of config file ({})".format(filename)
+        })
+        return data
+    # Process it through the expressions library
+    exp_output = common.expressions.parse_expression(
+        [filename], ["-", ":", "@"])
+    # exp_output should be a list of results with one entry
+    if not exp_output:
+        return None
+    data = exp_output[0]["value"]
+    if type(data) == dict and "credentials" not in data:
+        common.cache.store("config", name, check, data)
+    return data
+
+
+def get_config_files(startlogs, config_files):
     """
-    autoshell.get_config_files retrieves any defined configuration files
-    and returns argument data for later processing.
+    autoshell.get_config_files loads the config files found by
+    autoshell.prescan_args and returns their merged argument data for
+    later processing.
     """
-    config_files = []  # List of interpreted config files
     config_file_data = {}
-    # Find modules from args and import them ######
-    index = 0  # For keeping track of which arg word we are on
-    for word in sys.argv:
-        # If we see "-f" or "--config_file" as an arg and there
-        #   is a word after it
-        if (word == "-f" or word == "--config_file") and len(
-                sys.argv) > index + 1:
-            # Add the entry to the list of config files
-            config_files.append(sys.argv[index + 1])
-        index += 1
     if not config_files:
         startlogs.append({
             "level": "debug",
@@ -387,39 +606,36 @@ def get_config_files(startlogs):
                     "message": "autoshell.process_config_files:\
  Defined config file ({}) exists. Processing...".format(filename)
                 })
-                # Process it through the expressions library
-                exp_output = common.expressions.parse_expression(
-                    [filename], ["-", ":", "@"])
-                startlogs.append({
-                    "level": "debug",
-                    "message": "autoshell.process_config_files:\
- Config file ({}) interpreted by common.expressions:\
- \n{}".format(filename, json.dumps(exp_output, indent=4))
-                })
-                # exp_output should be a list of results with one entry
-                if exp_output:
-                    if type(exp_output[0]["value"]) != dict:
-                        startlogs.append({
-                            "level": "error",
-                            "message": "autoshell.process_config_files:\
+                data = load_config_file(startlogs, filename)
+                if data is None:
+                    continue
+                if type(data) != dict:
+                    startlogs.append({
+                        "level": "error",
+                        "message": "autoshell.process_config_files:\
  Config file ({}) must be a dictionary type! Discarding".format(filename)
-                        })
-                    else:
-                        for key in exp_output[0]["value"]:
-                            # If the key doesnt exist yet
-                            if key not in config_file_data:
-                                # Add it in with the value
-                                config_file_data.update(
-                                    {key: exp_output[0]["value"][key]})
-                            else:  # If the key does exist
-                                # Merge the values together
-                                newval = merge_args(
-                                    config_file_data[key],
-                                    exp_output[0]["value"][key])
-                                # If we got something from the merge
-                                if newval:
-                                    # Replace the value with it
-                                    config_file_data[key] = newval
+                    })
+                else:
+                    # The merged args are dumped (at debug level) once
+                    #  parsing is complete, so only the keys are logged here
+                    startlogs.append({
+                        "level": "debug",
+                        "message": "autoshell.process_config_files:\
+ Config file ({}) defines ({})".format(filename, ", ".join(data))
+                    })
+                    for key in data:
+                        # If the key doesnt exist yet
+                        if key not in config_file_data:
+                            # Add it in with the value
+                            config_file_data.update({key: data[key]})
+                        else:  # If the key does exist
+                            # Merge the values together
+                            newval = merge_args(
+                                config_file_data[key], data[key])
+                            # If we got something from the merge
+                            if newval:
+                                # Replace the value with it
+                                config_file_data[key] = newval
         return config_file_data
 
 
@@ -460,17 +676,37 @@ def check_args(parser, args):
     sys.exit()
 
 
-def start():
+class _version_action(argparse.Action):
     """
-    Start up the AutoShell program by creating the parsing system, importing
-    user-provided modules, parsing the arguments, setting up the logging
-    facilities, and finally calling the main() function.
+    autoshell._version_action prints the versions of AutoShell, Python, and
+    Netmiko (and the available modules) for '-v' and exits. The text is
+    only built when '-v' is used since it needs netmiko imported.
+    """
+    def __call__(self, parser, namespace, values, option_string=None):
+        from . import connectors
+        # Printed to std.out like the standard argparse version action
+        parser._print_message("AutoShell {}\n\
+    Bundled Modules: {}\n\
+    Plugin Modules: {}\n\
+Python: {}\n\
+Netmiko: {}\n\
+    Netmiko Platforms:\n        {}\n".format(
+            version,
+            " ".join(modules.BUNDLED),
+            " ".join(sorted(common.plugins.entry_points())) or "None",
+            sys.version.replace("\n", "\n    "),
+            connectors.cli.netmiko.__version__,
+            "\n        ".join(connectors.cli.netmiko.platforms)),
+            sys.stdout)
+        parser.exit()
+
+
+def parse_args(startlogs, argv):
+    """
+    autoshell.parse_args creates the parsing system, imports the
+    user-provided modules, parses the arguments in argv (including any
+    config files), and returns the parser, the args, and the modules.
     """
-    startlogs = []  # Logs drop here until the logging facilities are ready
-    startlogs.append({
-        "level": "debug",
-        "message": "autoshell.start: Starting Up"
-    })
     # Main arg parser for autoshell
     #  Formatter is removed to prevent whitespace loss
     #  Auto help is removed so it can be added into an argument group
@@ -484,17 +720,13 @@ def start():
     required = parser.add_argument_group('Required Arguments')
     # Optional arguments are not required for the start of the program
     optional = parser.add_argument_group('Optional Arguments')
+    # Find the config files and modules in argv with a single pass
+    prescan = prescan_args(argv)
     # Process any defined config files; prepare to add to args
-    config_file_data = get_config_files(startlogs)
-    # Pull a list of modules from user-provided arguments
-    imp_modules = import_modules(startlogs, parser, config_file_data)
-    # Generate a list of bundled modules to show in -v
-    bundled_mods = []
-    for mod in dir(modules):
-        # If it is not private
-        if mod[0] != "_":
-            # Append it to the list
-            bundled_mods.append(mod)
+    config_file_data = get_config_files(startlogs, prescan["config_files"])
+    # Import the modules from the args and config files
+    imp_modules = import_modules(
+        startlogs, parser, module_names(prescan, config_file_data))
     startlogs.append({
         "level": "debug",
         "message": "autoshell.start: Starting argument parsing"
@@ -505,17 +737,9 @@ def start():
         action="help")
     misc.add_argument(
         "-v", "--version",
-        action="version",
-        version="AutoShell {}\n\
-    Bundled Modules: {}\n\
-Python: {}\n\
-Netmiko: {}\n\
-    Netmiko Platforms:\n        {}".format(
-            __version__.version,
-            " ".join(bundled_mods),
-            sys.version.replace("\n", "\n    "),
-            connectors.cli.netmiko.__version__,
-            "\n        ".join(connectors.cli.netmiko.platforms)))
+        help="show program's version number and exit",
+        nargs=0,
+        action=_version_action)
     required.add_argument(
         'addresses',
         help="""Target hosts (strings or files) (positional)'
@@ -542,15 +766,41 @@ Netmiko: {}\n\
         '-c admin:password123:enablepass@cisco_ios'
         '-c ;$--admin;password123;enablepass$cisco_ios'
         '-c credfile.json'
-        '-c credfile.yml'""",
+        '-c credfile.yml'
+        '-c creds.vault'""",
         metavar='CRED_STRING/FILE',
         dest="credentials",
         action="append")
+    optional.add_argument(
+        "--write_vault",
+        help="""Encrypt the '-c' credentials into a vault file and exit
+    The key is taken from $AUTOSHELL_VAULT_KEY or the key file
+    ($AUTOSHELL_VAULT_KEY_FILE or ~/.autoshell/vault.key), which is
+    created if it does not exist
+    Examples:
+        '-c credfile.yml --write_vault creds.vault'""",
+        metavar='PATH',
+        dest="write_vault")
     optional.add_argument(
         '-u', "--dump_hostinfo",
         help="Dump all host data to stdout as JSON",
         dest="dump_hostinfo",
         action='store_true')
+    optional.add_argument(
+        "--profile",
+        help="""Profile all threads, write a pstats file, and print a summary
+    Examples:
+        '--profile'                  (writes to autoshell.pstats)
+        '--profile /tmp/run.pstats'""",
+        metavar='PSTATS_FILE',
+        nargs='?',
+        const="autoshell.pstats",
+        dest="profile")
+    optional.add_argument(
+        '-U', "--dump_metrics",
+        help="Dump queue and thread pool metrics to stdout as JSON",
+        dest="dump_metrics",
+        action='store_true')
     optional.add_argument(
         '-d', "--debug",
         help="""Set debug level (off by default)
@@ -566,10 +816,11 @@ Netmiko: {}\n\
         action='count')
     optional.add_argument(
         '-m', "--module",
-        help="""Import and use an external module
+        help="""Import and use a module (bundled, file, or installed plugin)
     Examples:
         '-m crawl'
-        '-m /home/user/mymodule.py'""",
+        '-m /home/user/mymodule.py'
+        '-m myplugin'""",
         metavar='MODULE_NAME',
         dest="modules",
         action="append")
@@ -587,6 +838,103 @@ Netmiko: {}\n\
         metavar='TIMEOUT',
         type=int,
         dest="timeout")
+    optional.add_argument(
+        '-tc', "--connect_timeout",
+        help="Set timeout for TCP connection establishment (in seconds)",
+        metavar='TIMEOUT',
+        type=float,
+        dest="connect_timeout")
+    optional.add_argument(
+        '-ta', "--auth_timeout",
+        help="Set timeout for authentication (in seconds)",
+        metavar='TIMEOUT',
+        type=float,
+        dest="auth_timeout")
+    optional.add_argument(
+        '-tb', "--banner_timeout",
+        help="Set timeout for the SSH banner (in seconds)",
+        metavar='TIMEOUT',
+        type=float,
+        dest="banner_timeout")
+    optional.add_argument(
+        '-tr', "--read_timeout",
+        help="Set timeout for reading command output (in seconds)",
+        metavar='TIMEOUT',
+        type=float,
+        dest="read_timeout")
+    optional.add_argument(
+        '-p', "--prescan",
+        help="""Pre-scan TCP port of hosts, discard unreachable ones
+    Examples (timeout in seconds):
+        '-p 1'
+        '-p 0.5'""",
+        metavar='TIMEOUT',
+        type=float,
+        dest="prescan")
+    optional.add_argument(
+        '-ch', "--channels",
+        help="""Max SSH channels (sharing one login) open per host at once
+    Examples (default is 1):
+        '-ch 4'""",
+        metavar='COUNT',
+        type=int,
+        dest="channels")
+    optional.add_argument(
+        '-rt', "--retries",
+        help="""Times to retry a host after a transient connection failure
+    Examples (default is 2):
+        '-rt 0'
+        '-rt 5'""",
+        metavar='COUNT',
+        type=int,
+        dest="retries")
+    optional.add_argument(
+        '-rl', "--rate_limit",
+        help="""Max logins started per second (globally or per scope)
+    Examples:
+        '-rl 10'             (10 per second overall)
+        '-rl credential:2'   (2 per second for each username)
+        '-rl subnet:1'       (1 per second for each /24 or /64)
+        '-rl subnet/16:5'    (5 per second for each /16)""",
+        metavar='[SCOPE:]RATE',
+        dest="rate_limit",
+        action='append')
+    optional.add_argument(
+        '-ml', "--max_logins",
+        help="""Max logins in progress at once (globally or per scope)
+    Examples:
+        '-ml 20'             (20 at once overall)
+        '-ml credential:10'  (10 at once for each username)
+        '-ml subnet/16:4'    (4 at once for each /16)""",
+        metavar='[SCOPE:]COUNT',
+        dest="max_logins",
+        action='append')
+    optional.add_argument(
+        '-x', "--exclude",
+        help="""Hosts to never connect to (strings or files)
+    Examples:
+        '-x 10.1.1.1'
+        '-x 10.2.0.0/16'
+        '-x 10.3.1.1-10.3.1.50'
+        '-x core-router1'
+        '-x excluded_hosts.txt'""",
+        metavar='HOST_ADDRESS/FILE',
+        dest="exclude",
+        action='append')
+    optional.add_argument(
+        "--daemon",
+        help="""Keep host connections open and accept '--client' jobs
+    Examples:
+        '--daemon /tmp/autoshell.sock'""",
+        metavar='SOCKET_PATH',
+        dest="daemon")
+    optional.add_argument(
+        "--client",
+        help="""Submit this run to a '--daemon' listening on a Unix socket
+    Examples:
+        '--client /tmp/autoshell.sock -m cmd -C "show version"'""",
+        metavar='SOCKET_PATH',
+        dest="client")
 #    optional.add_argument(
 #                        '-dt', "--default_type",
 #                        help="""Define default host type(s) (Experimental)
@@ -597,9 +945,24 @@ Netmiko: {}\n\
 #            - Uses 'cisco_ios' if autodiscovery fails""",
 #                        metavar='TYPE',
 #                        dest="default_type")
-    args = parser.parse_args()
+    args = parser.parse_args(argv[1:])
     # Add any arguments found in config files to args
     process_config_files(startlogs, args, config_file_data)
+    return parser, args, imp_modules
+
+
+def start():
+    """
+    Start up the AutoShell program by creating the parsing system, importing
+    user-provided modules, parsing the arguments, setting up the logging
+    facilities, and finally calling the main() function.
+    """
+    startlogs = []  # Logs drop here until the logging facilities are ready
+    startlogs.append({
+        "level": "debug",
+        "message": "autoshell.start: Starting Up"
+    })
+    parser, args, imp_modules = parse_args(startlogs, sys.argv)
     # Set up the logging facilities, which will dump in the startlogs
     start_logging(startlogs, args)
     # Output all the parsed arguments for debugging
@@ -608,13 +971,30 @@ Netmiko: {}\n\
               + "\n##############################\n")
     # Check for arguments. If none were provided, print help and quit
     check_args(parser, args)
+    # Writing a vault only needs the credentials, not any hosts
+    if args.write_vault:
+        sys.exit(common.credentials.write_vault(
+            args.write_vault, args.credentials))
+    # If this is a thin client, hand the whole run to the daemon
+    if args.client:
+        sys.exit(common.daemon.submit(args.client, sys.argv[1:]))
+    if args.profile:
+        common.profiler.start()
     try:
-        # Execute main() with ability to catch user interrupts for an exit
-        main(args, imp_modules)
+        # Execute main() (or daemon()) with ability to catch user
+        #  interrupts for an exit
+        if args.daemon:
+            daemon(args, imp_modules)
+        else:
+            main(args, imp_modules)
     except KeyboardInterrupt:
         log.warning("autoshell.start:\
  Exiting AutoShell program due to user-intervention")
         sys.exit()
+    finally:
+        # main() exits with sys.exit() so write the profile on the way out
+        if args.profile:
+            common.profiler.stop(args.profile)
 
 
 if __name__ == "__main__":
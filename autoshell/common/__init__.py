@@ -1,5 +1,12 @@
 from . import autoqueue
+from . import cache
 from . import credentials
+from . import daemon
+from . import exclusions
 from . import expressions
 from . import hosts
 from . import neighbors
+from . import plugins
+from . import profiler
+from . import ratelimit
+from . import reachability
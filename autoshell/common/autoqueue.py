@@ -8,7 +8,10 @@ termination, and user interruption of activity.
 
 
 import time
+import heapq
+import bisect
 import logging
+import itertools
 import threading
 
 try:
@@ -23,6 +26,40 @@ except ModuleNotFoundError:
 log = logging.getLogger("shared")
 
 
+# common.autoqueue.HISTOGRAM_BUCKETS are the upper bounds (in seconds) of the
+#  buckets used for the wait and service time histograms
+HISTOGRAM_BUCKETS = [0.001, 0.01, 0.1, 1, 10, 60, 300]
+
+# List of the metrics instances of all autoqueues, in order of creation
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def all_metrics():
+    """
+    common.autoqueue.all_metrics returns a list of JSON serializable dicts
+    with the metrics of every autoqueue created (or still running) since
+    clear_metrics() was last called.
+    """
+    with _registry_lock:
+        registered = list(_registry)
+    return [each.get() for each in registered]
+
+
+def clear_metrics():
+    """
+    common.autoqueue.clear_metrics forgets the metrics of the autoqueues
+    whose threads have been stopped, and resets the metrics of those still
+    running (like the connector queues) so they only count what happens
+    from now on. Used by long-running processes to report per job.
+    """
+    with _registry_lock:
+        _registry[:] = [each for each in _registry if not each.stopped]
+        running = list(_registry)
+    for each in running:
+        each.reset()
+
+
 class autoqueue:
     """
     common.autoqueue is a wrapper for the queue library; adding in a
@@ -32,11 +69,21 @@ class autoqueue:
     options to user-interrupt thread activity; gracefully killing the threads
     upon interruption.
     """
-    def __init__(self, thread_count, worker_func, worker_args):
+    def __init__(self, thread_count, worker_func, worker_args, name=None):
         self._thread_count = thread_count
         self._worker_func = worker_func  # Worker function passed in
         self._worker_args = worker_args  # Args for worker function
-        self._queue = queue.Queue(maxsize=0)  # Underlying queue
+        # Name used in the metrics and thread names. Defaults to the worker
+        #  function name.
+        if not name:
+            name = "%s.%s" % (getattr(worker_func, "__module__", None),
+                              getattr(worker_func, "__name__", None))
+        self.name = name
+        self.metrics = metrics(name, thread_count)
+        with _registry_lock:
+            _registry.append(self.metrics)
+        # Underlying priority/delay queue
+        self._queue = scheduler(self.metrics)
         self._auto_threads = []  # List of thread instances
         self._start_threads()
 
@@ -49,14 +96,34 @@ class autoqueue:
         log.debug("common.autoqueue._start_threads:\
  Starting %s threads" % str(self._thread_count))
         for i in range(0, self._thread_count):
+            # Name the threads after the queue so they can be told apart
+            #  in logs, profiles, and py-spy dumps
             auto_thread = autothread(self._worker_func,
                                      self._worker_args,
-                                     self._queue)
+                                     self._queue,
+                                     self,
+                                     "%s-%s" % (self.name.split(".")[-1], i))
             self._auto_threads.append(auto_thread)
 
-    def put(self, item):
-        # Mimic feel of a Queue instance
-        self._queue.put(item)
+    def get_metrics(self):
+        """
+        common.autoqueue.get_metrics returns a JSON serializable dict of the
+        counters and histograms kept for this autoqueue.
+        """
+        return self.metrics.get()
+
+    def put(self, item, delay=None, priority=0, not_before=None):
+        """
+        common.autoqueue.put adds an item to the queue. Items with a lower
+        priority number are handed to the threads first, and items with the
+        same priority are handed out in the order they were put in. If a
+        delay (in seconds) or a not_before time (a time.time() timestamp) is
+        set, the item is held back until then without tying up a thread
+        while waiting. block() waits for held back items.
+        """
+        if delay:
+            not_before = max(not_before or 0, time.time() + delay)
+        self._queue.put(item, priority=priority, not_before=not_before)
 
     def get(self, item):
         # Mimic feel of a Queue instance
@@ -69,6 +136,7 @@ class autoqueue:
         It allows a interruption of the process to force the unblocking of
         the calling thread.
         """
+        self.metrics.stopped = True
         for athread in self._auto_threads:
             # Tell all supervisors to terminate their thread
             athread.terminate = True  # Set terminate flag
@@ -93,16 +161,30 @@ class autoqueue:
         log.debug("common.autoqueue._kill_all:\
  All threads shut down gracefully. Continuing ")
 
-    def block(self, kill=True):
+    def block(self, kill=True, timeout=None):
         """
         common.autoqueue.block is called externally and is used to block the
         calling thread until all the queue is empty and all threads are idle.
+        If a timeout (in seconds) is set and expires first, the threads are
+        told to terminate (if kill is set) without waiting for them, and
+        False is returned. Otherwise True is returned.
         """
         log.debug("common.autoqueue.block:\
  Blocking until queue emptied and threads idle")
         busy = True  # Initially set to true to start blocking
+        if timeout is not None:
+            deadline = time.time() + timeout
         try:
             while busy:
+                if timeout is not None and time.time() > deadline:
+                    log.warning("common.autoqueue.block:\
+ Timed out after (%s) seconds with work remaining" % timeout)
+                    if kill:
+                        # Don't wait on threads which may be stuck
+                        self.metrics.stopped = True
+                        for athread in self._auto_threads:
+                            athread.terminate = True
+                    return False
                 if self._queue.empty():
                     busy = False  # Initially set to False
                     for athread in self._auto_threads:
@@ -130,6 +212,7 @@ class autoqueue:
             else:
                 log.debug("common.autoqueue.block:\
  Not killing threads. Continuing...")
+        return True
 
 
 class autothread:
@@ -139,7 +222,8 @@ class autothread:
     from a queue, and terminating the thread when instructed. common.autothread
     is used by the common.autoqueue class for threading
     """
-    def __init__(self, worker_func, worker_args, worker_queue):
+    def __init__(self, worker_func, worker_args, worker_queue,
+                 autoqueue=None, name=None):
         self.idle = False
         self.alive = True
         self.terminate = False
@@ -149,7 +233,10 @@ class autothread:
         else:
             self._worker_args = worker_args  # Args for worker function
         self._queue = worker_queue  # Queue containing items for worker
-        self.thread = threading.Thread(target=self._supervisor)
+        # The autoqueue instance which owns this thread. Lets the worker
+        #  function put items back in the queue (ie: with a delay).
+        self.autoqueue = autoqueue
+        self.thread = threading.Thread(target=self._supervisor, name=name)
         self.thread.daemon = True
         self.thread.start()
 
@@ -163,17 +250,26 @@ class autothread:
         while not self.terminate:
             self.idle = True  # Assume we are idle, trip if not
             try:
-                # Will throw a Queue.Empty exception if queue is empty
-                item = self._queue.get_nowait()
+                # Will throw a Queue.Empty exception if nothing is ready
+                #  within a second
+                item = self._queue.get(timeout=1)
                 # If no exception, then we are not idle
                 self.idle = False
+                item_metrics = getattr(self.autoqueue, "metrics", None)
+                if item_metrics:
+                    item_metrics.started()
+                started = time.time()
+                failed = False
                 # Protect supervisor from exception
                 try:
                     self._worker_func(self, item, *self._worker_args)
                 except Exception as e:
+                    failed = True
                     # Log exception to logging facility
                     log.exception('common.autoqueue.autothread._supervisor:\
  Exception raised in %s:' % threading.current_thread().name)
+                if item_metrics:
+                    item_metrics.finished(time.time() - started, failed)
                 # Give a second before setting idle in case _worker_func
                 #  put something back in the queue and we need to
                 #  detect it in autoqueue.block
@@ -181,10 +277,217 @@ class autothread:
                 # Now we are idle again
                 self.idle = True
             except queue.Empty:
-                # Kill time to keep CPU from going to 100%
-                time.sleep(1)
+                # Nothing to do. Loop back around to check self.terminate.
+                pass
         # self.terminate was marked true. Shut down gracefully now
         log.debug('common.autoqueue.autothread._supervisor:\
  Thread terminating')
         self.idle = True
         self.alive = False
+
+
+class scheduler:
+    """
+    common.autoqueue.scheduler is the heap-backed queue used by autoqueue.
+    Items are handed out by priority (lowest number first), then in the
+    order they were put in. Items with a not_before time are held in a
+    separate heap until that time arrives.
+    """
+    def __init__(self, metrics=None):
+        self._metrics = metrics  # metrics instance to record waits in
+        # Heap of (priority, sequence, ready time, item)
+        self._ready = []
+        # Heap of (not_before, sequence, priority, item)
+        self._waiting = []
+        self._sequence = itertools.count()  # Keeps ordering FIFO (and stable)
+        self._cond = threading.Condition()
+
+    def put(self, item, priority=0, not_before=None):
+        """
+        common.autoqueue.scheduler.put adds an item to the scheduler and
+        wakes up a waiting thread.
+        """
+        with self._cond:
+            sequence = next(self._sequence)
+            now = time.time()
+            if not_before and not_before > now:
+                heapq.heappush(self._waiting,
+                               (not_before, sequence, priority, item))
+            else:
+                heapq.heappush(self._ready, (priority, sequence, now, item))
+            if self._metrics:
+                self._metrics.enqueued()
+            # Wake everyone since the next due time may have changed
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        common.autoqueue.scheduler.get returns the next ready item, waiting
+        up to timeout (in seconds) for one. Raises queue.Empty if no item is
+        ready in time.
+        """
+        if timeout is not None:
+            deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                # Move any held back items which are now due
+                while self._waiting and self._waiting[0][0] <= now:
+                    not_before, sequence, priority, item = heapq.heappop(
+                        self._waiting)
+                    # Time waiting is counted from when the item was due
+                    heapq.heappush(self._ready,
+                                   (priority, sequence, not_before, item))
+                if self._ready:
+                    priority, sequence, ready, item = heapq.heappop(
+                        self._ready)
+                    if self._metrics:
+                        self._metrics.waited(now - ready)
+                    return item
+                # Sleep until the next item is due, a new item is put in,
+                #  or the timeout expires
+                wait = None
+                if self._waiting:
+                    wait = self._waiting[0][0] - now
+                if timeout is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise queue.Empty
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def get_nowait(self):
+        # Mimic feel of a Queue instance
+        return self.get(timeout=0)
+
+    def empty(self):
+        """
+        common.autoqueue.scheduler.empty returns True only if there are no
+        items, including held back ones.
+        """
+        with self._cond:
+            return not (self._ready or self._waiting)
+
+    def qsize(self):
+        # Mimic feel of a Queue instance
+        with self._cond:
+            return len(self._ready) + len(self._waiting)
+
+
+class metrics:
+    """
+    common.autoqueue.metrics keeps the counters and latency histograms for
+    an autoqueue: how many items were put in, completed, or raised an
+    exception, how many are being worked on, how long items waited in the
+    queue once ready (wait time), and how long the worker function took
+    with them (service time).
+    """
+    def __init__(self, name, thread_count):
+        self.name = name  # Name of the autoqueue
+        self.thread_count = thread_count  # Number of threads in the pool
+        self.counters = {
+            "enqueued": 0,  # Items put in the queue
+            "completed": 0,  # Items the worker function returned from
+            "failed": 0,  # Items the worker function raised an exception on
+            "in_flight": 0,  # Items being worked on right now
+            "max_in_flight": 0  # Most items worked on at once
+        }
+        self.wait_time = histogram()  # Seconds from ready to started
+        self.service_time = histogram()  # Seconds in the worker function
+        self.stopped = False  # Set once the autoqueue threads are stopped
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """
+        common.autoqueue.metrics.reset zeroes the counters and histograms.
+        Items still being worked on stay counted as in flight.
+        """
+        with self._lock:
+            for key in self.counters:
+                if key != "in_flight":
+                    self.counters[key] = 0
+            self.counters["max_in_flight"] = self.counters["in_flight"]
+            self.wait_time = histogram()
+            self.service_time = histogram()
+
+    def enqueued(self):
+        # Called by the scheduler when an item is put in
+        with self._lock:
+            self.counters["enqueued"] += 1
+
+    def waited(self, seconds):
+        # Called by the scheduler when a ready item is handed out
+        with self._lock:
+            self.wait_time.add(seconds)
+
+    def started(self):
+        # Called by the autothread before calling the worker function
+        with self._lock:
+            self.counters["in_flight"] += 1
+            self.counters["max_in_flight"] = max(
+                self.counters["max_in_flight"], self.counters["in_flight"])
+
+    def finished(self, seconds, failed=False):
+        # Called by the autothread after the worker function returns
+        with self._lock:
+            self.counters["in_flight"] -= 1
+            if failed:
+                self.counters["failed"] += 1
+            else:
+                self.counters["completed"] += 1
+            self.service_time.add(seconds)
+
+    def get(self):
+        """
+        common.autoqueue.metrics.get returns a JSON serializable copy of the
+        metrics.
+        """
+        with self._lock:
+            result = {"name": self.name, "threads": self.thread_count}
+            result.update(self.counters)
+            result.update({
+                "wait_time": self.wait_time.get(),
+                "service_time": self.service_time.get()
+            })
+        return result
+
+
+class histogram:
+    """
+    common.autoqueue.histogram counts values (in seconds) into the buckets
+    in HISTOGRAM_BUCKETS and keeps their count, sum, and maximum. It is not
+    thread-safe on its own. common.autoqueue.metrics locks around it.
+    """
+    def __init__(self):
+        # One count per bucket, plus one for values above the last bucket
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        index = bisect.bisect_left(HISTOGRAM_BUCKETS, value)
+        self.buckets[index] += 1
+
+    def get(self):
+        """
+        common.autoqueue.histogram.get returns a JSON serializable dict with
+        the bucket counts keyed by their upper bound.
+        """
+        buckets = {}
+        for bound, count in zip(HISTOGRAM_BUCKETS, self.buckets):
+            buckets.update({"<=%s" % bound: count})
+        buckets.update({">%s" % HISTOGRAM_BUCKETS[-1]: self.buckets[-1]})
+        mean = 0
+        if self.count:
+            mean = self.sum / self.count
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(mean, 6),
+            "max": round(self.max, 6),
+            "buckets": buckets
+        }
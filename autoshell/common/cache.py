@@ -0,0 +1,133 @@
+#!/usr/bin/python
+
+"""
+The common.cache library contains functions used to keep the results of
+slow, repeatable work (like parsing config files) on disk between runs of
+AutoShell, so repeated (ie: cron) runs with the same inputs can reuse them.
+Each entry is a JSON file stored under a namespace and a name, along with
+a digest of the input it was built from. An entry is only used while the
+digest still matches, so a changed input is rebuilt (and replaces the old
+entry) instead of piling up entries.
+
+The cache is kept in $AUTOSHELL_CACHE_DIR, or in autoshell/ under
+$XDG_CACHE_HOME (~/.cache by default). Setting $AUTOSHELL_CACHE_DIR to an
+empty string disables it. The cache is only ever an optimization, so any
+failure to read or write it is logged and ignored.
+"""
+
+
+# Built-In Libraries
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+
+# log (shared) is used for shared logging of autoshell core components
+log = logging.getLogger("shared")
+
+
+def cache_dir():
+    """
+    common.cache.cache_dir returns the directory the cache is kept in, or
+    None if the cache is disabled.
+    """
+    if "AUTOSHELL_CACHE_DIR" in os.environ:
+        return os.environ["AUTOSHELL_CACHE_DIR"] or None
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "autoshell")
+
+
+def digest(data):
+    """
+    common.cache.digest returns the hex SHA-256 digest of data (bytes or a
+    string).
+    """
+    if not isinstance(data, bytes):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def entry_path(namespace, name):
+    """
+    common.cache.entry_path returns the path of the entry for name (like a
+    file path) in namespace, or None if the cache is disabled.
+    """
+    directory = cache_dir()
+    if not directory:
+        return None
+    return os.path.join(directory, namespace, digest(name) + ".json")
+
+
+def load(namespace, name, check):
+    """
+    common.cache.load returns the data cached for name in namespace if it
+    was stored with the same check digest, otherwise None.
+    """
+    path = entry_path(namespace, name)
+    if not path:
+        return None
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if type(entry) != dict or entry.get("check") != check:
+        return None
+    log.debug("common.cache.load: Using cached (%s) for (%s)"
+              % (namespace, name))
+    return entry.get("data")
+
+
+def store(namespace, name, check, data):
+    """
+    common.cache.store caches data for name in namespace along with the
+    check digest. Data which would not come back the same from JSON (like
+    dates or non-string keys) is not cached. Returns True if it was stored.
+    """
+    path = entry_path(namespace, name)
+    if not path:
+        return False
+    try:
+        text = json.dumps({"check": check, "data": data})
+        if json.loads(text)["data"] != data:
+            log.debug("common.cache.store:\
+ (%s) for (%s) does not survive JSON. Not caching" % (namespace, name))
+            return False
+        # The data may still be sensitive (like hostnames), so the cache is
+        #  only readable by its owner
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        # Write to a temp file and rename it into place so a concurrent run
+        #  never reads a partial entry. The file is created with 0600.
+        handle, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            os.fchmod(handle, 0o600)
+            with os.fdopen(handle, "w") as f:
+                f.write(text)
+            os.replace(temp, path)
+        except Exception:
+            os.remove(temp)
+            raise
+    except (IOError, OSError, TypeError, ValueError) as e:
+        log.debug("common.cache.store:\
+ Could not cache (%s) for (%s): %s" % (namespace, name, e))
+        return False
+    return True
+
+
+def discard(namespace, name):
+    """
+    common.cache.discard removes the entry for name in namespace, if there
+    is one.
+    """
+    path = entry_path(namespace, name)
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except (IOError, OSError):
+        pass
@@ -4,6 +4,12 @@
 The common.credentials library contains classes and functions used for parsing
 user-provided expressions into credentials using direct-string-input, files,
 or even retrieving information directly from the CLI.
+
+Credentials can also be kept in an encrypted vault file (see write_vault),
+which holds already normalized credentials as encrypted JSON. A vault is
+decrypted once per process (see load_vault) no matter how many times it is
+referenced, and loading it skips the expression and YAML parsing of plain
+credential files.
 """
 
 
@@ -13,6 +19,7 @@ import json
 import yaml
 import getpass
 import logging
+import threading
 from builtins import input
 
 # Autoshell Libraries
@@ -23,6 +30,22 @@ from . import expressions
 log = logging.getLogger("shared")
 
 
+# First line of an encrypted credential vault file
+VAULT_HEADER = "AUTOSHELL-VAULT-1"
+
+# Environment variable holding the vault key itself
+VAULT_KEY_ENV = "AUTOSHELL_VAULT_KEY"
+
+# Environment variable holding the path of the vault key file
+VAULT_KEY_FILE_ENV = "AUTOSHELL_VAULT_KEY_FILE"
+
+# Vault key file used when neither environment variable is set
+VAULT_KEY_FILE = os.path.join("~", ".autoshell", "vault.key")
+
+_vaults = {}  # Decrypted vaults keyed by (path, modified time, size)
+_vaults_lock = threading.Lock()
+
+
 def parse_credentials(inputs):
     """
     common.credentials.parse_credentials is the externally called function
@@ -31,20 +54,243 @@ def parse_credentials(inputs):
     or parse the expression itself as a credential. If the input is empty,
     parse_credentials will query the CLI directly for credentials.
     """
-    log.debug("common.credentials.parse_credentials:\
+    # The dumps are skipped unless they will be logged since there may be
+    #  thousands of credentials
+    debug = log.isEnabledFor(logging.DEBUG)
+    if debug:
+        log.debug("common.credentials.parse_credentials:\
  Parsing inputs:\n%s" % json.dumps(inputs, indent=4))
     if not inputs:
         # If an empty input exists, prompt the CLI for credentials
-        result = [_add_cred_ui()]
-        log.debug("common.credentials.parse_credentials:\
- Returning:\n%s" % json.dumps(result, indent=4))
-        return result
+        result = credential_set([_add_cred_ui()])
     else:
         # If the input has data, parse those data as expressions
-        result = _add_cred_exp(inputs)
+        result = credential_set(_add_cred_exp(inputs))
+    if debug:
         log.debug("common.credentials.parse_credentials:\
  Returning:\n%s" % json.dumps(result, indent=4))
+    return result
+
+
+class credential_set(list):
+    """
+    common.credentials.credential_set is the list of credentials returned
+    by parse_credentials. It also keeps the credentials bucketed by type so
+    ordered() can give a connector the credentials for a host in order of
+    preference without sorting through all of them for every host.
+    """
+    def __init__(self, credentials=()):
+        list.__init__(self, credentials)
+        self._orders = {}  # Ordered credentials keyed by type order
+        self._buckets = None  # Credentials keyed by type (None if untyped)
+        self._lock = threading.Lock()
+
+    def buckets(self):
+        """
+        common.credentials.credential_set.buckets returns a dict of the
+        credentials keyed by their type (None for untyped credentials), each
+        in the order they were given.
+        """
+        with self._lock:
+            if self._buckets is None:
+                buckets = {}
+                for credential in self:
+                    # Blank types are untyped, like in the connectors
+                    buckets.setdefault(credential["type"] or None,
+                                       []).append(credential)
+                self._buckets = buckets
+            return self._buckets
+
+    def ordered(self, type_order):
+        """
+        common.credentials.credential_set.ordered returns the credentials in
+        order of preference for a host: first the credentials with a type in
+        type_order (in that order), then the untyped credentials, then the
+        credentials with a type not in type_order. The result is kept for
+        the next host with the same type order, and must not be changed.
+        """
+        key = tuple(type_order)
+        result = self._orders.get(key)
+        if result is not None:
+            return result
+        buckets = self.buckets()
+        seen = set([None])
+        result = []
+        for ctype in type_order:
+            if ctype not in seen and ctype in buckets:
+                result += buckets[ctype]
+            seen.add(ctype)
+        result += buckets.get(None, [])
+        # Types not in type_order keep the order they were given in
+        result += [each for each in self if (each["type"] or None) not in seen]
+        with self._lock:
+            self._orders[key] = result
+        return result
+
+    def _changed(self):
+        """
+        common.credentials.credential_set._changed throws away the buckets
+        and orders when the credentials are changed.
+        """
+        with self._lock:
+            self._orders = {}
+            self._buckets = None
+
+
+def _invalidating(name):
+    """
+    common.credentials._invalidating wraps the list method called name so
+    a credential_set throws away its buckets and orders when changed.
+    """
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._changed()
         return result
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ["append", "extend", "insert", "remove", "pop", "clear", "sort",
+              "reverse", "__setitem__", "__delitem__", "__iadd__"]:
+    setattr(credential_set, _name, _invalidating(_name))
+
+
+def write_vault(path, inputs):
+    """
+    common.credentials.write_vault parses the credential inputs (prompting
+    the CLI if there are none) and writes them, normalized, into an
+    encrypted vault file at path. The key is taken from the environment or
+    the key file (see _vault_key), which is created if it does not exist.
+    Returns an exit code.
+    """
+    credentials = parse_credentials(inputs)
+    try:
+        fernet = _fernet(_vault_key(create=True))
+    except ValueError as e:
+        log.critical("common.credentials.write_vault: %s" % e)
+        return 1
+    token = fernet.encrypt(json.dumps(list(credentials)).encode("utf-8"))
+    # Only the owner may read the vault, like the key file
+    handle = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(handle, "w") as f:
+        f.write("%s\n%s\n" % (VAULT_HEADER, token.decode("ascii")))
+    log.warning("common.credentials.write_vault:\
+ Wrote (%s) credentials to vault (%s)" % (len(credentials), path))
+    return 0
+
+
+def is_vault(path):
+    """
+    common.credentials.is_vault returns True if path is a credential vault
+    file.
+    """
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return False
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(VAULT_HEADER)) == VAULT_HEADER.encode("ascii")
+    except (IOError, OSError):
+        return False
+
+
+def load_vault(path):
+    """
+    common.credentials.load_vault returns the credentials in the vault file
+    at path. Each vault is only decrypted once; after that the credentials
+    are returned from memory until the file changes. An empty list is
+    returned (and the error logged) if the vault can't be decrypted.
+    """
+    stats = os.stat(path)
+    key = (os.path.abspath(path), stats.st_mtime, stats.st_size)
+    with _vaults_lock:
+        if key in _vaults:
+            return _vaults[key]
+        try:
+            with open(path, "rb") as f:
+                token = f.read()[len(VAULT_HEADER):].strip()
+            credentials = json.loads(_decrypt(_vault_key(), token))
+        except ValueError as e:
+            log.error("common.credentials.load_vault:\
+ Could not decrypt vault (%s): %s" % (path, e))
+            return []
+        # Vault credentials were normalized when the vault was written
+        credentials = [each for each in credentials if type(each) == dict]
+        _vaults[key] = credentials
+    log.debug("common.credentials.load_vault:\
+ Decrypted (%s) credentials from vault (%s)" % (len(credentials), path))
+    return credentials
+
+
+def _vault_key(create=False):
+    """
+    common.credentials._vault_key returns the vault key from the
+    AUTOSHELL_VAULT_KEY environment variable, or from the key file (the
+    AUTOSHELL_VAULT_KEY_FILE environment variable, or ~/.autoshell/vault.key
+    by default). If create is True and there is no key, a new one is
+    written to the key file. ValueError is raised if there is no key.
+    """
+    if os.environ.get(VAULT_KEY_ENV):
+        return os.environ[VAULT_KEY_ENV].strip().encode("ascii")
+    path = os.path.expanduser(
+        os.environ.get(VAULT_KEY_FILE_ENV) or VAULT_KEY_FILE)
+    if os.path.isfile(path):
+        # Like SSH keys, warn if others are able to read the key
+        if os.name == "posix" and os.stat(path).st_mode & 0o077:
+            log.warning("common.credentials._vault_key:\
+ Vault key file (%s) can be read by other users. It should be mode 600"
+                        % path)
+        with open(path, "rb") as f:
+            return f.read().strip()
+    if not create:
+        raise ValueError("No vault key. Set %s or create the key file (%s)"
+                         % (VAULT_KEY_ENV, path))
+    key = _fernet_class().generate_key()
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    handle = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(handle, "wb") as f:
+        f.write(key + b"\n")
+    log.warning("common.credentials._vault_key:\
+ Created new vault key file (%s). Keep it safe; vaults can't be opened\
+ without it" % path)
+    return key
+
+
+def _fernet_class():
+    """
+    common.credentials._fernet_class returns the Fernet class from the
+    cryptography library (installed along with Paramiko), which is only
+    imported when a vault is used. ValueError is raised if it is missing.
+    """
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        raise ValueError("Credential vaults need the 'cryptography' library")
+    return Fernet
+
+
+def _fernet(key):
+    """
+    common.credentials._fernet returns a Fernet instance for key. ValueError
+    is raised if the key is malformed.
+    """
+    return _fernet_class()(key)
+
+
+def _decrypt(key, token):
+    """
+    common.credentials._decrypt returns the decrypted text of a vault token.
+    ValueError is raised if the key is wrong or the token is damaged.
+    """
+    fernet = _fernet(key)
+    from cryptography.fernet import InvalidToken
+    try:
+        return fernet.decrypt(token).decode("utf-8")
+    except InvalidToken:
+        raise ValueError("Wrong vault key or damaged vault")
 
 
 def _add_cred_exp(inputs):
@@ -59,12 +305,17 @@ def _add_cred_exp(inputs):
     #  relative to the provided delineators ("-", ":", "@").
     if type(inputs) == type("") or type(inputs) == type(u""):
         inputs = [inputs]
-    for response in expressions.parse_expression(inputs, ["-", ":", "@"]):
-        if response["type"] == "string":
-            result.append(_process_string_exps(response["value"]))
-        if response["type"] == "file":
-            for cred in _process_file_exps(response["value"]):
-                result.append(cred)
+    for each in inputs:
+        # Vaults are decrypted here instead of parsed as expressions
+        if is_vault(each):
+            result += load_vault(each)
+            continue
+        for response in expressions.parse_expression([each], ["-", ":", "@"]):
+            if response["type"] == "string":
+                result.append(_process_string_exps(response["value"]))
+            if response["type"] == "file":
+                for cred in _process_file_exps(response["value"]):
+                    result.append(cred)
     return result
 
 
@@ -0,0 +1,164 @@
+#!/usr/bin/python
+
+"""
+The common.daemon library contains classes and functions used to run
+AutoShell as a long-running daemon which holds its host connections open,
+and to submit module runs to that daemon from a thin client over a Unix
+socket. Requests and responses are sent as one JSON object per line.
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import json
+import socket
+import logging
+
+
+# log (shared) is used for shared logging of autoshell core components
+log = logging.getLogger("shared")
+# datalog is used only to output parsable JSON data
+datalog = logging.getLogger("data")
+# modlog is used for logging inside of user-written modules
+modlog = logging.getLogger("modules")
+
+
+def serve(path, job_func):
+    """
+    common.daemon.serve listens on the Unix socket at path and handles client
+    requests one at a time, until interrupted. Each request dict is handed
+    to job_func, while all logging output (shared, modules, and data) is
+    streamed back to the client.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        log.critical("common.daemon.serve:\
+ Unix sockets are not supported on this platform")
+        return None
+    # Remove a stale socket file left behind by a previous daemon
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # The daemon holds authenticated sessions. Only allow our own user in.
+    #  The socket is created without group or other permissions (instead
+    #  of changing them after bind()) so there is no moment when others
+    #  could connect.
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    os.chmod(path, 0o600)
+    server.listen(5)
+    log.warning("common.daemon.serve: Listening for jobs on (%s)" % path)
+    try:
+        while True:
+            client, address = server.accept()
+            try:
+                _handle(client, job_func)
+            except Exception:
+                log.exception("common.daemon.serve:\
+ Exception raised while handling a job:")
+            finally:
+                client.close()
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _handle(client, job_func):
+    """
+    common.daemon._handle reads a request from a connected client, runs it
+    through job_func with the logging output redirected to the client, and
+    sends back the exit code.
+    """
+    stream = client.makefile("rw")
+    request = json.loads(stream.readline())
+    log.info("common.daemon._handle: Received job:\n%s"
+             % json.dumps(request["argv"]))
+    handler = _client_handler(stream)
+    loggers = [log, modlog, datalog]
+    for logger in loggers:
+        logger.addHandler(handler)
+    code = 0
+    try:
+        job_func(request)
+    except SystemExit as e:
+        # argparse and modules may try to exit. Just end the job.
+        if e.code:
+            code = e.code
+    except Exception:
+        log.exception("common.daemon._handle: Job failed:")
+        code = 1
+    finally:
+        for logger in loggers:
+            logger.removeHandler(handler)
+    _send(stream, {"exit": code})
+
+
+def submit(path, argv):
+    """
+    common.daemon.submit is used by the thin client to send argv (and the
+    current working directory, so relative paths still work) to the daemon
+    listening at path. It prints the output of the job as it arrives and
+    returns the exit code of the job.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except socket.error as e:
+        log.critical("common.daemon.submit:\
+ Could not connect to daemon at (%s): %s" % (path, e))
+        return 1
+    stream = client.makefile("rw")
+    _send(stream, {"argv": argv, "cwd": os.getcwd()})
+    code = 1
+    for line in stream:
+        response = json.loads(line)
+        if "exit" in response:
+            code = response["exit"]
+            break
+        # Data goes to std.out and everything else to std.err, just like
+        #  a normal run
+        if response["stream"] == "data":
+            sys.stdout.write(response["message"] + "\n")
+            sys.stdout.flush()
+        else:
+            sys.stderr.write(response["message"] + "\n")
+    client.close()
+    return code
+
+
+def _send(stream, data):
+    """
+    common.daemon._send writes a dict to the socket stream as a JSON line.
+    """
+    stream.write(json.dumps(data) + "\n")
+    stream.flush()
+
+
+class _client_handler(logging.Handler):
+    """
+    common.daemon._client_handler is a logging handler which sends each
+    record to the connected client. Records from the data logger are sent
+    raw so they can be piped like a normal run.
+    """
+    def __init__(self, stream):
+        logging.Handler.__init__(self)
+        self._stream = stream
+        self.setFormatter(logging.Formatter(
+            "%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]\
+  %(message)s"))
+
+    def emit(self, record):
+        try:
+            if record.name == "data":
+                _send(self._stream, {"stream": "data",
+                                     "message": record.getMessage()})
+            else:
+                _send(self._stream, {"stream": "log",
+                                     "message": self.format(record)})
+        except Exception:
+            # The client went away. Keep running the job.
+            pass
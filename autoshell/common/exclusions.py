@@ -0,0 +1,189 @@
+#!/usr/bin/python
+
+"""
+The common.exclusions library contains classes and functions used to keep
+AutoShell from ever connecting to certain hosts. Exclusions can be single
+addresses, DNS names, CIDR networks, or address ranges, given as strings or
+in files. They are compiled into an index of sorted, merged address intervals
+so each check (made by common.hosts.add_host for every loaded or crawled host)
+is a binary search, no matter how many exclusions there are.
+"""
+
+
+# Built-In Libraries
+import bisect
+import logging
+import ipaddress
+
+# Autoshell Libraries
+from . import expressions
+
+
+# log (shared) is used for shared logging of autoshell core components
+log = logging.getLogger("shared")
+
+
+def parse_exclusions(inputs):
+    """
+    common.exclusions.parse_exclusions parses the exclusion inputs (strings
+    or files, from the CLI or a config file) and returns a compiled
+    exclusion_index. Structured files may be a list of strings, or of
+    address dicts like a structured address file.
+    """
+    index = exclusion_index()
+    if inputs is None:
+        inputs = []
+    # Config files may have a single value instead of a list
+    elif type(inputs) != list:
+        inputs = [inputs]
+    # Exclusions have no values to split, so newlines (which can't appear in
+    #  a string or line) are used as the delineators. IPv6 addresses are not
+    #  split on their colons that way.
+    for response in expressions.iter_expression(inputs, ["\n", "\n", "\n"]):
+        if response["type"] == "string":
+            index.add(response["value"][0][0])
+        elif response["type"] == "file":
+            for entry in _listify(response["value"]):
+                # Address dicts (like in an address file) or plain strings
+                if type(entry) == dict:
+                    entry = entry.get("address")
+                for address in _listify(entry):
+                    if address is not None:
+                        index.add(address)
+    index.compile()
+    if len(index):
+        log.info("common.exclusions.parse_exclusions:\
+ Loaded (%s) exclusions" % len(index))
+    return index
+
+
+def parse_range(address):
+    """
+    common.exclusions.parse_range returns the first and last addresses (as
+    ipaddress objects) of an address range in the format 'first-last'
+    (10.1.1.1-10.1.1.200) or 'first-last_octet' (10.1.1.1-200). None is
+    returned if the address is not a range (like a DNS name with a dash in
+    it) and ValueError is raised if the range is malformed.
+    """
+    if "-" not in address:
+        return None
+    first, last = address.split("-", 1)
+    try:
+        first = ipaddress.ip_address(first.strip())
+    except ValueError:
+        return None
+    last = last.strip()
+    # The short form only gives the last octet
+    if first.version == 4 and last.isdigit():
+        last = "%s.%s" % (str(first).rsplit(".", 1)[0], last)
+    last = ipaddress.ip_address(last)
+    if last.version != first.version or last < first:
+        raise ValueError("Range (%s) must start at the lower address"
+                         % address)
+    return first, last
+
+
+class exclusion_index:
+    """
+    common.exclusions.exclusion_index holds the excluded address intervals
+    for each IP version and the excluded DNS names. compile() must be
+    called after adding entries and before checking addresses.
+    DNS names are not resolved, so an excluded address is only matched when
+    the host is given by its address (and an excluded name by its name).
+    """
+    def __init__(self):
+        self.names = set()  # Excluded DNS names (lowercase)
+        self.count = 0  # Number of entries added
+        # Added (first, last) integer intervals keyed by IP version
+        self._intervals = {4: [], 6: []}
+        # Merged interval starts and ends, sorted for bisecting, keyed by
+        #  IP version
+        self._starts = {4: [], 6: []}
+        self._ends = {4: [], 6: []}
+
+    def __len__(self):
+        return self.count
+
+    def add(self, entry):
+        """
+        common.exclusions.exclusion_index.add adds an address, DNS name,
+        CIDR network, or address range to the index. Returns False if the
+        entry is malformed and was discarded.
+        """
+        entry = str(entry).strip()
+        # Skip blank lines and comments in exclusion files
+        if not entry or entry.startswith("#"):
+            return False
+        try:
+            bounds = _bounds(entry)
+        except ValueError as e:
+            log.error("common.exclusions.exclusion_index.add:\
+ Exclusion (%s) is not a valid address, network, or range (%s). Discarding"
+                      % (entry, e))
+            return False
+        if bounds is None:  # Not an address, so it is a DNS name
+            self.names.add(entry.lower())
+        else:
+            first, last = bounds
+            self._intervals[first.version].append((int(first), int(last)))
+        self.count += 1
+        return True
+
+    def compile(self):
+        """
+        common.exclusions.exclusion_index.compile sorts the intervals and
+        merges any which overlap or touch, so the interval which could
+        contain an address is found with a single bisect.
+        """
+        for version in self._intervals:
+            merged = []
+            for first, last in sorted(self._intervals[version]):
+                if merged and first <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], last)
+                else:
+                    merged.append([first, last])
+            self._starts[version] = [each[0] for each in merged]
+            self._ends[version] = [each[1] for each in merged]
+
+    def excluded(self, address):
+        """
+        common.exclusions.exclusion_index.excluded returns True if the
+        address (or DNS name) is excluded.
+        """
+        address = str(address).strip()
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return address.lower() in self.names
+        # The last interval starting at or before the address is the only
+        #  one which could contain it
+        position = bisect.bisect_right(self._starts[ip.version], int(ip)) - 1
+        return position >= 0 and int(ip) <= self._ends[ip.version][position]
+
+
+def _bounds(entry):
+    """
+    common.exclusions._bounds returns the first and last addresses covered
+    by an exclusion entry, or None if it is a DNS name.
+    """
+    if "/" in entry:
+        network = ipaddress.ip_network(entry, strict=False)
+        return network.network_address, network.broadcast_address
+    bounds = parse_range(entry)
+    if bounds:
+        return bounds
+    try:
+        ip = ipaddress.ip_address(entry)
+    except ValueError:
+        return None
+    return ip, ip
+
+
+def _listify(value):
+    """
+    common.exclusions._listify returns the value as a list whether it is a
+    single value or already a list.
+    """
+    if type(value) == list:
+        return value
+    return [value]
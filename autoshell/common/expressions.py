@@ -4,8 +4,9 @@
 common.expressions contains functions used to parse entries from the
 command-line which may contain file names (JSON or YAML) or a structured
 expression which outputs two-leveled list data. Each input is checked as a file
-first, if it is a file, we try to parse it as YAML and JSON. If it is not a
-file then we parse it as a string with first and second order delineators.
+first, if it is a file, we parse it as JSON, YAML, or unstructured lines
+(found by the file extension or first line). If it is not a file then we parse
+it as a string with first and second order delineators.
 String Examples:
  - 'one:two' will output [["one", "two"]]
  - 'one:two%three' will output as [["one", "two"], ["three"]]
@@ -16,6 +17,7 @@ Each output will be contained in a dictionary with a "type" descriptor being
 
 # Built-In Libraries
 import os
+import re
 import json
 import yaml
 import logging
@@ -25,118 +27,180 @@ import logging
 log = logging.getLogger("shared")
 
 
+# common.expressions.YAML_LOADER is the YAML loader used for files. The libyaml
+#  (C) loader is used when PyYAML was built with it since it is many times
+#  faster than the pure-Python loader.
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# File extensions which tell the format of a file without looking inside it
+EXTENSIONS = {
+    ".json": "json",
+    ".yml": "yaml",
+    ".yaml": "yaml"
+}
+
+# Number of characters read from the start of a file to find its format
+SNIFF_SIZE = 4096
+
+# Matches the first line of YAML structured data (a document start, list
+#  item, flow collection, or mapping key). Unstructured lines like
+#  "10.1.1.1:22" or "admin:password" have no space after the colon.
+_yaml_structure = re.compile(r"^(---|-\s|-$|[^\s#][^:]*:(\s|$))")
+
+
 def parse_expression(inputs, delineators):
     """
     common.expressions.parse_expression is called by the originating function
     to parse the inputs. It checks if each entry is a file or a string and
-    processes accordingly.
+    processes accordingly, returning a list of all the results.
+    """
+    return list(iter_expression(inputs, delineators))
+
+
+def iter_expression(inputs, delineators):
     """
-    results = []
-    if not inputs:  # Return an empty result if input is empty
-        return results
+    common.expressions.iter_expression is the generator behind
+    parse_expression. It yields each result as soon as it is parsed, so
+    the lines of a large unstructured file can be used while the rest of
+    the file is still being read.
+    """
+    if not inputs:  # Yield nothing if input is empty
+        return None
     for expression in inputs:
-        log.debug("common.expressions.parse_expression:\
+        log.debug("common.expressions.iter_expression:\
  Checking expression (%s)" % expression)
         # Check if it is a file
         if os.path.isfile(expression):
             log.debug(
-                "common.expressions.parse_expression:\
+                "common.expressions.iter_expression:\
  Expression (%s) is a file" % expression)
-            data = _add_file(expression, delineators)
-            # If empty data is returned, then don't add it to the results
-            if data:
-                # If it was a regular typed dict retured
-                if type(data) == dict:
-                    # Then just append it
-                    results.append(data)
-                # If we recursed over some unstructured data
-                elif type(data) == list:
-                    # Then add them all individually
-                    for entry in data:
-                        results.append(entry)
+            for data in _iter_file(expression, delineators):
+                yield data
         else:  # If not a file
             log.debug(
-                "common.expressions.parse_expression:\
+                "common.expressions.iter_expression:\
  Expression (%s) is a string" % expression)
             # Parse as a string with the passed delineators
             data = _add_str(expression, delineators)
             if data:
-                results.append(data)
-    return results
+                yield data
 
 
-def _add_file(file, delineators):
+def _iter_file(file, delineators):
     """
-    common.expressions._add_file will read in the file data and attempt to
-    parse it as YAML. If it fails, then it will be parsed as JSON. If that
-    fails, then None will be returned.
+    common.expressions._iter_file will read in the file data and parse it
+    in the format found by _sniff. JSON which fails to parse is retried as
+    YAML and YAML which turns out to be a plain string is processed as
+    unstructured lines. Structured files yield a single typed dict while
+    unstructured files yield a string result for each line as it is read.
+    If all fail, then nothing is yielded.
     """
     entries = []
     subtype = None
-    unstructured = False
     exceptions = []
-    log.debug("common.expressions._add_file: Checking file (%s)"
+    log.debug("common.expressions._iter_file: Checking file (%s)"
               % file)
-    # Pull raw file data
-    f = open(file, "r")
-    raw_data = f.read()
-    f.close()
-    # Try JSON
-    if not entries:
-        try:
-            entries = json.loads(raw_data)
-            subtype = "json"
-            log.debug(
-                "common.expressions._add_file:\
+    with open(file, "r") as f:
+        # Read just enough to find the format. Unstructured files are then
+        #  read a line at a time instead of all at once.
+        fmt = _sniff(file, f.read(SNIFF_SIZE))
+        f.seek(0)
+        log.debug("common.expressions._iter_file:\
+ File (%s) looks like (%s) data" % (file, fmt))
+        if fmt == "json":
+            try:
+                entries = json.load(f)
+                subtype = "json"
+                log.debug(
+                    "common.expressions._iter_file:\
  File (%s) contains JSON data" % file)
-        except Exception as e:
-            exceptions.append(str(e))
-    # If JSON failed, then attempt YAML
-    if not entries:
-        try:
-            for each in yaml.load_all(raw_data, Loader=yaml.Loader):
-                # If YAML returned a regular string, then it is unstructured
-                if type(each) == str or type(each) == type(u""):
-                    # type(u"") is for Py2 unicode compatibility
-                    log.debug("common.expressions._add_file:\
+            except Exception as e:
+                exceptions.append(str(e))
+                # JSON is a subset of YAML, which gives better errors
+                f.seek(0)
+                fmt = "yaml"
+        if fmt == "yaml":
+            try:
+                for each in yaml.load_all(f, Loader=YAML_LOADER):
+                    # If YAML returned a plain string, it is unstructured
+                    if type(each) == str or type(each) == type(u""):
+                        # type(u"") is for Py2 unicode compatibility
+                        fmt = "lines"
+                    else:
+                        entries = each
+                        subtype = "yaml"
+                        log.debug("common.expressions._iter_file:\
+ File (%s) contains YAML data" % file)
+                    break
+            except Exception as e:
+                exceptions.append(str(e))
+            f.seek(0)
+        if fmt == "lines":
+            log.debug("common.expressions._iter_file:\
  File (%s) contains unstructured data.\
  Processig each unstructured line as a string." % file)
-                    for entry in raw_data.split("\n"):
-                        if entry:  # If not empty
-                            entry = entry.replace("\r", "")
-                            entries.append(_add_str(entry, delineators))
-                    unstructured = True
-                else:
-                    entries = each
-                    subtype = "yaml"
-                    log.debug("common.expressions._add_file:\
- File (%s) contains YAML data" % file)
-                break
-        except Exception as e:
-            exceptions.append(str(e))
+            count = 0
+            for entry in _add_lines(f, delineators):
+                count += 1
+                yield entry
+            if count:
+                log.debug("common.expressions._iter_file:\
+ Processing of (%s) complete. Added (%s) lines" % (file, count))
+                return None
     if entries:
-        # If we processed unstructured lines in a file
-        if unstructured:
-            # Just return the list
-            result = entries
-        else:  # Otherwise return a typed dict
-            # Nest in a dict with a type descriptor
-            result = {
-                "type": "file",
-                "subtype": subtype,
-                "value": entries
-            }
-        log.debug(
-            "common.expressions._add_file:\
+        # Nest in a dict with a type descriptor
+        result = {
+            "type": "file",
+            "subtype": subtype,
+            "value": entries
+        }
+        # Dumping a large inventory takes longer than parsing it. Only do
+        #  it when it will be logged.
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                "common.expressions._iter_file:\
  Processing of (%s) complete. Adding to data:\n%s" %
-            (file, json.dumps(result, indent=4)))
-        return result
+                (file, json.dumps(result, indent=4)))
+        yield result
     else:
         exceptions = "\n".join(exceptions)
         log.error(
-            "common.expressions._add_file:\
+            "common.expressions._iter_file:\
  Processing of (%s) failed. Errors:\n%s" % (file, exceptions))
-        return None
+
+
+def _sniff(file, head):
+    """
+    common.expressions._sniff returns the likely format ("json", "yaml", or
+    "lines") of a file using its extension or, if the extension is unknown,
+    the first line of the data at the start of the file (head). Files which
+    can't be identified are given "yaml", which falls back to "lines".
+    """
+    extension = os.path.splitext(file)[1].lower()
+    if extension in EXTENSIONS:
+        return EXTENSIONS[extension]
+    for line in head.splitlines():
+        line = line.strip()
+        # Skip blank lines and YAML comments
+        if not line or line.startswith("#"):
+            continue
+        if line[0] in "{[":
+            return "json"
+        if _yaml_structure.match(line):
+            return "yaml"
+        return "lines"
+    return "yaml"
+
+
+def _add_lines(f, delineators):
+    """
+    common.expressions._add_lines reads an unstructured file (f) one line at
+    a time and yields each non-empty line processed as a string expression.
+    """
+    for line in f:
+        line = line.rstrip("\n").replace("\r", "")
+        if line:  # If not empty
+            yield _add_str(line, delineators)
 
 
 def _get_delineators(string, delineators):
@@ -204,10 +268,11 @@ def _add_str(string, delineators):
             "type": "string",
             "value": entries
         }
-        log.debug(
-            "common.expressions._add_str:\
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                "common.expressions._add_str:\
  Processing of (%s) complete. Adding to data:\n%s" %
-            (string, json.dumps(result, indent=4)))
+                (string, json.dumps(result, indent=4)))
         return result
     else:
         log.error(
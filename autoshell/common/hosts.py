@@ -11,17 +11,42 @@ to the hosts, and gracefully disconnect from the hosts when instructed.
 # Built-In Libraries
 import re
 import json
+import time
 import logging
+import ipaddress
+import threading
+import contextlib
 
 # Autoshell Libraries
 from . import autoqueue
+from . import ratelimit
+from . import exclusions
 from . import expressions
+from . import reachability
 
 
 # log (shared) is used for shared logging of autoshell core components
 log = logging.getLogger("shared")
 
 
+# Maximum number of threads used by each connector to disconnect from hosts
+DISCONNECT_THREADS = 200
+
+# Seconds disconnect_all() waits for graceful disconnects before force-closing
+DISCONNECT_DEADLINE = 30
+
+
+# common.hosts.TIMEOUT_KEYS are the names of the phase-specific timeouts (in
+#  seconds) which can be set globally or per-host in structured address
+#  files. Any which are not set are left to the connector defaults.
+TIMEOUT_KEYS = [
+    "connect_timeout",  # TCP connection establishment
+    "auth_timeout",  # Authentication
+    "banner_timeout",  # Waiting for the SSH banner
+    "read_timeout"  # Waiting for command output
+]
+
+
 class hosts_shared:
     """
     common.hosts.hosts_shared is a class with common functions which get
@@ -51,7 +76,9 @@ class connection_class(hosts_shared):
     common.hosts.connection_class is a simple namespace object used to hold
     values for an individual connection to a host using a specific connector.
     """
-    def __init__(self, address, host, timeout, port=None, con_type=None):
+    def __init__(self, address, host, timeout, port=None, con_type=None,
+                 timeouts=None, keepalive=None, channels=1, connector=None,
+                 limiter=None, retries=0):
         self.address = address  # DNS or IP Address string or list
         self.host = host  # Parent host_class object
         self.port = port  # TCP port number
@@ -61,6 +88,183 @@ class connection_class(hosts_shared):
         self.idle = False  # Flag used to indicate host is not ready for use
         self.connection = None  # Actual Netmiko connection object
         self.timeout = timeout  # Timeout for Netmiko connection
+        # Phase-specific timeouts keyed by the names in TIMEOUT_KEYS
+        self.timeouts = timeouts or {}
+        self.keepalive = keepalive  # Seconds between keepalives (or None)
+        self.connector = connector  # Connector library used for this type
+        # common.ratelimit.limiter instance used to pace logins
+        self.limiter = limiter or ratelimit.limiter()
+        # Number of times the connector may retry after a transient failure
+        self.retries = retries
+        self.retried = 0  # Number of retries made so far
+        self.attempts = 0  # Number of login attempts made so far
+        # Set by the connector when the last attempt failed in a way which
+        #  is worth retrying (ie: VTY lines exhausted)
+        self.transient = False
+        # Index of the (ordered) credential to try first. Lets a retry pick
+        #  up where the last attempt left off.
+        self.credential_index = 0
+        # Maximum number of channels (including .connection) handed out at
+        #  once by get_channel()
+        self.channels = channels
+        self._channels = []  # All opened channels, in use or not
+        self._free_channels = []  # Opened channels not currently in use
+        self._opening_channels = 0  # Number of channels being opened
+        self._channel_cond = threading.Condition()
+        # Event set by the connector once the connection attempt is complete
+        #  (successful or not). Used in place of polling the flags above.
+        self.done = threading.Event()
+        self._done_callbacks = []  # Functions called when .done gets set
+        self._done_lock = threading.Lock()
+
+    def add_done_callback(self, func):
+        """
+        common.hosts.connection_class.add_done_callback registers a function
+        to be called (with this connection_class instance) once the
+        connection attempt completes. If the attempt has already completed,
+        the function is called immediately.
+        """
+        with self._done_lock:
+            if not self.done.is_set():
+                self._done_callbacks.append(func)
+                return None
+        func(self)
+
+    def set_done(self):
+        """
+        common.hosts.connection_class.set_done is called by the connector
+        when it has finished attempting the connection. It resolves the .done
+        event and calls any registered callbacks.
+        """
+        with self._done_lock:
+            if self.done.is_set():
+                return None
+            self.done.set()
+            callbacks = list(self._done_callbacks)
+            self._done_callbacks = []
+        for func in callbacks:
+            try:
+                func(self)
+            except Exception:
+                log.exception("common.hosts.connection_class.set_done:\
+ Exception raised in done callback for (%s)" % self.get_address())
+
+    def wait(self, timeout=None):
+        """
+        common.hosts.connection_class.wait blocks the calling thread until
+        the connection attempt completes or the timeout (in seconds) expires.
+        Returns True if the attempt completed.
+        """
+        self.done.wait(timeout)
+        return self.done.is_set()
+
+    def get_channel(self, timeout=None):
+        """
+        common.hosts.connection_class.get_channel checks out a channel which
+        the caller can use on its own until it is given back with
+        release_channel(). The first channel is .connection itself. Further
+        channels (up to .channels) are opened on the same authenticated
+        session using the connector's open_channel() function. Once they
+        are all in use, the calling thread waits for one to be released.
+        None is returned if the timeout (in seconds) expires first, or if
+        there is no connection to hand out.
+        """
+        if timeout is not None:
+            deadline = time.time() + timeout
+        with self._channel_cond:
+            while True:
+                if self._free_channels:
+                    return self._free_channels.pop()
+                if not self._channels and not self._opening_channels:
+                    if not self.connection:
+                        return None
+                    # Hand out the original connection first
+                    self._channels.append(self.connection)
+                    return self.connection
+                if (len(self._channels) + self._opening_channels
+                        < self.channels):
+                    # Reserve the slot, then open the channel unlocked
+                    self._opening_channels += 1
+                    break
+                if timeout is None:
+                    self._channel_cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self._channel_cond.wait(remaining)
+        channel = None
+        open_channel = getattr(self.connector, "open_channel", None)
+        try:
+            if open_channel:
+                with self.host.timed("open_channel"):
+                    channel = open_channel(self)
+        except Exception:
+            log.exception("common.hosts.connection_class.get_channel:\
+ Exception opening channel to (%s)" % self.get_address())
+        finally:
+            with self._channel_cond:
+                # Give back the reserved slot. It is only counted once the
+                #  channel is open.
+                self._opening_channels -= 1
+                if channel:
+                    self._channels.append(channel)
+                else:
+                    # The connector could not open another channel. Don't
+                    #  try again and wait for an already open channel.
+                    self.channels = max(len(self._channels), 1)
+                    self._channel_cond.notify_all()
+        if channel:
+            return channel
+        if timeout is not None:
+            timeout = max(deadline - time.time(), 0)
+        return self.get_channel(timeout)
+
+    def release_channel(self, channel):
+        """
+        common.hosts.connection_class.release_channel returns a channel
+        checked out with get_channel() to the pool so it can be handed out
+        again. Channels closed (by close_channels()) while checked out are
+        not returned to the pool.
+        """
+        if channel is None:
+            return None
+        with self._channel_cond:
+            if any(channel is each for each in self._channels):
+                self._free_channels.append(channel)
+                self._channel_cond.notify()
+
+    @contextlib.contextmanager
+    def channel(self, timeout=None):
+        """
+        common.hosts.connection_class.channel is a context manager which
+        checks out a channel with get_channel() and releases it on exit:
+
+            with host.connections["cli"].channel() as connection:
+                connection.send_command("show version")
+        """
+        channel = self.get_channel(timeout)
+        try:
+            yield channel
+        finally:
+            self.release_channel(channel)
+
+    def close_channels(self):
+        """
+        common.hosts.connection_class.close_channels closes all the extra
+        channels opened by get_channel(), including those still checked out,
+        using the connector's close_channel() function. .connection itself
+        is left alone.
+        """
+        with self._channel_cond:
+            channels = self._channels
+            self._channels = []
+            self._free_channels = []
+            self._channel_cond.notify_all()
+        close_channel = getattr(self.connector, "close_channel", None)
+        for channel in channels:
+            if channel is not self.connection and close_channel:
+                close_channel(channel)
 
 
 class host_class(hosts_shared):
@@ -75,6 +279,34 @@ class host_class(hosts_shared):
         self.connections = {}  # Dict of connections keyed by connector name
         self.hostname = None  # Remote host discovered hostname
         self.info = {}  # Information dict which can be dumped to JSON
+        self._timing_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def timed(self, phase, **details):
+        """
+        common.hosts.host_class.timed is a context manager which times a
+        phase of work on the host (ie: logging in or running a command) and
+        adds it to the "timing" list in .info, along with any details passed
+        in as keyword arguments. The entry dict is yielded so more details
+        can be added to it. If an exception is raised, "error" is set.
+
+            with host.timed("command", command="show version"):
+                output = connection.send_command("show version")
+        """
+        entry = {"phase": phase}
+        entry.update(details)
+        start = time.time()
+        try:
+            yield entry
+        except Exception:
+            entry.update({"error": True})
+            raise
+        finally:
+            entry.update({"seconds": round(time.time() - start, 6)})
+            with self._timing_lock:
+                if "timing" not in self.info:
+                    self.info.update({"timing": []})
+                self.info["timing"].append(entry)
 
     def update_info(self):
         """
@@ -97,13 +329,18 @@ class hosts_class:
     passed to modules by AutoShell and can be used to find connected hosts
     and communicate with them.
     """
-    def __init__(self, credentials, connectors, timeout):
+    def __init__(self, credentials, connectors, timeout, prescan=None,
+                 timeouts=None, keepalive=None, channels=1, limiter=None,
+                 retries=0, exclusions=None):
         self.credentials = credentials  # List of credential dicts
         self.connectors = connectors  # List of connector libraries
-        # List of DNS names or IP addresses which we have tried to connect
+        # Set of DNS names or IP addresses which we have tried to connect
         #  to. Checked by add_host() to make sure we don't make duplicate
         #  connections.
-        self.attempts = []
+        self.attempts = set()
+        # Lock held while checking and recording attempts since crawl and
+        #  other modules call add_host() from many threads
+        self._attempts_lock = threading.Lock()
         # Dict of each connectors queue, keyed by the connector name
         self.queues = {}
         # Equivalent to self.queues, but for disconnecting from hosts
@@ -111,6 +348,13 @@ class hosts_class:
         self.hosts = []  # List of host_class instances
         # Storage for disconnect threads to drop completed items
         self.disconnected_hosts = []
+        # Completed connection_class instances keyed by connector name, in
+        #  order of completion. Used by as_completed()
+        self.completed = {}
+        # Count of connection attempts not yet completed, keyed by connector
+        self._outstanding = {}
+        # Condition used to wake as_completed() generators
+        self._completed_cond = threading.Condition()
         for con in self.connectors:
             # Fire up the autoqueue instance for each connector. Threads
             #  will remain idle until we load addresses into the queues
@@ -119,75 +363,204 @@ class hosts_class:
                 con: autoqueue.autoqueue(50,
                                          self.connectors[con].connect,
                                          (self.credentials, self.hosts))})
+            self.completed.update({con: []})
+            self._outstanding.update({con: 0})
         self.timeout = timeout
+        # Default phase-specific timeouts keyed by the names in TIMEOUT_KEYS
+        self.timeouts = {}
+        for key in timeouts or {}:
+            if timeouts[key] is not None:
+                self.timeouts.update({key: timeouts[key]})
+        # Seconds between keepalives sent on connections. None for no
+        #  keepalives.
+        self.keepalive = keepalive
+        # Number of channels each connection may have open at once
+        self.channels = channels
+        # common.ratelimit.limiter instance shared by all connections so
+        #  logins can be paced and capped globally, per credential, or per
+        #  subnet
+        self.limiter = limiter or ratelimit.limiter()
+        # Number of times to retry a connection after a transient failure
+        self.retries = retries
+        # Timeout (in seconds) for the TCP reachability pre-scan. No
+        #  pre-scan is performed if not set.
+        self.prescan = prescan
+        # common.exclusions.exclusion_index of hosts which must never be
+        #  connected to. Checked by add_host() for loaded and crawled hosts.
+        self.exclusions = exclusions
 
-    def load(self, address_args):
+    def load(self, address_args, block=True):
         """
         common.hosts.load runs the user-provided address entries (from the
         arg parser) through the expression parser to pull out the defined
         hosts. It then loads all those hosts into the connector queues using
-        add_host().
+        add_host(). If block is False, control is returned immediately and
+        the connection attempts continue in the background.
         """
-        # Parse input addresses as expressions
+        # Parse input addresses as expressions. The parsing is a generator
+        #  pipeline so each host is queued (and the connector threads start
+        #  on it) while the rest of the inventory is still being read.
         address_dicts = _add_hosts_exp(address_args)
+        reachable = None
+        # Probe all the hosts at once before any are added. This needs the
+        #  whole inventory up front.
+        if self.prescan:
+            address_dicts = list(address_dicts)
+            reachable = self._prescan(address_dicts)
         # Load each address into connector queues
+        count = 0
         for address_dict in address_dicts:
-            self.add_host(address_dict)
-        # Call the autoqueue blocker for each of the connectors to hang the
-        #  main thread until all connection attempts complete.
+            self.add_host(address_dict, reachable=reachable)
+            count += 1
+        log.debug("common.hosts.load: Loaded (%s) address entries" % count)
+        if block:
+            self.block()
+
+    def block(self):
+        """
+        common.hosts.block calls the autoqueue blocker for each of the
+        connectors to hang the calling thread until all connection attempts
+        complete.
+        """
         for con in self.connectors:
             self.queues[con].block(kill=False)
 
-    def add_host(self, address_dict):
+    def _prescan(self, address_dicts):
+        """
+        common.hosts._prescan probes the TCP port of every address in the
+        address dicts using common.reachability, returning a set of the
+        (address, port) tuples which are reachable.
+        """
+        targets = []
+        for address_dict in address_dicts:
+            for address in _listify(address_dict["address"]):
+                targets.append((address, _scan_port(address_dict["port"])))
+        log.info("common.hosts._prescan:\
+ Probing (%s) addresses for reachability" % len(targets))
+        return reachability.probe(targets, self.prescan)
+
+    def add_host(self, address_dict, reachable=None):
         """
         common.hosts.add_host uses an address dict to instantiate a host_class
         instance, fills it with connection_class instanaces for each
         connector, and loads each connection_class instanace into the
         connector autoqueues so the connection attempts can be made by the
-        threads using the connector's functions.
+        threads using the connector's functions. If the pre-scan is enabled,
+        hosts which are not reachable are marked as failed without being
+        queued. reachable may be passed in if the pre-scan was already done.
         """
-        # If we have added a connection to this host already
-        if type(address_dict["address"]) == list:
-            for address in address_dict["address"]:
-                if address in self.attempts:
+        address = address_dict["address"]
+        if self.exclusions:
+            for each in _listify(address):
+                if self.exclusions.excluded(each):
+                    log.info("common.hosts.add_host:\
+ Host (%s) is excluded. Skipping" % address)
+                    return None
+        with self._attempts_lock:
+            # If we have added a connection to this host already
+            for each in _listify(address):
+                if each in self.attempts:
                     log.debug(
                         "common.hosts.add_host:\
- Host (%s) is a duplicate. Skipping" %
-                        address_dict["address"])
+ Host (%s) is a duplicate. Skipping" % address)
+                    # Don't add it again as it is a duplicate
                     return None
-        elif address_dict["address"] in self.attempts:
-            log.debug(
-                "common.hosts.add_host:\
- Host (%s) is a duplicate. Skipping" %
-                address_dict["address"])
-            # Don't add it again as it is a duplicate
-            return None
-        # Otherwise, record that we are adding it now
-        if type(address_dict["address"]) == list:
-            self.attempts += address_dict["address"]
-        else:
-            self.attempts.append(address_dict["address"])
+            # Otherwise, record that we are adding it now
+            self.attempts.update(_listify(address))
+        if self.prescan:
+            if reachable is None:
+                reachable = self._prescan([address_dict])
+            port = _scan_port(address_dict["port"])
+            # Only keep the addresses which answered the pre-scan
+            alive = [a for a in _listify(address)
+                     if (a, port) in reachable]
+            if not alive:
+                log.warning("common.hosts.add_host:\
+ Host (%s) is not reachable. Discarding" % address)
+            elif type(address) == list:
+                address = alive
         # Instantiate the host
         new_host = host_class(
-            address_dict["address"],
+            address,
             port=address_dict["port"],
             typ=address_dict["type"]
         )
+        # Per-host timeouts override the defaults
+        timeout = address_dict.get("timeout") or self.timeout
+        timeouts = dict(self.timeouts)
+        timeouts.update(address_dict.get("timeouts") or {})
         # And add a connection object for each connector
         for con in self.connectors:
             new_con = connection_class(
-                address_dict["address"],
+                address,
                 host=new_host,
                 port=address_dict["port"],
                 con_type=con,
-                timeout=self.timeout
+                timeout=timeout,
+                timeouts=timeouts,
+                keepalive=self.keepalive,
+                channels=self.channels,
+                connector=self.connectors[con],
+                limiter=self.limiter,
+                retries=self.retries
             )
             # Add the connection to host's connections dict
             new_host.connections.update({con: new_con})
+            # Track the attempt so as_completed() knows when we are done
+            with self._completed_cond:
+                self._outstanding[con] += 1
+            new_con.add_done_callback(self._connection_done)
+            if self.prescan and not alive:
+                # Unreachable in the pre-scan. Fail it without trying it.
+                new_con.failed = True
+                new_con.idle = True
+                new_con.set_done()
+                continue
             # Add the connection_class instance to the proper connector queue
             self.queues[con].put(new_con)
         return new_host
 
+    def _connection_done(self, con_instance):
+        """
+        common.hosts._connection_done is registered as a done callback on
+        each connection_class instance. It records the completed connection
+        and wakes any threads iterating as_completed().
+        """
+        with self._completed_cond:
+            self.completed[con_instance.con_type].append(con_instance)
+            self._outstanding[con_instance.con_type] -= 1
+            self._completed_cond.notify_all()
+
+    def as_completed(self, connection_type="cli", timeout=None):
+        """
+        common.hosts.as_completed is a generator which yields host_class
+        instances as soon as their connection for the connection_type
+        completes successfully, in the order they connected. It returns once
+        every connection attempt added so far (including those added while
+        iterating, like by crawl) has completed, or when no connection
+        completes within the timeout (in seconds).
+        """
+        index = 0  # Position in the completed list for this generator
+        while True:
+            with self._completed_cond:
+                completed = self.completed[connection_type]
+                while (index >= len(completed)
+                       and self._outstanding[connection_type]):
+                    if not self._completed_cond.wait(timeout):
+                        log.warning("common.hosts.as_completed:\
+ Timed out waiting for connections to complete")
+                        return
+                if index >= len(completed):
+                    # Nothing left outstanding and nothing left to yield
+                    return
+                con_instance = completed[index]
+                index += 1
+            if con_instance.connected and not con_instance.failed:
+                log.debug("common.hosts.as_completed:\
+ Returning host (%s) (%s)" % (con_instance.host.hostname,
+                              con_instance.host.get_address()))
+                yield con_instance.host
+
     def ready_hosts(self, connection_type="cli"):
         result = []
         for host in self.hosts:
@@ -211,59 +584,192 @@ class hosts_class:
                 result.append(host)
         return result
 
-    def disconnect_all(self):
+    def check_connections(self):
+        """
+        common.hosts.check_connections uses the connectors' is_alive()
+        functions to find connections which have died since they were made
+        (like when held open by the daemon), and marks them as failed so
+        they are no longer returned by ready_hosts(). Hosts with a dead
+        connection are then forgotten (removed from .hosts and .attempts)
+        so they are connected to again if they are added again.
+        """
+        dead = []
+        for host in list(self.hosts):
+            for con in host.connections:
+                con_instance = host.connections[con]
+                is_alive = getattr(self.connectors[con], "is_alive", None)
+                if not (con_instance.connected and is_alive):
+                    continue
+                if not is_alive(con_instance):
+                    log.warning("common.hosts.check_connections:\
+ Connection to host (%s) (%s) has died" % (host.hostname,
+                                           host.get_address()))
+                    con_instance.connected = False
+                    con_instance.failed = True
+                    if host not in dead:
+                        dead.append(host)
+        with self._attempts_lock:
+            for host in dead:
+                self.hosts.remove(host)
+                self.attempts.difference_update(_listify(host.address))
+
+    def disconnect_all(self, deadline=DISCONNECT_DEADLINE):
         """
         common.hosts.disconnect_all gets called externally once all modules
         have completed their work and we are ready to gracefully disconnect
-        from all the hosts and complete the program.
+        from all the hosts and complete the program. Connections which have
+        not gracefully disconnected once the deadline (in seconds) passes
+        are force-closed.
         """
         log.info("common.hosts.disconnect_all: Disconnecting all hosts")
+        # Find the connector-specific connection_class instances which are
+        #  actually connected. The rest have nothing to disconnect.
+        connections = {}
+        for con in self.connectors:
+            connections.update({con: []})
+            for host in self.hosts:
+                if con not in host.connections:
+                    continue
+                con_instance = host.connections[con]
+                if con_instance.connected and con_instance.connection:
+                    connections[con].append(con_instance)
         # Fire up the disconnect autoqueue instances and drop them into
         #  the self.disconnect_queues dict. The disconnect() functions should
         #  return disconnected hosts into the self.disconnected_hosts list.
         for con in self.connectors:
+            if not connections[con]:
+                continue
+            thread_count = min(DISCONNECT_THREADS, len(connections[con]))
             self.disconnect_queues.update({
-                con: autoqueue.autoqueue(10,
+                con: autoqueue.autoqueue(thread_count,
                                          self.connectors[con].disconnect,
                                          (self.disconnected_hosts, ))})
-        # Drop each connector-specific connection_class instance into
-        #  its appropriate disconnect_queues to be processed by the
-        #  connector's disconnect() function.
-        for queue in self.disconnect_queues:
-            for host in self.hosts:
-                self.disconnect_queues[queue].put(
-                    host.connections[queue]
-                )
+            # Drop each connection_class instance into its appropriate
+            #  disconnect_queue to be processed by the connector's
+            #  disconnect() function.
+            for con_instance in connections[con]:
+                self.disconnect_queues[con].put(con_instance)
         # Call each disconnect_queues (autoqueue) blocker to block the main
         #  thread until all connections for all hosts have gracefully
-        #  disconnected.
-        for queue in self.disconnect_queues:
-            self.disconnect_queues[queue].block()
+        #  disconnected, or the deadline passes.
+        end = time.time() + deadline
+        for con in self.disconnect_queues:
+            remaining = max(0, end - time.time())
+            if self.disconnect_queues[con].block(timeout=remaining):
+                continue
+            # Deadline passed. Force-close whatever is still connected.
+            force_close = getattr(self.connectors[con], "force_close", None)
+            disconnected = set(self.disconnected_hosts)
+            for con_instance in connections[con]:
+                if con_instance in disconnected:
+                    continue
+                log.warning("common.hosts.disconnect_all:\
+ Host (%s) did not disconnect in time. Force-closing" %
+                            con_instance.get_address())
+                if force_close:
+                    force_close(con_instance)
+
+
+def _listify(address):
+    """
+    common.hosts._listify returns the address as a list whether it is a
+    single string address or already a list of addresses.
+    """
+    if type(address) == list:
+        return address
+    return [address]
+
+
+def _scan_port(port):
+    """
+    common.hosts._scan_port returns the TCP port which the pre-scan should
+    probe for a host, defaulting to SSH (22) the same way the cli connector
+    does.
+    """
+    try:
+        return int(port)
+    except (TypeError, ValueError):
+        return 22
 
 
 def _add_hosts_exp(inputs):
     """
     common.hosts._add_hosts_exp runs the address inputs through
     common.expressions and directs each response through the appropriate
-    processing function
+    processing function, yielding each address dict as it is processed.
+    Networks and ranges are expanded into an address dict per address.
     """
-    result = []
     # Process address entries using common.expressions
-    host_data = expressions.parse_expression(inputs, ["-", ":", "@"])
+    host_data = expressions.iter_expression(inputs, ["-", ":", "@"])
     # Process each returned expression item as a file or string
     for response in host_data:
         if response["type"] == "string":
-            result.append(_process_string_exps(response["value"]))
-        if response["type"] == "file":
-            for cred in _process_file_exps(response["value"]):
-                result.append(cred)
-    return result
+            address_dicts = [_process_string_exps(response["value"])]
+        elif response["type"] == "file":
+            address_dicts = _process_file_exps(response["value"])
+        else:
+            continue
+        for address_dict in address_dicts:
+            for host in _expand(address_dict):
+                yield host
+
+
+def _expand(address_dict):
+    """
+    common.hosts._expand yields the address dict as-is, or a copy of it for
+    each address if its address is a CIDR network or an address range.
+    """
+    addresses = None
+    if type(address_dict["address"]) == str:
+        addresses = _expand_address(address_dict["address"])
+    if addresses is None:
+        yield address_dict
+        return None
+    for address in addresses:
+        expanded = dict(address_dict)
+        expanded.update({"address": address})
+        yield expanded
+
+
+def _expand_address(address):
+    """
+    common.hosts._expand_address returns a generator of the addresses in a
+    CIDR network (10.0.0.0/22) or an address range (10.1.1.1-10.1.1.200 or
+    10.1.1.1-200), or None if the address is neither. Addresses are made
+    one at a time as they are used so large networks take no memory.
+    """
+    if "/" in address:
+        try:
+            network = ipaddress.ip_network(address.strip(), strict=False)
+        except ValueError:
+            return None
+        log.debug("common.hosts._expand_address:\
+ Expanding network (%s) with (%s) addresses"
+                  % (address, network.num_addresses))
+        # hosts() skips the network and broadcast addresses
+        return (str(ip) for ip in network.hosts())
+    try:
+        bounds = exclusions.parse_range(address)
+    except ValueError:
+        log.error("common.hosts._expand_address:\
+ Range (%s) must be in the format 'first-last' or 'first-last_octet' with\
+ the first address lower. Discarding" % address)
+        return iter([])
+    if bounds:
+        first, last = bounds
+        log.debug("common.hosts._expand_address:\
+ Expanding range (%s) with (%s) addresses"
+                  % (address, int(last) - int(first) + 1))
+        return (str(type(first)(number))
+                for number in range(int(first), int(last) + 1))
+    return None
 
 
 def _process_file_exps(file_data):
     """
     common.hosts._process_file_exps accepts pre-parsed file data from
-    the common.expressions library and searches them for host information.
+    the common.expressions library and searches them for host information,
+    yielding a normalized address dict for each host found.
     """
     def _normalize(host_dict):
         """
@@ -279,28 +785,52 @@ def _process_file_exps(file_data):
             address = host_dict["address"]
             port = None
             htype = None
+            timeout = None
+            timeouts = {}
         if "port" in host_dict:
             port = host_dict["port"]
         if "type" in host_dict:
             htype = host_dict["type"]
+        if "timeout" in host_dict:
+            timeout = _timeout_value(host_dict, "timeout")
+        for key in TIMEOUT_KEYS:
+            if key in host_dict:
+                value = _timeout_value(host_dict, key)
+                if value is not None:
+                    timeouts.update({key: value})
         return {
             "address": address,
             "port": port,
             "type": htype,
+            "timeout": timeout,
+            "timeouts": timeouts,
         }
-    result = []
     # If an entry is a flat dictionary, then check for interesting values
     if type(file_data) == dict:
         norm_host = _normalize(file_data)
         if norm_host:
-            result.append(norm_host)
+            yield norm_host
     # If an entry is a list, then check each entry for interesting values
     elif type(file_data) == list:
         for entry in file_data:
             norm_host = _normalize(entry)
             if norm_host:
-                result.append(norm_host)
-    return result
+                yield norm_host
+
+
+def _timeout_value(host_dict, key):
+    """
+    common.hosts._timeout_value pulls a timeout (in seconds) out of a host
+    dict from a structured address file, returning None if it is not a
+    number.
+    """
+    try:
+        return float(host_dict[key])
+    except (TypeError, ValueError):
+        log.error("common.hosts._timeout_value:\
+ Value ({}) for ({}) on host ({}) must be a number! Ignoring.".format(
+            host_dict[key], key, host_dict["address"]))
+        return None
 
 
 def _process_string_exps(str_list):
@@ -323,6 +853,8 @@ def _process_string_exps(str_list):
             "address": str_list[0][0],
             "port": None,
             "type": htype,
+            "timeout": None,
+            "timeouts": {},
         }
     # If the first list has more than one entry
     elif len(str_list[0]) > 1:
@@ -332,4 +864,6 @@ def _process_string_exps(str_list):
             "address": str_list[0][0],
             "port": str_list[0][1],
             "type": htype,
+            "timeout": None,
+            "timeouts": {},
         }
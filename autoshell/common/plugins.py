@@ -0,0 +1,176 @@
+#!/usr/bin/python
+
+"""
+The common.plugins library contains the registry used to find and import
+the modules requested with "-m" (or in a config file). A module name is
+looked up, in order, as:
+
+1. A bundled module (autoshell.modules.<name>)
+2. A file or package directory path (ie: mymods/mymodule.py)
+3. A module registered by an installed package under the
+   "autoshell.modules" entry point group (see ENTRY_POINT_GROUP)
+4. Any other importable module name
+
+Bundled modules are imported from the autoshell.modules package, so they
+no longer need the modules directory in sys.path (where the bundled "cmd"
+would shadow the standard library "cmd"). Finding the entry points means
+reading the metadata of every installed package, so the index of them is
+kept in the cache (see common.cache) until sys.path or its directories
+change, and it is only read when a name is not bundled and not a path.
+Only the requested modules are ever imported.
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import json
+import logging
+import threading
+import importlib
+import importlib.util
+
+# Autoshell Libraries
+from . import cache
+
+
+# log (shared) is used for shared logging of autoshell core components
+log = logging.getLogger("shared")
+
+
+# Entry point group installed packages use to register AutoShell modules.
+#  ie: entry_points={"autoshell.modules": ["mymodule = mypackage.mymodule"]}
+ENTRY_POINT_GROUP = "autoshell.modules"
+
+# Package holding the bundled modules
+BUNDLED_PACKAGE = "autoshell.modules"
+
+_entry_points = None  # Entry point index ({name: "package.module"})
+_entry_points_lock = threading.Lock()
+
+
+def import_module(name):
+    """
+    common.plugins.import_module finds the module called name (see the
+    lookup order above), imports it, and returns the module name (without
+    any path or ".py") and the module. ImportError is raised if the module
+    can't be found or fails to import.
+    """
+    # Import here to avoid importing the bundled modules with autoshell.common
+    from .. import modules
+    if name in modules.BUNDLED:
+        return name, importlib.import_module(BUNDLED_PACKAGE + "." + name)
+    if os.path.isfile(name) or os.path.isdir(name):
+        return _import_path(name)
+    target = entry_points().get(name)
+    if target:
+        # Entry points may name a module (package.module) or an attribute
+        #  of one (package:module)
+        modname, attribute = (target.split(":", 1) + [None])[:2]
+        module = importlib.import_module(modname.strip())
+        if attribute:
+            module = getattr(module, attribute.strip())
+        return name, module
+    return name, importlib.import_module(name)
+
+
+def entry_points():
+    """
+    common.plugins.entry_points returns the index ({name: target}) of the
+    modules registered under ENTRY_POINT_GROUP by installed packages. It is
+    built once per process, and reused from the cache between processes
+    while sys.path and the directories in it are unchanged (installing or
+    removing a package changes its directory).
+    """
+    global _entry_points
+    with _entry_points_lock:
+        if _entry_points is None:
+            name = json.dumps([ENTRY_POINT_GROUP] + sys.path)
+            check = cache.digest(json.dumps(_path_state()))
+            _entry_points = cache.load("plugins", name, check)
+            if _entry_points is None:
+                _entry_points = _scan_entry_points()
+                cache.store("plugins", name, check, _entry_points)
+        return _entry_points
+
+
+def _scan_entry_points():
+    """
+    common.plugins._scan_entry_points reads the ENTRY_POINT_GROUP entry
+    points from the metadata of the installed packages.
+    """
+    try:
+        from importlib import metadata
+    except ImportError:  # Python 3.7 and earlier have no importlib.metadata
+        return {}
+    found = metadata.entry_points()
+    # entry_points() returns a dict of groups before Python 3.10
+    if hasattr(found, "select"):
+        found = found.select(group=ENTRY_POINT_GROUP)
+    else:
+        found = found.get(ENTRY_POINT_GROUP, [])
+    index = {}
+    for entry_point in found:
+        index[entry_point.name] = entry_point.value
+    log.debug("common.plugins._scan_entry_points:\
+ Found (%s) plugin modules" % len(index))
+    return index
+
+
+def _path_state():
+    """
+    common.plugins._path_state returns the modification time of each
+    directory in sys.path, which changes when a package is installed into
+    (or removed from) it.
+    """
+    state = []
+    for path in sys.path:
+        try:
+            state.append([path, os.stat(path or os.curdir).st_mtime])
+        except OSError:
+            state.append([path, None])
+    return state
+
+
+def _import_path(name):
+    """
+    common.plugins._import_path imports a module from a file, or a package
+    from a directory, by its path. The directory it is in is added to the
+    end of sys.path (once) so the module can still import other modules
+    next to it.
+    """
+    fullpath = os.path.abspath(name)
+    path, filename = os.path.split(fullpath)
+    modname = filename[:-3] if filename.endswith(".py") else filename
+    location = fullpath
+    if os.path.isdir(fullpath):
+        location = os.path.join(fullpath, "__init__.py")
+        if not os.path.isfile(location):
+            raise ImportError("Directory (%s) is not a Python package (it\
+ has no __init__.py)" % name)
+    existing = sys.modules.get(modname)
+    if existing is not None:
+        # Already imported from this path (like by an earlier daemon job)
+        if getattr(existing, "__file__", None) == location:
+            return modname, existing
+        raise ImportError("Module name (%s) is already used by (%s)"
+                          % (modname, getattr(existing, "__file__", existing)))
+    if location == fullpath:
+        spec = importlib.util.spec_from_file_location(modname, location)
+    else:
+        spec = importlib.util.spec_from_file_location(
+            modname, location, submodule_search_locations=[fullpath])
+    if spec is None:
+        raise ImportError("Module (%s) is not a Python file or package"
+                          % name)
+    if path not in sys.path:
+        sys.path.append(path)
+    module = importlib.util.module_from_spec(spec)
+    # The module must be in sys.modules while it runs, like a normal import
+    sys.modules[modname] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[modname]
+        raise
+    return modname, module
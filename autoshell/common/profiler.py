@@ -0,0 +1,107 @@
+#!/usr/bin/python
+
+"""
+The common.profiler library contains functions used to profile an AutoShell
+run. Most of the work in a run is done in the autothreads of the autoqueues,
+which the cProfile command-line (and its single-thread profiler) can't see.
+common.profiler profiles the main thread and every thread started after it,
+then combines the results into a single pstats file and a summary.
+"""
+
+
+# Built-In Libraries
+import sys
+import logging
+import threading
+#  pstats and cProfile are imported when profiling starts since most runs
+#  don't profile
+
+
+# log (shared) is used for shared logging of autoshell core components
+log = logging.getLogger("shared")
+
+
+# Number of functions to include in the summary written at exit
+SUMMARY_LINES = 25
+
+# Sort order of the summary. Cumulative time shows which calls are slow,
+#  including everything they call.
+SUMMARY_SORT = "cumulative"
+
+# Python 3.12 and later implement cProfile with sys.monitoring, which sees
+#  all threads but only allows one profiler to run at once
+_PROCESS_WIDE = sys.version_info >= (3, 12)
+
+_profilers = []  # Profiler instances of all profiled threads
+_profilers_lock = threading.Lock()
+_main_profiler = None  # Profiler of the thread which called start()
+
+
+def start():
+    """
+    common.profiler.start starts profiling the calling thread and hooks
+    threading so every thread started afterward profiles itself as well.
+    """
+    global _main_profiler
+    import cProfile
+    log.warning("common.profiler.start: Profiling enabled")
+    _main_profiler = cProfile.Profile()
+    if not _PROCESS_WIDE:
+        # The hook is called once at the start of each new thread
+        threading.setprofile(_thread_hook)
+    _main_profiler.enable()
+
+
+def stop(path, stream=None):
+    """
+    common.profiler.stop stops profiling, combines the stats of all the
+    profiled threads, writes them to a pstats file at path (which can be
+    read with the pstats library, snakeviz, etc..), and writes a summary of
+    the top functions to stream (std.err by default).
+    """
+    if not _main_profiler:
+        return None
+    import pstats
+    _main_profiler.disable()
+    threading.setprofile(None)
+    stats = pstats.Stats(_main_profiler, stream=stream or sys.stderr)
+    with _profilers_lock:
+        profilers = list(_profilers)
+    for profiler in profilers:
+        # Don't disable() the profilers of other threads. From this thread
+        #  it would unhook this thread instead.
+        stats.add(_snapshot(profiler))
+    stats.dump_stats(path)
+    log.warning("common.profiler.stop:\
+ Profiled (%s) threads. Stats written to (%s)" % (len(profilers) + 1, path))
+    stats.sort_stats(SUMMARY_SORT).print_stats(SUMMARY_LINES)
+    return stats
+
+
+def _thread_hook(frame, event, arg):
+    """
+    common.profiler._thread_hook is set with threading.setprofile so it is
+    called when each new thread starts running. It swaps itself out for a
+    new cProfile profiler for that thread.
+    """
+    import cProfile
+    sys.setprofile(None)
+    profiler = cProfile.Profile()
+    with _profilers_lock:
+        _profilers.append(profiler)
+    profiler.enable()
+
+
+class _snapshot:
+    """
+    common.profiler._snapshot lets pstats read the stats of a profiler
+    which is still running in another thread.
+    """
+    def __init__(self, profiler):
+        self._profiler = profiler
+
+    def create_stats(self):
+        # Called by pstats in place of Profile.create_stats(), which would
+        #  call disable() from the wrong thread
+        self._profiler.snapshot_stats()
+        self.stats = self._profiler.stats
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+
+"""
+The common.ratelimit library contains classes and functions used to limit
+how quickly, and how many at once, logins are made to hosts. Authentication
+(AAA) servers like TACACS+ and RADIUS will often start throttling when many
+logins arrive at once, making every login slow down until it times out.
+Limits can be set globally, per credential (username), or per subnet.
+"""
+
+
+# Built-In Libraries
+import time
+import logging
+import threading
+import ipaddress
+import contextlib
+
+
+# log (shared) is used for shared logging of autoshell core components
+log = logging.getLogger("shared")
+
+
+# common.ratelimit.SCOPES are the supported scopes for limits
+SCOPES = ["global", "credential", "subnet"]
+
+# Prefix length used for "subnet" limits when none is given
+DEFAULT_PREFIX = {4: 24, 6: 64}
+
+
+def parse_limits(inputs):
+    """
+    common.ratelimit.parse_limits parses limit strings (from the CLI or a
+    config file) in the format "[scope:]value" and returns a list of limit
+    dicts. Examples:
+        "10"              10 for all logins together
+        "credential:5"    5 for each username
+        "subnet:2"        2 for each /24 (IPv4) or /64 (IPv6) subnet
+        "subnet/16:20"    20 for each /16 subnet
+    """
+    limits = []
+    if inputs is None:
+        inputs = []
+    # Config files may have a single value instead of a list
+    elif type(inputs) != list:
+        inputs = [inputs]
+    for entry in inputs:
+        entry = str(entry)
+        if ":" in entry:
+            scope, value = entry.rsplit(":", 1)
+        else:
+            scope, value = "global", entry
+        prefix = None
+        if "/" in scope:
+            scope, prefix = scope.split("/", 1)
+        try:
+            value = float(value)
+            if prefix is not None:
+                prefix = int(prefix)
+        except ValueError:
+            log.error("common.ratelimit.parse_limits:\
+ Limit (%s) must be in the format '[scope:]number'. Discarding" % entry)
+            continue
+        if scope not in SCOPES or value <= 0:
+            log.error("common.ratelimit.parse_limits:\
+ Limit (%s) must have a positive value and one of the scopes (%s).\
+ Discarding" % (entry, ", ".join(SCOPES)))
+            continue
+        limits.append({"scope": scope, "prefix": prefix, "value": value})
+    return limits
+
+
+class token_bucket:
+    """
+    common.ratelimit.token_bucket hands out tokens at a steady rate (per
+    second), allowing up to burst tokens to be handed out at once after a
+    quiet period.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)  # Tokens added per second
+        # Maximum number of tokens saved up
+        self.burst = float(burst or max(1.0, self.rate))
+        self._tokens = self.burst  # Tokens currently available
+        self._last = time.monotonic()  # Time of the last refill
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        common.ratelimit.token_bucket.reserve takes a token and returns the
+        number of seconds the caller must wait before using it. Tokens are
+        reserved in order, so waiting callers are served first-come,
+        first-served without holding the lock while they sleep.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+class limiter:
+    """
+    common.ratelimit.limiter holds the token buckets (for rate limits) and
+    semaphores (for concurrency limits) for each scope and hands out login
+    slots with acquire(). Buckets and semaphores for each credential or
+    subnet are created the first time they are needed.
+    """
+    def __init__(self, rate_limits=None, max_logins=None):
+        self.rate_limits = rate_limits or []  # Limit dicts from parse_limits
+        self.max_logins = max_logins or []  # Limit dicts from parse_limits
+        self._buckets = {}  # token_bucket instances keyed by (limit, key)
+        self._semaphores = {}  # Semaphores keyed by (limit, key)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def acquire(self, address, credential):
+        """
+        common.ratelimit.limiter.acquire is a context manager which blocks
+        until a login to address using credential is allowed by all the
+        limits. The concurrency slots are held until the context exits.
+        """
+        semaphores = []
+        for index, limit in enumerate(self.max_logins):
+            key = _key(limit, address, credential)
+            if key is None:
+                continue
+            with self._lock:
+                if (index, key) not in self._semaphores:
+                    self._semaphores.update({
+                        (index, key): threading.Semaphore(
+                            max(1, int(limit["value"])))})
+                semaphores.append(self._semaphores[(index, key)])
+        held = []  # Semaphores acquired so far
+        try:
+            # Semaphores are always taken in the same order to prevent
+            #  deadlocks between threads
+            for semaphore in semaphores:
+                semaphore.acquire()
+                held.append(semaphore)
+            self._wait_for_tokens(address, credential)
+            yield None
+        finally:
+            for semaphore in held:
+                semaphore.release()
+
+    def _wait_for_tokens(self, address, credential):
+        """
+        common.ratelimit.limiter._wait_for_tokens takes a token from each
+        of the buckets which apply to the login and sleeps until the
+        latest of them is due.
+        """
+        delay = 0
+        for index, limit in enumerate(self.rate_limits):
+            key = _key(limit, address, credential)
+            if key is None:
+                continue
+            with self._lock:
+                if (index, key) not in self._buckets:
+                    self._buckets.update({(index, key): token_bucket(
+                        limit["value"])})
+                bucket = self._buckets[(index, key)]
+            delay = max(delay, bucket.reserve())
+        if delay:
+            log.debug("common.ratelimit.limiter._wait_for_tokens:\
+ Delaying login to (%s) by (%.2f) seconds" % (address, delay))
+            time.sleep(delay)
+
+
+def _key(limit, address, credential):
+    """
+    common.ratelimit._key returns the key which the login is counted
+    against for the limit, or None if the limit does not apply to it.
+    """
+    if limit["scope"] == "global":
+        return "global"
+    if limit["scope"] == "credential":
+        return credential.get("username")
+    try:
+        ip = ipaddress.ip_address(str(address))
+    except ValueError:
+        # DNS names are not resolved here. Subnet limits don't apply.
+        return None
+    prefix = limit["prefix"]
+    if prefix is None:
+        prefix = DEFAULT_PREFIX[ip.version]
+    try:
+        return ipaddress.ip_network("%s/%s" % (ip, prefix), strict=False)
+    except ValueError:
+        log.error("common.ratelimit._key:\
+ Invalid prefix length (%s) for address (%s)" % (prefix, address))
+        return None
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+
+"""
+The common.reachability library contains functions used to quickly check
+the TCP reachability of large numbers of hosts before any (much slower)
+login attempts are made. All probes are made in parallel from the calling
+thread using non-blocking sockets, so sweeping thousands of addresses takes
+about as long as the probe timeout.
+"""
+
+
+# Built-In Libraries
+import time
+import errno
+import socket
+import logging
+import selectors
+import collections
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+
+# log (shared) is used for shared logging of autoshell core components
+log = logging.getLogger("shared")
+
+
+# Error codes returned by a non-blocking connect_ex() which mean the
+#  connection is still being established
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY,
+                10035)  # 10035 is WSAEWOULDBLOCK on Windows
+
+
+def max_in_flight():
+    """
+    common.reachability.max_in_flight returns the number of probe sockets
+    which can safely be open at the same time, leaving some file
+    descriptors free for everything else in the process.
+    """
+    if not resource:
+        # select() on Windows is limited to 512 sockets
+        return 500
+    soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if soft == resource.RLIM_INFINITY:
+        return 4096
+    return max(10, min(4096, soft - 256))
+
+
+def probe(targets, timeout, concurrency=None):
+    """
+    common.reachability.probe attempts a TCP connection to each
+    (address, port) tuple in targets, waiting up to timeout (in seconds) for
+    each one to complete. It returns a set of the targets which accepted the
+    connection. Connections are closed as soon as they are established.
+    """
+    log.debug("common.reachability.probe:\
+ Probing targets with a (%s) second timeout" % timeout)
+    reachable = set(_probe(targets, timeout, concurrency))
+    log.debug("common.reachability.probe:\
+ (%s) targets are reachable" % len(reachable))
+    return reachable
+
+
+def first_reachable(targets, timeout):
+    """
+    common.reachability.first_reachable races TCP connections to all of the
+    (address, port) tuples in targets at the same time and returns the first
+    one which accepts the connection, cancelling the rest. None is returned
+    if no target connects within the timeout (in seconds).
+    """
+    probes = _probe(targets, timeout)
+    try:
+        return next(probes, None)
+    finally:
+        # Closes the sockets of all the probes still connecting
+        probes.close()
+
+
+def _probe(targets, timeout, concurrency=None):
+    """
+    common.reachability._probe is a generator which performs the probes for
+    probe() and first_reachable(), yielding each target as soon as it
+    accepts the connection.
+    """
+    if not concurrency:
+        concurrency = max_in_flight()
+    reachable = []  # Targets which connected immediately
+    selector = selectors.DefaultSelector()
+    # Sockets in order of when they were started. Since the timeout is the
+    #  same for every probe, the deadlines are in order too.
+    deadlines = collections.deque()
+    in_flight = {}  # Socket: target for probes still connecting
+    # Remove duplicates, but keep the order for first_reachable()
+    unique = []
+    seen = set()
+    for target in targets:
+        if target not in seen:
+            seen.add(target)
+            unique.append(target)
+    targets = iter(unique)
+    exhausted = False
+    try:
+        while True:
+            # Start new probes until we hit the concurrency limit
+            while not exhausted and len(in_flight) < concurrency:
+                try:
+                    target = next(targets)
+                except StopIteration:
+                    exhausted = True
+                    break
+                sock = _start(target, reachable)
+                if sock:
+                    in_flight.update({sock: target})
+                    selector.register(sock, selectors.EVENT_WRITE)
+                    deadlines.append((time.monotonic() + timeout, sock))
+            while reachable:
+                yield reachable.pop(0)
+            if not in_flight:
+                break
+            # Wait for probes to complete until the oldest one expires
+            wait = max(0, deadlines[0][0] - time.monotonic())
+            for key, event in selector.select(wait):
+                sock = key.fileobj
+                target = in_flight.pop(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                selector.unregister(sock)
+                sock.close()
+                if not error:
+                    yield target
+            # Discard any probes which have expired
+            now = time.monotonic()
+            while deadlines and (deadlines[0][0] <= now
+                                 or deadlines[0][1] not in in_flight):
+                sock = deadlines.popleft()[1]
+                if sock in in_flight:
+                    in_flight.pop(sock)
+                    selector.unregister(sock)
+                    sock.close()
+    finally:
+        for sock in in_flight:
+            sock.close()
+        selector.close()
+
+
+def _start(target, reachable):
+    """
+    common.reachability._start opens a non-blocking socket and begins the
+    connection to the target, returning the socket if the connection is in
+    progress. Targets which connect immediately are appended to reachable.
+    """
+    address, port = target
+    try:
+        # DNS names are resolved here (blocking). IP addresses return
+        #  immediately.
+        family, socktype, proto, canonname, sockaddr = socket.getaddrinfo(
+            address, port, 0, socket.SOCK_STREAM)[0]
+        sock = socket.socket(family, socktype, proto)
+    except (socket.error, UnicodeError) as e:
+        log.debug("common.reachability._start:\
+ Could not resolve (%s): %s" % (address, e))
+        return None
+    sock.setblocking(False)
+    result = sock.connect_ex(sockaddr)
+    if result in _IN_PROGRESS:
+        return sock
+    if result == 0:
+        reachable.append(target)
+    sock.close()
+    return None
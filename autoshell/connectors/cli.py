@@ -7,21 +7,79 @@ connectors.cli
 
 # Built-In Libraries
 import re
+import copy
+import errno
 import json
+import random
+import socket
 import logging
+import threading
 
 # Installed Libraries
 import netmiko
+import paramiko
+from netmiko.channel import SSHChannel
+
+# Autoshell Libraries
+from ..common import credentials as common_credentials
+from ..common import reachability
 
 
 # log (shared) is used for shared logging of autoshell core components
 log = logging.getLogger("shared")
 
 
+# connectors.cli.TIMEOUT_MAP maps the names of the phase-specific timeouts
+#  in common.hosts.TIMEOUT_KEYS to the Netmiko connection arguments.
+TIMEOUT_MAP = {
+    "connect_timeout": "conn_timeout",
+    "auth_timeout": "auth_timeout",
+    "banner_timeout": "banner_timeout",
+    "read_timeout": "read_timeout_override"
+}
+
+# Seconds allowed for the TCP connection when no connect_timeout is set.
+#  This is the Netmiko default.
+CONNECT_TIMEOUT = 10
+
+# Delay (in seconds) before the first retry of a transient connection
+#  failure. Each following retry doubles it, up to RETRY_MAX_DELAY.
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 60
+
+# Errors (errno) of TCP connections which could not be made at all. These
+#  hosts are discarded like ones which timed out instead of being retried.
+UNREACHABLE_ERRNOS = (errno.ECONNREFUSED, errno.EHOSTUNREACH,
+                      errno.ENETUNREACH)
+
+# Errors (errno) of TCP connections which were made but then dropped or
+#  stalled while the SSH session was being set up. These are retried.
+DROPPED_ERRNOS = (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE,
+                  errno.ETIMEDOUT)
+
+
 def connect(parent, con_instance, credentials, returner):
     """
     connectors.cli.connect is the worker function used to connect to
-    CLI-based devices using SSH or TELNET.
+    CLI-based devices using SSH or TELNET. It resolves the .done event on
+    the connection_class instance once the attempt completes, whether it
+    succeeded or not. If the connection is put back in the queue to be
+    retried, .done is left for the retry to resolve.
+    """
+    retrying = False
+    try:
+        retrying = _connect(parent, con_instance, credentials, returner)
+    finally:
+        if not retrying:
+            con_instance.set_done()
+
+
+def _connect(parent, con_instance, credentials, returner):
+    """
+    connectors.cli._connect tries each credential against the host until
+    one succeeds. If the host has a list of addresses, the fastest reachable
+    one is picked first using _race_addresses. Returns True if the
+    connection was put back in the queue to be retried.
     """
     if not con_instance.host.type:
         log.warning("connectors.cli.connect:\
@@ -33,48 +91,105 @@ def connect(parent, con_instance, credentials, returner):
  Supported platforms are: \n%s" % (con_instance.get_address(),
                                    con_instance.host.type,
                                    " ".join(netmiko.platforms)))
-        return None
+        return False
     log.info("connectors.cli.connect: Connecting to address (%s)"
              % con_instance.get_address())
     # Create ordered list of types so we can prefer credentials with
     #  matching types if they exist.
     pref_types = [con_instance.host.type] + netmiko.platforms
-    # Try each credential once they have been ordered by preference
-    for credential in _order_credentials(credentials, pref_types):
-        # .address attributes which came from some modules may be a list
-        if type(con_instance.address) == list:
-            # Iterate a copy of the list since we will be changing the value
-            #  of con_instance.address as we iterate through it.
-            for address in list(con_instance.address):
-                # Change value of .address so it is a string if we succeed
-                con_instance.address = address
-                # Build Netmiko-compatible address/credential dict
-                assemb_cred = _assemble_credential(con_instance, credential)
-                # _execute will return True if connection is successful
-                if _execute(con_instance, assemb_cred):
-                    # Update .info with the original credential we used
-                    con_instance.host.info["cli"].update(
-                        {"original_credential": credential})
-                    # If another connector has not added the host_class
-                    #  instance to the returner yet
-                    if con_instance.host not in returner:
-                        returner.append(con_instance.host)
-                    # Return to prevent trying the next credential
-                    return None
-        else:
-            # Build Netmiko-compatible address/credential dict
-            assemb_cred = _assemble_credential(con_instance, credential)
+    # .address attributes which came from some modules may be a list
+    if type(con_instance.address) == list:
+        if not _race_addresses(con_instance):
+            return False
+    ordered = _order_credentials(credentials, pref_types)
+    # Try each credential once they have been ordered by preference,
+    #  starting where the last attempt left off if this is a retry
+    for index in range(con_instance.credential_index, len(ordered)):
+        credential = ordered[index]
+        # Build Netmiko-compatible address/credential dict
+        assemb_cred = _assemble_credential(con_instance, credential)
+        # Wait for the rate and concurrency limits to allow the login
+        with con_instance.limiter.acquire(con_instance.address, credential):
             # _execute will return True if connection is successful
-            if _execute(con_instance, assemb_cred):
-                # Update .info with the original credential we used
-                con_instance.host.info["cli"].update(
-                    {"original_credential": credential})
-                # If another connector has not added the host_class
-                #  instance to the returner yet
-                if con_instance.host not in returner:
-                    returner.append(con_instance.host)
-                # Return to prevent trying the next credential
-                return None
+            success = _execute(con_instance, assemb_cred)
+        if success:
+            # Update .info with the original credential we used
+            con_instance.host.info["cli"].update(
+                {"original_credential": credential})
+            # If another connector has not added the host_class
+            #  instance to the returner yet
+            if con_instance.host not in returner:
+                returner.append(con_instance.host)
+            # Return to prevent trying the next credential
+            return False
+        if con_instance.transient:
+            # Try the same credential again later
+            con_instance.credential_index = index
+            return _retry(parent, con_instance)
+        if con_instance.failed:
+            # No use in trying the other credentials
+            return False
+    return False
+
+
+def _retry(parent, con_instance):
+    """
+    connectors.cli._retry puts a connection which failed in a transient way
+    back in the autoqueue to be tried again after an exponential backoff
+    delay (with random jitter so retries against busy hosts are spread
+    out). The worker thread is not held up during the delay. If the
+    connection is out of retries, it is marked as failed. Returns True if
+    the connection was put back in the queue.
+    """
+    con_instance.idle = True
+    if (con_instance.retried >= con_instance.retries
+            or not getattr(parent, "autoqueue", None)):
+        log.warning("connectors.cli._retry:\
+ Device (%s) failed after (%s) retries. Discarding"
+                    % (con_instance.get_address(), con_instance.retried))
+        con_instance.failed = True
+        return False
+    # Equal jitter: wait between half and all of the backoff delay
+    delay = min(RETRY_MAX_DELAY,
+                RETRY_BASE_DELAY * 2 ** con_instance.retried)
+    delay = random.uniform(delay / 2.0, delay)
+    con_instance.retried += 1
+    con_instance.host.info["cli"].update({"retries": con_instance.retried})
+    log.info("connectors.cli._retry:\
+ Retrying device (%s) in (%.1f) seconds (retry %s of %s)"
+             % (con_instance.get_address(), delay,
+                con_instance.retried, con_instance.retries))
+    parent.autoqueue.put(con_instance, delay=delay)
+    return True
+
+
+def _race_addresses(con_instance):
+    """
+    connectors.cli._race_addresses races TCP connections to all the
+    addresses in a con_instance with a list of addresses and sets .address
+    to the first one which answers. If none of them answer within the
+    timeout, the con_instance is marked as failed and False is returned.
+    """
+    port = _get_port(con_instance)
+    targets = []
+    for address in con_instance.address:
+        targets.append((address, port))
+    log.debug("connectors.cli._race_addresses:\
+ Racing connections to addresses (%s)" % con_instance.address)
+    winner = reachability.first_reachable(
+        targets,
+        con_instance.timeouts.get("connect_timeout", con_instance.timeout))
+    if not winner:
+        log.warning("connectors.cli._race_addresses:\
+ No address of (%s) is reachable. Discarding" % con_instance.address)
+        con_instance.idle = True
+        con_instance.failed = True
+        return False
+    # Change value of .address to the winning string address
+    con_instance.address = winner[0]
+    log.debug("connectors.cli._race_addresses:\
+ Address (%s) answered first" % con_instance.address)
+    return True
 
 
 def disconnect(parent, con_instance, returner):
@@ -83,13 +198,108 @@ def disconnect(parent, con_instance, returner):
     disconnect from CLI-based devices, then return that connection instance
     to the returner list.
     """
+    # Nothing to do if we never connected
+    if not con_instance.connection:
+        return None
+    # Close any extra channels before the session goes away
+    con_instance.close_channels()
     # Send disconnect command to Netmiko
-    con_instance.connection.disconnect()
+    with con_instance.host.timed("disconnect"):
+        con_instance.connection.disconnect()
+    con_instance.connected = False
     log.info("connectors.cli.disconnect: Disconnected from (%s) (%s)"
              % (con_instance.host.hostname, con_instance.host.get_address()))
     returner.append(con_instance)
 
 
+def open_channel(con_instance):
+    """
+    connectors.cli.open_channel opens another interactive shell channel on
+    the already authenticated SSH session of a connected con_instance and
+    returns a Netmiko connection object which uses it. This allows more than
+    one command to run on a host at a time without logging in again. None
+    is returned if the connection does not support extra channels (ie:
+    TELNET).
+    """
+    connection = con_instance.connection
+    if (not connection or connection.protocol != "ssh"
+            or not connection.remote_conn_pre):
+        return None
+    log.debug("connectors.cli.open_channel:\
+ Opening new channel to (%s) (%s)" % (con_instance.host.hostname,
+                                      con_instance.get_address()))
+    # Copy the connection object so the new channel uses the same device
+    #  type specific handling, prompt, and settings as the original
+    channel = copy.copy(connection)
+    channel.remote_conn = connection.remote_conn_pre.invoke_shell(
+        term="vt100", width=511, height=1000)
+    channel.remote_conn.settimeout(connection.blocking_timeout)
+    channel.channel = SSHChannel(conn=channel.remote_conn,
+                                 encoding=connection.encoding)
+    # Each channel needs its own lock. The session log stays with the
+    #  original connection.
+    channel._session_locker = threading.Lock()
+    channel.session_log = None
+    # Make sure a disconnect() on the channel can't close the shared session
+    channel.remote_conn_pre = None
+    try:
+        # Netmiko needs there to be data for session_preparation to work
+        channel.write_channel(channel.RETURN)
+        channel.session_preparation()
+    except Exception:
+        close_channel(channel)
+        raise
+    return channel
+
+
+def close_channel(channel):
+    """
+    connectors.cli.close_channel closes a channel opened by open_channel()
+    without closing the SSH session it shares with the original connection.
+    """
+    try:
+        channel.remote_conn.close()
+    except Exception:
+        log.debug("connectors.cli.close_channel:\
+ Exception closing channel", exc_info=True)
+    channel.remote_conn = None
+
+
+def is_alive(con_instance):
+    """
+    connectors.cli.is_alive checks whether the Netmiko connection is still
+    usable, returning True or False.
+    """
+    if not con_instance.connection:
+        return False
+    try:
+        return con_instance.connection.is_alive()
+    except Exception:
+        return False
+
+
+def force_close(con_instance):
+    """
+    connectors.cli.force_close closes the underlying socket of a connection
+    without waiting for the remote device. It is used when a graceful
+    disconnect() has not completed in time.
+    """
+    connection = con_instance.connection
+    if not connection:
+        return None
+    # Grab references first since disconnect() may be clearing them
+    for sock in (getattr(connection, "remote_conn", None),
+                 getattr(connection, "remote_conn_pre", None)):
+        try:
+            if sock:
+                sock.close()
+        except Exception:
+            log.debug("connectors.cli.force_close:\
+ Exception closing connection to (%s)" % con_instance.get_address(),
+                      exc_info=True)
+    con_instance.connected = False
+
+
 def _assemble_credential(con_instance, credential):
     """
     connectors.cli._assemble_credential builds a Netmiko-compatible
@@ -126,20 +336,7 @@ def _assemble_credential(con_instance, credential):
     # Prefer to autodiscover as a last resort
     if not device_type:
         device_type = "autodetect"
-    # If a specific port was set
-    if con_instance.host.port:
-        try:
-            # Set the port in a try block in case a non-integer was passed
-            port = int(con_instance.host.port)
-        except ValueError:
-            log.error("connectors.cli._assemble_credential:\
- Port number ({}) must be an integer! Using port 22 instead.".format(
-                con_instance.host.port))
-            # Set port 22 as the default
-            port = 22
-    else:  # If no port was defined
-        # Set port 22 as the default
-        port = 22
+    port = _get_port(con_instance)
     # Build final assembled Netmiko-compatible credential/address set
     assembled = {
         "ip": con_instance.address,
@@ -150,19 +347,53 @@ def _assemble_credential(con_instance, credential):
         "timeout": con_instance.timeout,
         "port": port
     }
+    # Send keepalives on connections which will be held open for a while
+    if con_instance.keepalive:
+        assembled.update({"keepalive": con_instance.keepalive})
+    # Add any phase-specific timeouts using their Netmiko names
+    for key in TIMEOUT_MAP:
+        if key in con_instance.timeouts:
+            assembled.update({TIMEOUT_MAP[key]: con_instance.timeouts[key]})
     log.debug("connectors.cli._assemble_credential: Returning:\n%s"
               % json.dumps(assembled, indent=4))
     return assembled
 
 
+def _get_port(con_instance):
+    """
+    connectors.cli._get_port returns the integer TCP port to use for the
+    connection, defaulting to 22.
+    """
+    # If a specific port was set
+    if con_instance.host.port:
+        try:
+            # Set the port in a try block in case a non-integer was passed
+            return int(con_instance.host.port)
+        except ValueError:
+            log.error("connectors.cli._get_port:\
+ Port number ({}) must be an integer! Using port 22 instead.".format(
+                con_instance.host.port))
+    # Set port 22 as the default
+    return 22
+
+
 def _execute(con_instance, credential):
     """
     connectors.cli._execute performs the connection/autodiscovery attempts
     using the Netmiko library. It returns either a True or False value to the
     caller. True if the connection was successful, False if it was not.
     """
-    # Add an empty dict in case we error out before connecting
-    con_instance.host.info.update({"cli": {}})
+    # Add an empty dict in case we error out before connecting. Keep it if
+    #  this is a retry.
+    if "cli" not in con_instance.host.info:
+        con_instance.host.info.update({"cli": {}})
+    con_instance.transient = False
+    con_instance.attempts += 1
+    con_instance.host.info["cli"].update(
+        {"attempts": con_instance.attempts})
+    host = con_instance.host
+    sockets = []  # Sockets we opened for Netmiko, closed if we fail
+    connected = False
     # Expect exceptions since we now executing the connection
     try:
         if credential["device_type"] == "autodetect":
@@ -172,9 +403,13 @@ def _execute(con_instance, credential):
             # Trip idle flag since we are working on this connection now
             con_instance.idle = False
             # Connect to device to start type detection
-            device = netmiko.SSHDetect(**credential)
+            sock = _tcp_connect(con_instance, credential, sockets)
+            with host.timed("login", username=credential["username"],
+                            autodetect=True):
+                device = netmiko.SSHDetect(sock=sock, **credential)
             # Run detection function
-            dtype = device.autodetect()
+            with host.timed("autodetect"):
+                dtype = device.autodetect()
             # If None was returned by the function
             if not dtype:
                 log.warning("connectors.cli._execute:\
@@ -200,9 +435,13 @@ def _execute(con_instance, credential):
                   % (con_instance.get_address(), json.dumps(credential, indent=4)))
         con_instance.idle = False
         # Make Netmiko connection via SSH or TELNET
-        device = netmiko.ConnectHandler(**credential)
+        sock = _tcp_connect(con_instance, credential, sockets)
+        with host.timed("login", username=credential["username"]):
+            device = netmiko.ConnectHandler(sock=sock, **credential)
         # Detect and clean the hostname
-        hostname = device.find_prompt().replace("#", "")
+        with host.timed("find_prompt"):
+            hostname = device.find_prompt()
+        hostname = hostname.replace("#", "")
         hostname = hostname.replace(">", "")
         log.info(
             "connectors.cli._execute: Connected to (%s) with address (%s)"
@@ -219,17 +458,52 @@ def _execute(con_instance, credential):
         # Set the type on the parent host_class instance
         con_instance.host.type = credential["device_type"]
         # Return True since we successfully connected
+        connected = True
         return True
-    except netmiko.exceptions.NetmikoTimeoutException:
-        # Exception thrown when TCP connectivity cannot establish. Set failed
-        #  and return since there is no use in trying to connect with a
-        #  different credential.
+    except (socket.timeout, socket.gaierror):
+        # Our own TCP connection timed out or the name did not resolve. The
+        #  device never answered. Same as a Netmiko timeout below.
         log.warning(
             "connectors.cli._execute: Device (%s) timed out. Discarding"
             % con_instance.get_address())
         con_instance.idle = True
         con_instance.failed = True
         return False
+    except netmiko.exceptions.NetmikoTimeoutException as e:
+        con_instance.idle = True
+        # Refused or unreachable TCP connections (wrapped by Netmiko) are
+        #  not worth trying again
+        if _unreachable(e.__context__):
+            log.warning(
+                "connectors.cli._execute: Device (%s) is unreachable (%s).\
+ Discarding" % (con_instance.get_address(), e.__context__))
+            con_instance.failed = True
+            return False
+        # Timeouts and DNS failures (the device never answered) come
+        #  from socket.timeout and socket.gaierror
+        if isinstance(e.__context__, (socket.timeout, socket.gaierror)):
+            # Exception thrown when TCP connectivity cannot establish. Set
+            #  failed and return since there is no use in trying to connect
+            #  with a different credential.
+            log.warning(
+                "connectors.cli._execute: Device (%s) timed out. Discarding"
+                % con_instance.get_address())
+            con_instance.failed = True
+            return False
+        if _dropped(e.__context__):
+            # The device answered but dropped the SSH session while it was
+            #  being set up (ie: VTY lines exhausted). Worth trying again.
+            log.warning(
+                "connectors.cli._execute: Device (%s) refused the session"
+                % con_instance.get_address())
+            con_instance.transient = True
+            return False
+        # The SSH session could not be set up (ie: no matching ciphers).
+        #  Continue with the next credential.
+        log.warning(
+            "connectors.cli._execute: Device (%s) SSH session failed (%s)"
+            % (con_instance.get_address(), e.__context__))
+        return False
     except netmiko.exceptions.NetmikoAuthenticationException:
         # Exception thrown when authentication fails. Do not set as failed
         #  since we may have another credential to try
@@ -238,6 +512,31 @@ def _execute(con_instance, credential):
             % con_instance.get_address())
         con_instance.idle = True
         return False
+    except (EOFError, socket.error, paramiko.SSHException) as e:
+        con_instance.idle = True
+        # The TCP connection was refused or the host is unreachable. Same
+        #  as a timeout; there is no use in trying again.
+        if _unreachable(e):
+            log.warning(
+                "connectors.cli._execute: Device (%s) is unreachable (%s).\
+ Discarding" % (con_instance.get_address(), e))
+            con_instance.failed = True
+            return False
+        log.debug("connectors.cli._execute: Session failure traceback:",
+                  exc_info=True)
+        if _dropped(e):
+            # The session was dropped while being set up. Worth trying again.
+            log.warning(
+                "connectors.cli._execute: Device (%s) dropped the session (%s)"
+                % (con_instance.get_address(), e))
+            con_instance.transient = True
+            return False
+        # The SSH session could not be set up (ie: no matching ciphers).
+        #  Continue with the next credential.
+        log.warning(
+            "connectors.cli._execute: Device (%s) SSH session failed (%s)"
+            % (con_instance.get_address(), e))
+        return False
     except Exception as e:
         # Unexpected exception thrown. Log it and continue with next cred
         log.exception(
@@ -245,10 +544,66 @@ def _execute(con_instance, credential):
             % con_instance.get_address())
         con_instance.idle = True
         return False
+    finally:
+        if not connected:
+            # Netmiko normally closes these on failure, but make sure
+            for sock in sockets:
+                sock.close()
     # Return False here in case we fell out of above code without a return
     return False
 
 
+def _unreachable(error):
+    """
+    connectors.cli._unreachable returns True if error means the TCP
+    connection could not be made at all (refused, or no route to the host
+    or network), as opposed to an SSH session dropped after connecting.
+    """
+    return isinstance(error, ConnectionRefusedError) or (
+        isinstance(error, OSError) and error.errno in UNREACHABLE_ERRNOS)
+
+
+def _dropped(error):
+    """
+    connectors.cli._dropped returns True if error means the connection was
+    closed, reset, or timed out while the SSH session was being set up (ie:
+    VTY lines exhausted), which is worth trying again. SSH errors count only
+    when raised because of one of those, so permanent ones (ie: no matching
+    key exchange or cipher) are not retried.
+    """
+    while error is not None:
+        if isinstance(error, (EOFError, socket.timeout)):
+            return True
+        if isinstance(error, OSError):
+            return error.errno in DROPPED_ERRNOS
+        if not isinstance(error, paramiko.SSHException):
+            return False
+        # Paramiko raises this when the transport closed before login
+        if "No existing session" in str(error):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _tcp_connect(con_instance, credential, sockets):
+    """
+    connectors.cli._tcp_connect opens the TCP connection for an SSH login
+    ourselves (instead of letting Netmiko do it) so the time taken by the
+    TCP connection and the time taken by the SSH login can be recorded
+    separately in the host's timing info. The socket is appended to
+    sockets and returned. None is returned for TELNET and serial types,
+    which Netmiko connects on its own.
+    """
+    if re.findall("_telnet$|_serial$", credential["device_type"]):
+        return None
+    address = (credential["ip"], credential["port"])
+    with con_instance.host.timed("tcp_connect", address=credential["ip"]):
+        sock = socket.create_connection(
+            address, credential.get("conn_timeout", CONNECT_TIMEOUT))
+    sockets.append(sock)
+    return sock
+
+
 def _order_credentials(credentials, type_order):
     """
     connectors.cli._order_credentials builds a host-specific list of
@@ -258,39 +613,9 @@ def _order_credentials(credentials, type_order):
     the cli connector more effeciently determine the appropriate credential
     to log in to the host.
     """
-    ordered = {}  # Credentials with an ordered type: highest pref
-    unordered_untyped = []  # Credentials with an ordered type: middle pref
-    unordered_typed = []  # Credentials with an ordered type: lowest pref
-    for credential in credentials:
-        if credential["type"]:  # If there is a type in the credential
-            # And that type is in the provided ordered types
-            if credential["type"] in type_order:
-                # And that credential has not been added to the ordered dict
-                if credential["type"] not in ordered:
-                    # Start a new dict with that credential in it
-                    ordered.update({credential["type"]: [credential]})
-                else:
-                    # Add that credential to that keyed list
-                    ordered[credential["type"]].append(credential)
-            else:  # If the type was not in type_order
-                unordered_typed.append(credential)
-        else:  # If the credential had no type
-            unordered_untyped.append(credential)
-    # Build a deduplicated copy of the type_order list so we don't accidently
-    #  add the same credential to the final result multiple times
-    type_order_dedup = []
-    for ctype in type_order:
-        if ctype not in type_order_dedup:
-            type_order_dedup.append(ctype)
-    result = []
-    # Add ordered and typed credentials to the result first, in the order of
-    #  the type_order provided
-    for ctype in type_order_dedup:
-        # If we had any credentials with that type
-        if ctype in ordered:
-            result += ordered[ctype]
-    # Middle preference is unordered and untype credentials
-    result += unordered_untyped
-    # Last preference is unordered credentials which are typed
-    result += unordered_typed
-    return result
+    # Credentials from common.credentials.parse_credentials are already
+    #  bucketed by type and keep each order they have built, so hosts of
+    #  the same type don't sort through all the credentials again
+    if not isinstance(credentials, common_credentials.credential_set):
+        credentials = common_credentials.credential_set(credentials)
+    return credentials.ordered(type_order)
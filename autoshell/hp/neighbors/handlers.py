@@ -14,22 +14,40 @@ def hp_neighbor_handler(con_instance, lldp=True, cdp=True):
     hp.neighbors.handlers.hp_neighbor_handler is an externally
     called function which accepts a common.hosts.connection_class instance,
     runs the show commands, then parses the output through the neighbor data
-    scrapers to get the normalized data.
+    scrapers to get the normalized data. The commands are run on a channel
+    checked out from the connection_class instance. The time taken by each
+    command and scraper is recorded in the host's timing info.
     """
     lldp_data = []  # Storage of JSON serializable LLDP neighbor data
     cdp_data = []  # Storage of JSON serializable CDP neighbor data
-    if lldp:  # If we are checking LLDP
-        lldp_data = cli.scrapers.hp_lldp_de_scraper(
-            con_instance.connection.send_command(
-                "show lldp info remote-device all")
-        )
-    if cdp:  # If we are checking CDP
-        cdp_data = cli.scrapers.hp_cdp_scraper(
-            con_instance.connection.send_command(
-                "show cdp neighbors detail")
-        )
+    host = con_instance.host
+    with con_instance.channel() as connection:
+        if lldp:  # If we are checking LLDP
+            # Send the show commands to the host
+            lldp_detail = _send_command(host, connection,
+                                        "show lldp info remote-device all")
+        if cdp:  # If we are checking CDP
+            cdp_detail = _send_command(host, connection,
+                                       "show cdp neighbors detail")
+    # Parse the output through the proper scrapers once we are done with
+    #  the channel
+    if lldp:
+        with host.timed("neighbor_scrape", protocol="lldp"):
+            lldp_data = cli.scrapers.hp_lldp_de_scraper(lldp_detail)
+    if cdp:
+        with host.timed("neighbor_scrape", protocol="cdp"):
+            cdp_data = cli.scrapers.hp_cdp_scraper(cdp_detail)
     # Format the data into a dict and return it
     return {
         "lldp": lldp_data,
         "cdp": cdp_data,
     }
+
+
+def _send_command(host, connection, command):
+    """
+    hp.neighbors.handlers._send_command sends a show command on the
+    connection, recording how long it took in the host's timing info.
+    """
+    with host.timed("neighbor_command", command=command):
+        return connection.send_command(command)
@@ -1,3 +1,25 @@
-from . import crawl
-from . import cmd
-from . import neighbors
+import sys
+import importlib
+
+
+# Bundled modules. They are imported the first time they are used (ie:
+#  autoshell.modules.cmd) instead of when autoshell.modules is imported, so
+#  only the modules asked for in the arguments are loaded.
+BUNDLED = ["crawl", "cmd", "neighbors"]
+
+
+def __getattr__(attribute):
+    """
+    autoshell.modules.__getattr__ imports the bundled modules on first use
+    (Python 3.7+).
+    """
+    if attribute in BUNDLED:
+        return importlib.import_module("." + attribute, __name__)
+    raise AttributeError("module '%s' has no attribute '%s'"
+                         % (__name__, attribute))
+
+
+# Module __getattr__ is not supported before Python 3.7. Import everything.
+if sys.version_info < (3, 7):
+    for _module in BUNDLED:
+        importlib.import_module("." + _module, __name__)
@@ -10,15 +10,19 @@ host will be printed to the screen after execution.
 # Built-In Libraries
 import os
 import json
+import time
+import queue
 import logging
 import datetime
+import threading
 from builtins import input
 
 # Autoshell Libraries
 import autoshell
 
 # Installed Libraries
-from jinja2 import Template
+#  jinja2 is imported by output_files._build_j2_path when it is first needed
+#  since importing it slows down every run of AutoShell
 
 # Linux-only Libraries
 try:
@@ -34,6 +38,14 @@ log = logging.getLogger("modules")
 datalog = logging.getLogger("data")
 
 
+# Seconds between flushes of the output files, so they can be followed
+#  (ie: with tail -f) while the commands run
+FLUSH_INTERVAL = 1
+
+# Bytes of output buffered for each output file between flushes
+WRITE_BUFFER = 1024 * 1024
+
+
 # <module_name>.add_parser_options is an *OPTIONAL* reserved name which is
 #  called by the AutoShell core system when the module is initially loaded.
 #  This allows external modules to add their own arguments to the core
@@ -102,32 +114,41 @@ def run(ball):
         ball.args.output_file,
         ball.args.per_host_output_file,
         ball.args.append_output_files)
-    # If command(s) were provided from the shell, we don't prompt the user
-    if ball.args.command:
-        log.info("cmd.run:\
+    # The output files are always closed (writing out anything still
+    #  queued or buffered) however the module is left
+    try:
+        # If command(s) were provided from the shell, we don't prompt the user
+        if ball.args.command:
+            log.info("cmd.run:\
  Command(s) provided from core. Skipping user interaction")
-        for command in ball.args.command:
-            execute(ball, command, out_files)
-        out_files.close_all()
-    # Otherwise we need to prompt the user repetitively for commands
-    else:
-        # Use try/except to allow user to break loop with CTRL+C
-        try:
-            # Use a while loop to keep asking until user is done
-            while True:
-                command = input("cmd> ")
-                if command:
-                    execute(ball, command, out_files)
-        except KeyboardInterrupt:
-            log.warning("cmd.run:\
+            for command in ball.args.command:
+                execute(ball, command, out_files)
+        # Otherwise we need to prompt the user repetitively for commands
+        else:
+            # Use try/except to allow user to break loop with CTRL+C, or
+            #  with CTRL+D (or the end of piped input)
+            try:
+                # Use a while loop to keep asking until user is done
+                while True:
+                    command = input("cmd> ")
+                    if command:
+                        execute(ball, command, out_files)
+            except KeyboardInterrupt:
+                log.warning("cmd.run:\
  User interrupt detected. Returning control to the AutoShell core")
-            out_files.close_all()
+            except EOFError:
+                log.info("cmd.run:\
+ End of input. Returning control to the AutoShell core")
+    finally:
+        out_files.close_all()
 
 
 class output_files:
     """
     cmd.output_files handles writing the shell output from hosts into
-    statically or dynamically (Jinja2) named file paths.
+    statically or dynamically (Jinja2) named file paths. Each file is
+    written by its own file_writer thread, so the worker threads of many
+    hosts can share a file without their output blocks being interleaved.
     """
     def __init__(self,
                  output_file_list,
@@ -139,19 +160,22 @@ class output_files:
         # Maps host objects to a list of file objects
         # Used to list the output files assigned to a particular host
         self._host_map = {}
-        # Maps file paths to a list of file objects
+        # Maps file paths to their file_writer
         # Used to keep track of all opened files and not open one twice
         self._file_map = {}
         self._append_output_files = append_output_files
+        # Worker threads of different hosts map their files at the same
+        #  time, and must not open (and truncate) a file twice
+        self._map_lock = threading.Lock()
 
     def _build_host_files(self, host):
         """
         cmd.output_files._build_host_files uses the user-input output file
         paths combined with information from a connected host (and host.info
-        when generating per-host files) to generate a list of file objects
+        when generating per-host files) to generate a list of file writers
         which should be assigned to a particular host, returning that list
         """
-        file_list = []  # List of file objects to be assigned to this host
+        file_list = []  # List of file writers to be assigned to this host
         if self._output_file_list:  # If there are static filepaths
             for filepath in self._output_file_list:  # Iterate them
                 # Use _get_file to look up the correct existing file or
@@ -174,8 +198,8 @@ class output_files:
         """
         cmd.output_files._get_file checks for the existence of the
         user-provided filepath, creates directories for it if necessary, and
-        creates the file, returning the object. If the file already exists, it
-        will simply open the file and return the file object.
+        creates the file, returning a file_writer for it. If the file was
+        already opened, the existing file_writer is returned.
         """
         # If we didn't create this file already
         if filepath not in self._file_map:
@@ -191,13 +215,16 @@ class output_files:
                         os.makedirs(os.path.dirname(filepath), exist_ok=True)
                 log.info('cmd.output_files._get_file:\
  Creating new output file ({})'.format(filepath))
-                # Create the file object
+                # Create the file object, buffered since its file_writer
+                #    flushes it periodically
                 file_obj = open(filepath,
-                                ('a' if self._append_output_files else 'w'))
-                # Add the file object and path to the map so we can
+                                ('a' if self._append_output_files else 'w'),
+                                buffering=WRITE_BUFFER)
+                # Add the file writer and path to the map so we can
                 #    find it later
-                self._file_map.update({filepath: file_obj})
-                return file_obj
+                writer = file_writer(filepath, file_obj)
+                self._file_map.update({filepath: writer})
+                return writer
             except Exception as e:
                 log.exception('cmd.output_files._get_file:\
  Exception when creating file ({}):'.format(filepath))
@@ -215,6 +242,7 @@ class output_files:
         """
         log.debug('cmd.output_files._build_j2_path:\
  Processing dynamic filepath ({}) for host ({})'.format(j2path, host.hostname))
+        from jinja2 import Template
         # Initialize the Jinja2 template wit the user-input string
         template = Template(j2path)
         # Add the current date and time in case that is desired for file naming
@@ -239,15 +267,20 @@ class output_files:
         """
         # If we have not generated the output files for this host yet
         if host not in self._host_map:
-            # Add the hosts list of output files to the host map
-            hostfiles = self._build_host_files(host)
-            if hostfiles:
-                log.debug('cmd.output_files.write:\
-     Mapping host ({}) to files ({})'.format(host.hostname, hostfiles))
-            self._host_map.update({host: hostfiles})
-        for file in self._host_map[host]:  # For each file mapped to the host
-            file.write(output)  # Write (append) the output to the file
-            file.flush()  # Flush the object state to write the changes
+            with self._map_lock:
+                if host not in self._host_map:
+                    # Add the hosts list of output files to the host map
+                    hostfiles = self._build_host_files(host)
+                    if hostfiles:
+                        log.debug('cmd.output_files.write:\
+ Mapping host ({}) to files ({})'.format(
+                            host.hostname,
+                            [writer.path for writer in hostfiles]))
+                    self._host_map.update({host: hostfiles})
+        for writer in self._host_map[host]:  # For each file mapped to the host
+            # Queue the output to be written as one block by the file's
+            #    writer thread
+            writer.write(output)
 
     def close_all(self):
         """
@@ -258,7 +291,79 @@ class output_files:
         for filename in self._file_map:  # For each filename in the map
             log.debug('cmd.output_files.close_all:\
  Closing out file ({})'.format(filename))
-            self._file_map[filename].close()  # Close out the file object
+            # Write out the queued output, sync it to disk, and close the file
+            self._file_map[filename].close()
+
+
+class file_writer:
+    """
+    cmd.file_writer writes the output blocks queued for one output file from
+    its own thread, one whole block at a time and in the order they were
+    queued. The file is buffered and only flushed every FLUSH_INTERVAL
+    seconds, and it is synced to disk when closed.
+    """
+    def __init__(self, path, file_obj):
+        self.path = path
+        self._file = file_obj
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+                                        name="cmd-writer")
+        # Don't hold up an interrupted program
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, output):
+        """
+        cmd.file_writer.write queues an output block to be written.
+        """
+        self._queue.put(output)
+
+    def close(self):
+        """
+        cmd.file_writer.close waits for the queued output to be written,
+        then syncs the file to disk and closes it.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)  # None tells the thread to finish up
+            self._thread.join()
+
+    def _run(self):
+        """
+        cmd.file_writer._run is the writer thread. It writes each block as
+        it arrives and flushes the file when FLUSH_INTERVAL has passed with
+        unflushed output.
+        """
+        last_flush = time.time()
+        dirty = False  # If there is output written since the last flush
+        while True:
+            try:
+                output = self._queue.get(
+                    timeout=FLUSH_INTERVAL if dirty else None)
+            except queue.Empty:
+                output = ""  # Nothing arrived. Check if it is time to flush
+            if output is None:
+                break
+            try:
+                if output:
+                    self._file.write(output)
+                    dirty = True
+                if dirty and time.time() - last_flush >= FLUSH_INTERVAL:
+                    self._file.flush()
+                    dirty = False
+                    last_flush = time.time()
+            except Exception:
+                log.exception('cmd.file_writer._run:\
+ Exception when writing to file ({}):'.format(self.path))
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            log.exception('cmd.file_writer._run:\
+ Exception when syncing file ({}):'.format(self.path))
+        finally:
+            self._file.close()
 
 
 def execute(ball, command, out_files):
@@ -310,7 +415,6 @@ def cmd(parent, host, ball, command, out_files):
     """
     cmd.cmd is the worker function for cmd.
     """
-    connection = host.connections["cli"].connection
     output = ""
     command_head = str(command)
     config = False
@@ -320,39 +424,46 @@ def cmd(parent, host, ball, command, out_files):
     command_set = command.split("\\n")
     if not ball.args.newline_split:  # If we are not splitting lines
         command = command.replace("\\n", "\n")
-    if ball.args.enable:
-        output += connection.find_prompt()
-        output += connection.enable()
-        output += "\n"
-    if config:
-        try:
-            output += connection.find_prompt()
-            if ball.args.newline_split:  # If we are splitting lines
-                output += connection.send_config_set(command_set)
-            else:
-                output += connection.config_mode()
-                output += "\n"+connection.find_prompt()+command+"\n"
-                output += _clean_blank_lines(connection.send_command(command))
-                output += connection.exit_config_mode()
-        except Exception as e:
-            log.exception(f'cmd.cmd: Exception raised on host '
-                          f'({host.address}) ({host.hostname})')
-    else:
-        # Insert current prompt into output
-        output += connection.find_prompt()
-        if ball.args.newline_split:  # If we are splitting lines
-            for cmd in command_set:
-                # Insert current command into output
-                output += cmd + "\n"
-                # Send command and add returned data to output
-                output += connection.send_command(cmd)
-                # Add line break in case another command is coming
+    # Check out a channel to the host. Other modules (or other commands)
+    #  may be using the host at the same time on their own channels.
+    with host.connections["cli"].channel() as connection:
+        # Record how long the command took in the host's timing info
+        with host.timed("command", command=command_head):
+            if ball.args.enable:
+                output += connection.find_prompt()
+                output += connection.enable()
                 output += "\n"
-        else:
-            # Insert current command into output
-            output += command + "\n"
-            # Send command and add returned data to output
-            output += _clean_blank_lines(connection.send_command(command))
+            if config:
+                try:
+                    output += connection.find_prompt()
+                    if ball.args.newline_split:  # If we are splitting lines
+                        output += connection.send_config_set(command_set)
+                    else:
+                        output += connection.config_mode()
+                        output += "\n"+connection.find_prompt()+command+"\n"
+                        output += _clean_blank_lines(
+                            connection.send_command(command))
+                        output += connection.exit_config_mode()
+                except Exception as e:
+                    log.exception(f'cmd.cmd: Exception raised on host '
+                                  f'({host.address}) ({host.hostname})')
+            else:
+                # Insert current prompt into output
+                output += connection.find_prompt()
+                if ball.args.newline_split:  # If we are splitting lines
+                    for cmd in command_set:
+                        # Insert current command into output
+                        output += cmd + "\n"
+                        # Send command and add returned data to output
+                        output += connection.send_command(cmd)
+                        # Add line break in case another command is coming
+                        output += "\n"
+                else:
+                    # Insert current command into output
+                    output += command + "\n"
+                    # Send command and add returned data to output
+                    output += _clean_blank_lines(
+                        connection.send_command(command))
     wrapped_output = wrap_output(host, output, command_head)
     datalog.info(wrapped_output)
     out_files.write(host, wrapped_output)
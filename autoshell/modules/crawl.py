@@ -124,7 +124,11 @@ def run(ball):
     log.debug("crawl.run: Starting crawl of LLDP/CDP neighbors")
     queue = autoshell.common.autoqueue.autoqueue(10, crawl, (ball, ))
     options.queue = queue
+    # Number of hops from the seed hosts keyed by host. Hosts closer to the
+    #  seeds are crawled first.
+    options.hops = {}
     for host in ball.hosts.hosts:
+        options.hops.update({host: 0})
         queue.put(host)
     queue.block()
     log.debug("crawl.run: Complete. Returning control to the AutoShell core")
@@ -165,11 +169,12 @@ def crawl(parent, host, ball):
     # Check host validity and find its handler set
     ############################################################
     for connection in host.connections:
-        # If any of the connections in the host are not idle
-        if not host.connections[connection].idle:
-            # Then the connections are still trying to be made. Drop them in
-            #  the back of the queue and try them later.
-            options.queue.put(host)
+        # If any of the connections in the host have not completed
+        if not host.connections[connection].done.is_set():
+            # Then the connections are still trying to be made. Put the
+            #  host back in the queue to be tried again in a second.
+            options.queue.put(host, delay=1,
+                              priority=options.hops.get(host, 0))
             return None
     if not host.type:
         # If the host does not have a type, then we don't know which handler
@@ -204,18 +209,13 @@ def crawl(parent, host, ball):
     #  connections in host.connections.
     for handler_type in handler_dict["handlers"]:
         # If the connection (which is a hosts.connection_class instance) is
-        #  not connected and idle.
-        if not (host.connections[handler_type].idle
-                and host.connections[handler_type].connected):
-            if host.connections[handler_type].failed:
-                # And if it is also flagged as failed. Then discard it
-                log.warning("crawl.crawl:\
+        #  not connected. All connection attempts have completed by now
+        #  so it will never connect.
+        if not (host.connections[handler_type].connected
+                and not host.connections[handler_type].failed):
+            log.warning("crawl.crawl:\
  Host (%s) failed. Discarding" % host.get_address())
-                return None
-            else:
-                # If it is not failed, then requeue it and return
-                options.queue.put(host)
-                return None
+            return None
         ############################################################
         # BUG: Why are we checking if the host has the type here?????
         #  It would have already thrown an error above.
@@ -287,4 +287,6 @@ def crawl(parent, host, ball):
                                         neighbor_instance.get_attrib(
                                             "addresses"),
                                         host.hostname, host.get_address()))
-                            options.queue.put(newhost)
+                            hops = options.hops.get(host, 0) + 1
+                            options.hops.update({newhost: hops})
+                            options.queue.put(newhost, priority=hops)
@@ -21,30 +21,20 @@ import autoshell
 log = logging.getLogger("modules")
 
 
-# Instantiate an ad-hoc namespace object we will use to store state info
-#  during load(). We then pick up that state info when we are run()
-options = type('crawl_options', (), {})()
-
-
-# <module_name>.run is a *REQUIRED* reserved name which is called by
-#  the AutoShell core system once during its main run through the modules,
-#  after it has finished connecting to all the hosts.
-def run(ball):
-    log.debug("neighbors.run: Pulling LLDP/CDP neighbors")
-    queue = autoshell.common.autoqueue.autoqueue(10, worker, (ball, ))
-    options.queue = queue
-    for host in ball.hosts.hosts:
-        queue.put(host)
-    queue.block()
-    log.debug("neighbors.run:\
- Complete. Returning control to the AutoShell core")
+# <module_name>.run_host is an *OPTIONAL* reserved name which is called by
+#  the AutoShell core system with each host as soon as it connects, while
+#  the connections to the other hosts are still being made.
+def run_host(ball, host):
+    log.debug("neighbors.run_host: Pulling LLDP/CDP neighbors from (%s)"
+              % host.get_address())
+    worker(None, host, ball)
 
 
 def worker(parent, host, ball):
     """
     neighbors.worker is the worker function for for the neighbors module.
     The process followed is:
-        - Receives common.hosts.host_class instances from the queue
+        - Receives common.hosts.host_class instances from run_host
         - Look up the host neighbor handler from common.neighbors.HANDLER_MAP
         - Uses the crawl handler to pull LLDP/CDP neighbor data
         - Filters the neighbors using the crawl filters
@@ -57,12 +47,9 @@ def worker(parent, host, ball):
     # Check host validity
     ############################################################
     for connection in host.connections:
-        # If any of the connections in the host are not idle
-        if not host.connections[connection].idle:
-            # Then the connections are still trying to be made. Drop them in
-            #  the back of the queue and try them later.
-            options.queue.put(host)
-            return None
+        # Wait for any connections in the host which are still trying to
+        #  be made
+        host.connections[connection].wait()
     if not host.type:
         # If the host does not have a type, then we don't know which handler
         #  to use. Discard and do not pull neighbor data from it.
@@ -101,18 +88,13 @@ def worker(parent, host, ball):
     #  connections in host.connections.
     for handler_type in handler_dict["handlers"]:
         # If the connection (which is a hosts.connection_class instance) is
-        #  not connected and idle.
-        if not (host.connections[handler_type].idle
-                and host.connections[handler_type].connected):
-            if host.connections[handler_type].failed:
-                # And if it is also flagged as failed. Then discard it
-                log.warning("neighbors.worker:\
+        #  not connected. All connection attempts have completed by now
+        #  so it will never connect.
+        if not (host.connections[handler_type].connected
+                and not host.connections[handler_type].failed):
+            log.warning("neighbors.worker:\
  Host (%s) failed. Discarding" % host.get_address())
-                return None
-            else:
-                # If it is not failed, then requeue it and return
-                options.queue.put(host)
-                return None
+            return None
         ############################################################
         # BUG: Why are we checking if the host has the type here?????
         #  It would have already thrown an error above.
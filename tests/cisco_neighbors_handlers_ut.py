@@ -17,6 +17,7 @@ from builtins import input
 # Autoshell Libraries
 for each in os.walk(os.path.pardir):
     sys.path.append(each[0])
+import autoshell.common as common
 import autoshell.cisco.neighbors.handlers as handlers
 
 log = logging.getLogger("modules")
@@ -50,9 +51,12 @@ class fake_host:
 
 
 def test_cisco_ios_neighbor_handler():
-    host = fake_host()
-    data = handlers.cisco_ios_neighbor_handler(host)
+    host = common.hosts.host_class("192.0.2.1")
+    con_instance = common.hosts.connection_class("192.0.2.1", host, 30)
+    con_instance.connection = fake_host()
+    data = handlers.cisco_ios_neighbor_handler(con_instance)
     log.info("Result:\n%s" % json.dumps(data, indent=4))
+    log.info("Timing:\n%s" % json.dumps(host.info["timing"], indent=4))
 
 
 def run_tests(args):
@@ -17,7 +17,7 @@ from builtins import input
 # Autoshell Libraries
 for each in os.walk(os.path.pardir):
     sys.path.append(each[0])
-import common.autoqueue
+import autoshell.common as common
 
 log = logging.getLogger("shared")
 consoleHandler = logging.StreamHandler()
@@ -44,9 +44,91 @@ def test_common_autoqueue():
     queue.block()
 
 
+def test_delayed_put():
+    import time
+    start = time.time()
+
+    def test_worker(parent, input_data):
+        # Put each item back once with a delay, like a connection retry
+        if input_data["tries"] < 2:
+            input_data["tries"] += 1
+            parent.autoqueue.put(input_data, delay=input_data["tries"])
+            return None
+        log.info("common_autoqueue_ut.test_delayed_put:\
+ Item (%s) done after (%.1f) seconds" % (input_data["item"],
+                                         time.time() - start))
+    queue = common.autoqueue.autoqueue(
+            thread_count=2,
+            worker_func=test_worker,
+            worker_args=None)
+    for item in range(10):
+        queue.put({"item": item, "tries": 0})
+    queue.block()
+
+
+def test_priority():
+    import time
+    order = []
+
+    def test_worker(parent, input_data):
+        order.append(input_data)
+    queue = common.autoqueue.autoqueue(
+            thread_count=1,
+            worker_func=test_worker,
+            worker_args=None)
+    # Held back for a second, even though it has the best priority
+    queue.put("late", priority=-1, not_before=time.time() + 1)
+    for priority in [3, 1, 2, 1, 0]:
+        queue.put("priority-%s" % priority, priority=priority)
+    queue.block()
+    log.info("common_autoqueue_ut.test_priority: Order: %s" % order)
+
+
+def test_metrics():
+    import random
+
+    def test_worker(parent, input_data):
+        # Fail one in five items so the failed counter gets used
+        if not input_data % 5:
+            raise ValueError("Failing item (%s) on purpose" % input_data)
+    queue = common.autoqueue.autoqueue(
+            thread_count=5,
+            worker_func=test_worker,
+            worker_args=None,
+            name="test_metrics")
+    for item in range(20):
+        queue.put(item, delay=random.random())
+    # Keep a second queue running, like the daemon's connector queues
+    running = common.autoqueue.autoqueue(
+            thread_count=5,
+            worker_func=test_worker,
+            worker_args=None,
+            name="test_metrics_running")
+    for item in range(1, 5):
+        running.put(item)
+    queue.block()
+    running.block(kill=False)
+    log.info("common_autoqueue_ut.test_metrics: Metrics:\n%s"
+             % json.dumps(queue.get_metrics(), indent=4))
+    # Clearing forgets the stopped queue and resets the running one
+    common.autoqueue.clear_metrics()
+    for item in range(1, 3):
+        running.put(item)
+    running.block()
+    log.info("common_autoqueue_ut.test_metrics: Metrics after clearing: %s"
+             % [(each["name"], each["enqueued"], each["completed"])
+                for each in common.autoqueue.all_metrics()])
+
+
 def run_tests(args):
     if args.test_common_autoqueue:
         test_common_autoqueue()
+    if args.test_delayed_put:
+        test_delayed_put()
+    if args.test_priority:
+        test_priority()
+    if args.test_metrics:
+        test_metrics()
 
 
 if __name__ == "__main__":
@@ -57,5 +139,20 @@ if __name__ == "__main__":
                         help="Run test_common_autoqueue",
                         dest="test_common_autoqueue",
                         action='store_true')
+    parser.add_argument(
+                        '-d', "--test_delayed_put",
+                        help="Run test_delayed_put",
+                        dest="test_delayed_put",
+                        action='store_true')
+    parser.add_argument(
+                        '-p', "--test_priority",
+                        help="Run test_priority",
+                        dest="test_priority",
+                        action='store_true')
+    parser.add_argument(
+                        '-m', "--test_metrics",
+                        help="Run test_metrics",
+                        dest="test_metrics",
+                        action='store_true')
     args = parser.parse_args()
     run_tests(args)
@@ -0,0 +1,119 @@
+#!/usr/bin/python
+
+"""
+common_cache_ut contains unit tests for functions in the common_cache
+library, and for the cached config file loading in autoshell.__main__
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+# Autoshell Libraries
+for each in os.walk(os.path.pardir):
+    sys.path.append(each[0])
+import autoshell.common as common
+import autoshell.__main__ as autoshell_main
+
+log = logging.getLogger("shared")
+consoleHandler = logging.StreamHandler()
+fmt = """\
+%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s"""
+format = logging.Formatter(fmt)
+consoleHandler.setFormatter(format)
+log.addHandler(consoleHandler)
+log.setLevel(logging.DEBUG)
+
+
+def test_config_file(filename):
+    # Load the config file twice; the second load should use the cache
+    for attempt in ["first", "second"]:
+        startlogs = []
+        start = time.time()
+        data = autoshell_main.get_config_files(startlogs, [filename])
+        cached = [each for each in startlogs if "cached" in each["message"]]
+        log.info("Result: (%s) load took (%.4f) seconds. Cached: %s. Keys: %s"
+                 % (attempt, time.time() - start, bool(cached),
+                    ", ".join(data)))
+
+
+def test_large_config(count):
+    # Time a config file with COUNT addresses before and after caching,
+    #  and after the file changes
+    log.setLevel(logging.INFO)
+    path = os.path.join(tempfile.mkdtemp(), "config.yml")
+    with open(path, "w") as f:
+        f.write("addresses:\n")
+        for index in range(count):
+            f.write("  - 10.%s.%s.%s@cisco_ios\n" % (
+                index // 65536 % 256, index // 256 % 256, index % 256))
+    for attempt in ["uncached", "cached"]:
+        start = time.time()
+        data = autoshell_main.get_config_files([], [path])
+        log.info("Result: (%s) load of (%s) addresses took (%.3f) seconds"
+                 % (attempt, len(data["addresses"]), time.time() - start))
+    with open(path, "a") as f:
+        f.write("modules: cmd\n")
+    data = autoshell_main.get_config_files([], [path])
+    log.info("Result: Changed file reloaded with modules (%s)"
+             % data.get("modules"))
+    # Config files which define credentials must never be cached
+    with open(path, "a") as f:
+        f.write("credentials: admin:password@cisco_ios\n")
+    autoshell_main.get_config_files([], [path])
+    with open(path, "rb") as f:
+        check = common.cache.digest(f.read())
+    log.info("Result: Config file with credentials cached: %s"
+             % (common.cache.load("config", path, check) is not None))
+
+
+def test_prescan(argv):
+    log.info("Result: %s" % autoshell_main.prescan_args(["autoshell"] + argv))
+
+
+def run_tests(args):
+    if args.cache_dir is not None:
+        os.environ["AUTOSHELL_CACHE_DIR"] = args.cache_dir
+    log.info("Cache directory: %s" % common.cache.cache_dir())
+    if args.config_file:
+        test_config_file(args.config_file)
+    if args.large_config:
+        test_large_config(args.large_config)
+    if args.prescan:
+        test_prescan(args.prescan.split())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='AutoShell - Module Library Test Suite',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+                        '-c', "--cache_dir",
+                        help="Cache directory (empty string disables it)",
+                        metavar='PATH',
+                        dest="cache_dir")
+    parser.add_argument(
+                        '-f', "--config_file",
+                        help="Config file to load twice",
+                        metavar='FILE',
+                        dest="config_file")
+    parser.add_argument(
+                        '-l', "--large_config",
+                        help="Run test_large_config with COUNT addresses",
+                        metavar='COUNT',
+                        type=int,
+                        dest="large_config")
+    parser.add_argument(
+                        '-p', "--prescan",
+                        help="""Arguments to pre-scan
+    Examples:
+        -p '-f config.yml --module=cmd -ml 5 10.0.0.1'""",
+                        metavar='ARGS',
+                        dest="prescan")
+    args = parser.parse_args()
+    run_tests(args)
@@ -10,6 +10,8 @@ common_autoqueue library
 import os
 import sys
 import json
+import time
+import random
 import logging
 import argparse
 from builtins import input
@@ -19,6 +21,7 @@ for each in os.walk(os.path.pardir):
     sys.path.append(each[0])
 #from common_credentials import parse_credentials
 from autoshell.common.credentials import parse_credentials
+import autoshell.common.credentials as credentials
 
 log = logging.getLogger("shared")
 consoleHandler = logging.StreamHandler()
@@ -35,8 +38,48 @@ def test_parse_credentials(args):
     log.info("Result:\n%s" % json.dumps(test, indent=4))
 
 
+def test_vault(args):
+    # Write the credentials into a vault, then load it twice. The second
+    #  load should come from memory.
+    log.setLevel(logging.INFO)
+    start = time.time()
+    parse_credentials(args.creds)
+    log.info("Result: Parsed credentials in (%.3f) seconds"
+             % (time.time() - start))
+    credentials.write_vault(args.vault, args.creds)
+    for attempt in ["first", "second"]:
+        start = time.time()
+        loaded = parse_credentials([args.vault])
+        log.info("Result: (%s) vault load of (%s) credentials took (%.4f)\
+ seconds" % (attempt, len(loaded), time.time() - start))
+    log.info("Result: Vault matches the credentials: %s"
+             % (list(loaded) == list(parse_credentials(args.creds))))
+
+
+def test_order_time(count):
+    # Time ordering COUNT credentials for 1000 hosts of a few types
+    log.setLevel(logging.INFO)
+    types = [None, "cisco_ios", "cisco_nxos", "hp_procurve", "unknown"]
+    creds = credentials.credential_set([{
+        "username": "admin%s" % index,
+        "password": "password%s" % index,
+        "secret": "password%s" % index,
+        "type": random.choice(types)} for index in range(count)])
+    platforms = ["cisco_ios", "cisco_nxos", "hp_procurve"] * 50
+    start = time.time()
+    for index in range(1000):
+        creds.ordered([random.choice(types)] + platforms)
+    log.info("Result: Ordered (%s) credentials for 1000 hosts in (%.3f)\
+ seconds" % (count, time.time() - start))
+
+
 def run_tests(args):
-    test_parse_credentials(args)
+    if args.vault:
+        test_vault(args)
+    elif args.order_time:
+        test_order_time(args.order_time)
+    else:
+        test_parse_credentials(args)
 
 
 if __name__ == "__main__":
@@ -52,9 +95,21 @@ if __name__ == "__main__":
         '-c admin:password123:enablepass@cisco_ios'
         '-c ;$--admin;password123;enablepass$cisco_ios'
         '-c credfile.json'
-        '-c credfile.yml'""",
+        '-c credfile.yml'
+        '-c creds.vault'""",
                         metavar='CRED_STRING/FILE',
                         dest="creds",
                         action='append')
+    parser.add_argument(
+                        '-v', "--vault",
+                        help="Run test_vault, writing the vault to PATH",
+                        metavar='PATH',
+                        dest="vault")
+    parser.add_argument(
+                        '-o', "--order_time",
+                        help="Run test_order_time with COUNT credentials",
+                        metavar='COUNT',
+                        type=int,
+                        dest="order_time")
     args = parser.parse_args()
     run_tests(args)
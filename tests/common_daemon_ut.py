@@ -0,0 +1,63 @@
+#!/usr/bin/python
+
+"""
+common_daemon_ut contains unit tests for functions in the
+common_daemon library
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import json
+import logging
+import argparse
+import tempfile
+import threading
+
+# Autoshell Libraries
+for each in os.walk(os.path.pardir):
+    sys.path.append(each[0])
+import autoshell.common as common
+
+log = logging.getLogger("shared")
+consoleHandler = logging.StreamHandler()
+fmt = """\
+%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s"""
+format = logging.Formatter(fmt)
+consoleHandler.setFormatter(format)
+log.addHandler(consoleHandler)
+log.setLevel(logging.DEBUG)
+
+
+def test_submit():
+    path = os.path.join(tempfile.mkdtemp(), "autoshell.sock")
+
+    def job(request):
+        datalog = logging.getLogger("data")
+        datalog.setLevel(logging.INFO)
+        datalog.info(json.dumps(request["argv"]))
+    server = threading.Thread(target=common.daemon.serve, args=(path, job))
+    server.daemon = True
+    server.start()
+    while not os.path.exists(path):
+        pass
+    code = common.daemon.submit(path, ["-m", "cmd", "-C", "show version"])
+    log.info("Result: Job exited with (%s)" % code)
+
+
+def run_tests(args):
+    if args.test_submit:
+        test_submit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='AutoShell - Module Library Test Suite')
+    parser.add_argument(
+                        '-s', "--test_submit",
+                        help="Run test_submit",
+                        dest="test_submit",
+                        action='store_true')
+    args = parser.parse_args()
+    run_tests(args)
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+
+"""
+common_exclusions_ut contains unit tests for functions in the
+common_exclusions library
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+# Autoshell Libraries
+for each in os.walk(os.path.pardir):
+    sys.path.append(each[0])
+import autoshell.common as common
+
+log = logging.getLogger("shared")
+consoleHandler = logging.StreamHandler()
+fmt = """\
+%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s"""
+format = logging.Formatter(fmt)
+consoleHandler.setFormatter(format)
+log.addHandler(consoleHandler)
+log.setLevel(logging.DEBUG)
+
+
+def test_excluded(args):
+    index = common.exclusions.parse_exclusions(args.exclusions)
+    for address in args.addresses or []:
+        log.info("Result: (%s) excluded: %s"
+                 % (address, index.excluded(address)))
+
+
+def test_lookup_time(count):
+    # Build an index of random /24 networks and time address lookups
+    log.setLevel(logging.INFO)
+    index = common.exclusions.exclusion_index()
+    for number in range(count):
+        index.add("10.%s.%s.0/24" % (random.randrange(256),
+                                     random.randrange(256)))
+    start = time.time()
+    index.compile()
+    log.info("Result: Compiled (%s) exclusions in (%.3f) seconds"
+             % (count, time.time() - start))
+    addresses = ["10.%s.%s.%s" % (random.randrange(256), random.randrange(256),
+                                  random.randrange(256))
+                 for number in range(100000)]
+    start = time.time()
+    hits = len([each for each in addresses if index.excluded(each)])
+    log.info("Result: Checked (%s) addresses (%s excluded) in (%.3f) seconds"
+             % (len(addresses), hits, time.time() - start))
+
+
+def run_tests(args):
+    if args.exclusions:
+        test_excluded(args)
+    if args.lookup_time:
+        test_lookup_time(args.lookup_time)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='AutoShell - Module Library Test Suite',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+                        '-x', "--exclude",
+                        help="""Exclusion (string or file)
+    Examples:
+        -x 10.0.0.0/8 -x 192.0.2.1-50 -x core-router1""",
+                        metavar='EXCLUSION',
+                        dest="exclusions",
+                        action='append')
+    parser.add_argument(
+                        '-a', "--address",
+                        help="Address to check against the exclusions",
+                        metavar='ADDRESS',
+                        dest="addresses",
+                        action='append')
+    parser.add_argument(
+                        '-t', "--lookup_time",
+                        help="Run test_lookup_time with COUNT exclusions",
+                        metavar='COUNT',
+                        type=int,
+                        dest="lookup_time")
+    args = parser.parse_args()
+    run_tests(args)
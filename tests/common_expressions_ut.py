@@ -10,7 +10,9 @@ common_neighbors library
 import os
 import sys
 import json
+import time
 import logging
+import tempfile
 import argparse
 from builtins import input
 
@@ -34,9 +36,36 @@ def test_expressions_class(args):
     log.info("Result:\n%s" % json.dumps(test, indent=4))
 
 
+def test_file_load_time(args):
+    """
+    Time the parsing of a generated unstructured address file and a YAML
+    inventory with (args.load_time) entries each
+    """
+    count = args.load_time
+    lines = tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False)
+    structured = tempfile.NamedTemporaryFile("w", suffix=".yml", delete=False)
+    for index in range(count):
+        address = "10.%s.%s.%s" % (index // 65536 % 256, index // 256 % 256,
+                                   index % 256)
+        lines.write("%s:22@cisco_ios\n" % address)
+        structured.write("- address: %s\n  type: cisco_ios\n" % address)
+    lines.close()
+    structured.close()
+    # Debug logging of every entry would be most of the time
+    log.setLevel(logging.INFO)
+    for name in [lines.name, structured.name]:
+        start = time.time()
+        parse_expression([name], ["-", ":", "%"])
+        log.info("test_file_load_time: Parsed (%s) entries from (%s) in\
+ (%.3f) seconds" % (count, name, time.time() - start))
+        os.remove(name)
+
+
 def run_tests(args):
     if args.expression:
         test_expressions_class(args)
+    if args.load_time:
+        test_file_load_time(args)
 
 
 if __name__ == "__main__":
@@ -48,5 +77,11 @@ if __name__ == "__main__":
                         metavar='EXPRESSION',
                         dest="expression",
                         action='append')
+    parser.add_argument(
+                        '-t', "--load_time",
+                        help="Run test_file_load_time with COUNT entries",
+                        metavar='COUNT',
+                        type=int,
+                        dest="load_time")
     args = parser.parse_args()
     run_tests(args)
@@ -44,12 +44,140 @@ def test_hosts_class():
     hosts_instance.disconnect_all()
 
 
+def test_as_completed():
+    import time
+    import random
+
+    def fake_connect(parent, con_instance, credentials, returner):
+        # Simulate a connection which takes a random amount of time
+        try:
+            time.sleep(random.random() * 3)
+            con_instance.connected = True
+            con_instance.idle = True
+            returner.append(con_instance.host)
+        finally:
+            con_instance.set_done()
+    fake_cli = type("fake_cli", (), {"connect": staticmethod(fake_connect)})
+    hosts_instance = common.hosts.hosts_class([], {"cli": fake_cli}, 30)
+    for index in range(20):
+        hosts_instance.add_host({
+            "address": "192.0.2.%s" % index,
+            "port": None,
+            "type": "cisco_ios"})
+    count = 0
+    for host in hosts_instance.as_completed():
+        log.info("Host ready: %s" % host.address)
+        count += 1
+    log.info("Result: %s of 20 hosts completed" % count)
+
+
+def test_channels():
+    import time
+    import threading
+
+    def fake_open_channel(con_instance):
+        # Simulate opening a new channel on the session
+        time.sleep(0.5)
+        return "channel-%s" % time.time()
+    closed = []
+    fake_cli = type("fake_cli", (), {
+        "open_channel": staticmethod(fake_open_channel),
+        "close_channel": staticmethod(closed.append)})
+    host = common.hosts.host_class("192.0.2.1")
+    con_instance = common.hosts.connection_class(
+        "192.0.2.1", host, 30, channels=3, connector=fake_cli)
+    con_instance.connection = "original"
+    used = []
+
+    def worker():
+        # Each worker holds its channel for a second
+        with con_instance.channel() as channel:
+            used.append(channel)
+            time.sleep(1)
+    threads = [threading.Thread(target=worker) for index in range(9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.info("Result: (%s) jobs ran on (%s) channels"
+             % (len(used), len(set(used))))
+    # Channels still checked out must be closed on disconnect too
+    checked_out = [con_instance.get_channel() for index in range(3)]
+    con_instance.close_channels()
+    log.info("Result: (%s) channels checked out, (%s) closed"
+             % (len(checked_out), len(closed)))
+    # A channel which fails to open must not use up a slot
+    failing_cli = type("failing_cli", (), {
+        "open_channel": staticmethod(lambda con_instance: None)})
+    con_instance = common.hosts.connection_class(
+        "192.0.2.1", host, 30, channels=2, connector=failing_cli)
+    con_instance.connection = "original"
+    for index in range(3):
+        with con_instance.channel() as first:
+            with con_instance.channel(timeout=1) as second:
+                pass
+        log.info("Result: Attempt (%s) got (%s) and (%s)"
+                 % (index, first, second))
+
+
+def test_streaming_load(count):
+    import time
+    import tempfile
+    import tracemalloc
+    first = []
+
+    def fake_connect(parent, con_instance, credentials, returner):
+        # Record when the first connection attempt starts
+        if not first:
+            first.append(time.time())
+        con_instance.set_done()
+    fake_cli = type("fake_cli", (), {"connect": staticmethod(fake_connect)})
+    addresses = tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False)
+    for index in range(count):
+        addresses.write("10.%s.%s.%s:22@cisco_ios\n" % (
+            index // 65536 % 256, index // 256 % 256, index % 256))
+    addresses.close()
+    # Debug logging of every host would be most of the time
+    log.setLevel(logging.INFO)
+    hosts_instance = common.hosts.hosts_class([], {"cli": fake_cli}, 30)
+    tracemalloc.start()
+    start = time.time()
+    hosts_instance.load([addresses.name], block=False)
+    loaded = time.time()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # Stop the queues without waiting for every fake connection
+    for con in hosts_instance.queues:
+        hosts_instance.queues[con].block(timeout=0)
+    os.remove(addresses.name)
+    log.info("Result: (%s) hosts loaded in (%.3f) seconds. First connection\
+ started after (%.3f) seconds. Peak memory (%.1f) MB" % (
+        len(hosts_instance.attempts), loaded - start, first[0] - start,
+        peak / 1048576.0))
+
+
+def test_expand_addresses(args):
+    import itertools
+    # Only pull the first entries so huge networks can be tried too
+    hosts = common.hosts._add_hosts_exp(args.expand)
+    for address_dict in itertools.islice(hosts, 10):
+        log.info("Result: %s" % json.dumps(address_dict))
+    log.info("Result: (%s) more addresses" % sum(1 for each in hosts))
+
 
 def run_tests(args):
     if args.addresses:
         test_parse_hosts(args)
     if args.test_hosts_class:
         test_hosts_class()
+    if args.test_as_completed:
+        test_as_completed()
+    if args.test_channels:
+        test_channels()
+    if args.expand:
+        test_expand_addresses(args)
+    if args.test_streaming_load:
+        test_streaming_load(args.test_streaming_load)
 
 
 if __name__ == "__main__":
@@ -67,5 +195,31 @@ if __name__ == "__main__":
                         help="Run test_hosts_class",
                         dest="test_hosts_class",
                         action='store_true')
+    parser.add_argument(
+                        '-c', "--test_as_completed",
+                        help="Run test_as_completed",
+                        dest="test_as_completed",
+                        action='store_true')
+    parser.add_argument(
+                        '-ch', "--test_channels",
+                        help="Run test_channels",
+                        dest="test_channels",
+                        action='store_true')
+    parser.add_argument(
+                        '-e', "--expand",
+                        help="""Run test_expand_addresses on an address
+    Examples:
+        -e 10.0.0.0/22
+        -e 10.1.1.1-10.1.1.200@cisco_ios
+        -e 10.1.1.1-200:2222""",
+                        metavar='ADDRESS_EXPRESSION',
+                        dest="expand",
+                        action='append')
+    parser.add_argument(
+                        '-sl', "--test_streaming_load",
+                        help="Run test_streaming_load with COUNT hosts",
+                        metavar='COUNT',
+                        type=int,
+                        dest="test_streaming_load")
     args = parser.parse_args()
     run_tests(args)
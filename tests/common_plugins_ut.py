@@ -0,0 +1,81 @@
+#!/usr/bin/python
+
+"""
+common_plugins_ut contains unit tests for functions in the common_plugins
+library
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import time
+import logging
+import argparse
+
+# Autoshell Libraries
+for each in os.walk(os.path.pardir):
+    sys.path.append(each[0])
+import autoshell.common as common
+
+log = logging.getLogger("shared")
+consoleHandler = logging.StreamHandler()
+fmt = """\
+%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s"""
+format = logging.Formatter(fmt)
+consoleHandler.setFormatter(format)
+log.addHandler(consoleHandler)
+log.setLevel(logging.DEBUG)
+
+
+def test_import(names):
+    # Import each module and check which paths were added to sys.path
+    before = list(sys.path)
+    for name in names:
+        try:
+            modname, module = common.plugins.import_module(name)
+        except ImportError as e:
+            log.info("Result: (%s) failed to import: %s" % (name, e))
+            continue
+        log.info("Result: (%s) imported as (%s) from (%s)"
+                 % (name, modname, getattr(module, "__file__", None)))
+    log.info("Result: Paths added to sys.path: %s"
+             % [each for each in sys.path if each not in before])
+
+
+def test_entry_points():
+    # Time finding the entry points, then time it again from the cache
+    for attempt in ["first", "cached"]:
+        common.plugins._entry_points = None
+        start = time.time()
+        found = common.plugins.entry_points()
+        log.info("Result: (%s) found (%s) in (%.4f) seconds"
+                 % (attempt, found, time.time() - start))
+
+
+def run_tests(args):
+    if args.modules:
+        test_import(args.modules)
+    if args.entry_points:
+        test_entry_points()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='AutoShell - Module Library Test Suite',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+                        '-m', "--module",
+                        help="""Module to import
+    Examples:
+        -m cmd -m ../examples/example_module.py -m myplugin""",
+                        metavar='MODULE_NAME',
+                        dest="modules",
+                        action='append')
+    parser.add_argument(
+                        '-e', "--entry_points",
+                        help="Run test_entry_points",
+                        dest="entry_points",
+                        action='store_true')
+    args = parser.parse_args()
+    run_tests(args)
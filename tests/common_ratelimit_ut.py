@@ -0,0 +1,89 @@
+#!/usr/bin/python
+
+"""
+common_ratelimit_ut contains unit tests for functions in the
+common_ratelimit library
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+
+# Autoshell Libraries
+for each in os.walk(os.path.pardir):
+    sys.path.append(each[0])
+import autoshell.common as common
+
+log = logging.getLogger("shared")
+consoleHandler = logging.StreamHandler()
+fmt = """\
+%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s"""
+format = logging.Formatter(fmt)
+consoleHandler.setFormatter(format)
+log.addHandler(consoleHandler)
+log.setLevel(logging.DEBUG)
+
+
+def test_parse_limits(args):
+    test = common.ratelimit.parse_limits(args.limits)
+    log.info("Result:\n%s" % json.dumps(test, indent=4))
+
+
+def test_limiter():
+    # 5 logins per second overall, 2 at once per /24 subnet
+    limiter = common.ratelimit.limiter(
+        rate_limits=common.ratelimit.parse_limits(["5"]),
+        max_logins=common.ratelimit.parse_limits(["subnet:2"]))
+    state = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def login(address):
+        with limiter.acquire(address, {"username": "admin"}):
+            with lock:
+                state["now"] += 1
+                state["max"] = max(state["max"], state["now"])
+            time.sleep(0.5)
+            with lock:
+                state["now"] -= 1
+    start = time.time()
+    threads = []
+    for index in range(20):
+        threads.append(threading.Thread(target=login,
+                                        args=("192.0.2.%s" % index,)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.info("Result: 20 logins took (%.1f) seconds with (%s) at once"
+             % (time.time() - start, state["max"]))
+
+
+def run_tests(args):
+    if args.limits:
+        test_parse_limits(args)
+    if args.test_limiter:
+        test_limiter()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='AutoShell - Module Library Test Suite')
+    parser.add_argument(
+                        '-p', "--parse_limits",
+                        help="Limit strings to parse",
+                        metavar='[SCOPE:]VALUE',
+                        dest="limits",
+                        action='append')
+    parser.add_argument(
+                        '-l', "--test_limiter",
+                        help="Run test_limiter",
+                        dest="test_limiter",
+                        action='store_true')
+    args = parser.parse_args()
+    run_tests(args)
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+
+"""
+common_reachability_ut contains unit tests for functions in the
+common_reachability library
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+# Autoshell Libraries
+for each in os.walk(os.path.pardir):
+    sys.path.append(each[0])
+import autoshell.common as common
+
+log = logging.getLogger("shared")
+consoleHandler = logging.StreamHandler()
+fmt = """\
+%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s"""
+format = logging.Formatter(fmt)
+consoleHandler.setFormatter(format)
+log.addHandler(consoleHandler)
+log.setLevel(logging.DEBUG)
+
+
+def test_probe(args):
+    targets = []
+    for address in args.addresses:
+        targets.append((address, args.port))
+    start = time.time()
+    result = common.reachability.probe(targets, args.timeout)
+    log.info("Result (%s seconds):\n%s" % (
+        round(time.time() - start, 3), json.dumps(sorted(result), indent=4)))
+
+
+def run_tests(args):
+    if args.addresses:
+        test_probe(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='AutoShell - Module Library Test Suite',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+                        '-a', "--address",
+                        help="""Address to probe""",
+                        metavar='ADDRESS',
+                        dest="addresses",
+                        action='append')
+    parser.add_argument(
+                        '-p', "--port",
+                        help="""TCP port to probe (default 22)""",
+                        metavar='PORT',
+                        type=int,
+                        default=22,
+                        dest="port")
+    parser.add_argument(
+                        '-t', "--timeout",
+                        help="""Probe timeout in seconds (default 1)""",
+                        metavar='TIMEOUT',
+                        type=float,
+                        default=1,
+                        dest="timeout")
+    args = parser.parse_args()
+    run_tests(args)
@@ -77,6 +77,14 @@ def test_connect():
     cli._execute(con_instance, credential)
 
 
+def test_race_addresses():
+    addresses = input("Enter addresses (space seperated): ").split()
+    host_instance = common.hosts.host_class(addresses)
+    con_instance = common.hosts.connection_class(addresses, host_instance, 5)
+    result = cli._race_addresses(con_instance)
+    log.info("Result: %s (%s)" % (result, con_instance.address))
+
+
 def test_cli():
     address = input("Enter address: ")
     credentials = common.credentials.parse_credentials(None)
@@ -99,6 +107,8 @@ def run_tests(args):
         test_assemble_credential()
     if args.test_connect:
         test_connect()
+    if args.test_race_addresses:
+        test_race_addresses()
     if args.test_cli:
         test_cli()
 
@@ -122,6 +132,11 @@ if __name__ == "__main__":
                         help="Run test_connect",
                         dest="test_connect",
                         action='store_true')
+    parser.add_argument(
+                        '-r', "--test_race_addresses",
+                        help="Run test_race_addresses",
+                        dest="test_race_addresses",
+                        action='store_true')
     parser.add_argument(
                         '-x', "--test_cli",
                         help="Run test_cli",
@@ -0,0 +1,504 @@
+#!/usr/bin/python
+
+"""
+fleet_bm is a benchmark harness which starts a fleet of local fake SSH
+devices (Cisco IOS lookalikes built on paramiko) and measures end-to-end
+connect, neighbors, cmd, and crawl runs through the real autoshell entry
+point. The fake devices replay the CDP/LLDP output in testing_data and can
+be given login and command latency and a connection failure rate.
+
+Results can be appended to a JSON-lines file (--results) and compared
+against an earlier results file (--baseline) so runs from different commits
+can be compared and regressions flagged.
+
+Each device listens on its own loopback address (127.0.0.1, 127.0.0.2, ...)
+on the same port. The crawl scenario needs the devices on port 22 since
+crawled neighbors are always connected to on the default port.
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import json
+import time
+import random
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+
+# Installed Libraries
+import paramiko
+
+# Autoshell Libraries
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir))
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testing_data")
+
+log = logging.getLogger("shared")
+consoleHandler = logging.StreamHandler()
+fmt = """\
+%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s"""
+format = logging.Formatter(fmt)
+consoleHandler.setFormatter(format)
+log.addHandler(consoleHandler)
+log.setLevel(logging.INFO)
+# Keep the fake devices' transport errors (from dropped connections) quiet
+logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+
+# Username and password accepted by the fake devices
+USERNAME = "admin"
+PASSWORD = "admin"
+
+# Scenarios and the autoshell arguments used for each
+SCENARIOS = {
+    "connect": [],
+    "cmd": ["-m", "cmd", "-C", "show version"],
+    "neighbors": ["-m", "neighbors"],
+    "crawl": ["-m", "crawl", "-CO"]
+}
+
+# Python snippet used to run autoshell the same way the console script does
+BOOT = ("import sys; sys.argv[0] = 'autoshell';"
+        " from autoshell.__main__ import start; start()")
+
+# Template for the entries in generated 'show cdp neighbors detail' output
+CDP_ENTRY = """-------------------------
+Device ID: {name}
+Entry address(es):
+  IP address: {address}
+Platform: cisco WS-C3850-48P,  Capabilities: Switch IGMP
+Interface: GigabitEthernet1/0/{port},  Port ID (outgoing port): \
+GigabitEthernet1/0/48
+Holdtime : 150 sec
+
+Version :
+Cisco IOS Software, Fake Fleet Software
+
+advertisement version: 2
+Management address(es):
+  IP address: {address}
+
+"""
+
+
+def device_address(index):
+    """
+    fleet_bm.device_address returns the loopback address of a device.
+    """
+    return "127.0.%s.%s" % (index // 250, index % 250 + 1)
+
+
+class fake_device(paramiko.ServerInterface):
+    """
+    fleet_bm.fake_device handles the SSH session for one connection to a
+    device in the fleet.
+    """
+    def __init__(self, fleet, index):
+        self.fleet = fleet
+        self.index = index
+
+    def check_auth_password(self, username, password):
+        time.sleep(self.fleet.login_latency)
+        if username == USERNAME and password == PASSWORD:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        thread = threading.Thread(target=self.shell, args=(channel, ))
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def shell(self, channel):
+        """
+        fleet_bm.fake_device.shell emulates the CLI: echoing input and
+        answering each command followed by the prompt.
+        """
+        prompt = "fleet%s#" % self.index
+        channel.send("\r\n" + prompt)
+        line = ""
+        try:
+            while True:
+                data = channel.recv(1024)
+                if not data:
+                    return None
+                for char in data.decode(errors="replace"):
+                    if char not in "\r\n":
+                        line += char
+                        channel.send(char)
+                        continue
+                    output = self.fleet.answer(self.index, line.strip())
+                    line = ""
+                    channel.send("\r\n" + output.replace("\n", "\r\n")
+                                 + prompt)
+        except (EOFError, OSError):
+            return None  # Client disconnected
+
+
+class fleet:
+    """
+    fleet_bm.fleet starts and stops the listeners of all the fake devices.
+    """
+    def __init__(self, count, port, latency=0, login_latency=0,
+                 fail_rate=0):
+        self.count = count  # Number of devices
+        self.port = port  # TCP port all the devices listen on
+        self.latency = latency  # Seconds before each command is answered
+        self.login_latency = login_latency  # Seconds added to each login
+        # Chance of dropping each new connection (ie: VTY lines exhausted)
+        self.fail_rate = fail_rate
+        self.key = paramiko.RSAKey.generate(2048)
+        self._listeners = []
+        with open(os.path.join(DATA, "CDP_DETAIL")) as f:
+            self.cdp_detail = f.read()
+        with open(os.path.join(DATA, "LLDP_DETAIL")) as f:
+            self.lldp_detail = f.read()
+        with open(os.path.join(DATA, "LLDP_BRIEF")) as f:
+            self.lldp_brief = f.read()
+        self.crawl = False  # Answer CDP with the fleet topology instead
+
+    def start(self):
+        for index in range(self.count):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((device_address(index), self.port))
+            listener.listen(128)
+            self._listeners.append(listener)
+            thread = threading.Thread(target=self._accept,
+                                      args=(listener, index))
+            thread.daemon = True
+            thread.start()
+        log.info("fleet_bm.fleet.start: Started (%s) devices on port (%s)"
+                 % (self.count, self.port))
+
+    def stop(self):
+        for listener in self._listeners:
+            listener.close()
+        self._listeners = []
+
+    def _accept(self, listener, index):
+        while True:
+            try:
+                client, address = listener.accept()
+            except OSError:
+                return None  # Listener closed
+            if random.random() < self.fail_rate:
+                client.close()
+                continue
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.key)
+            try:
+                transport.start_server(server=fake_device(self, index))
+            except Exception:
+                transport.close()
+
+    def answer(self, index, command):
+        """
+        fleet_bm.fleet.answer returns the output of a command on a device.
+        """
+        if not command:
+            return ""
+        time.sleep(self.latency)
+        if command == "show version":
+            return "Cisco IOS Software, Fake Fleet Software\n"
+        if command == "show cdp neighbors detail":
+            if self.crawl:
+                return self.topology(index)
+            return self.cdp_detail
+        if command == "show lldp neighbors detail":
+            return self.lldp_detail
+        if command == "show lldp neighbors":
+            return self.lldp_brief
+        return ""
+
+    def topology(self, index):
+        """
+        fleet_bm.fleet.topology returns CDP output for the device placing
+        the fleet in a binary tree, with the first device at the root.
+        """
+        output = ""
+        neighbors = [index * 2 + 1, index * 2 + 2]
+        if index:
+            neighbors.append((index - 1) // 2)
+        for port, neighbor in enumerate(neighbors):
+            if neighbor < self.count:
+                output += CDP_ENTRY.format(name="fleet%s" % neighbor,
+                                           address=device_address(neighbor),
+                                           port=port + 1)
+        return output
+
+
+def run_autoshell(argv):
+    """
+    fleet_bm.run_autoshell runs autoshell in a new process with argv and
+    returns the seconds it took and its std.out.
+    """
+    env = dict(os.environ)
+    env.update({"PYTHONPATH": ROOT})
+    start = time.time()
+    process = subprocess.run([sys.executable, "-c", BOOT] + argv, cwd=ROOT,
+                             env=env, stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL,
+                             universal_newlines=True)
+    return time.time() - start, process.stdout
+
+
+def json_blocks(text):
+    """
+    fleet_bm.json_blocks finds the JSON lists (like the host info and
+    metrics dumps) in the std.out of autoshell.
+    """
+    decoder = json.JSONDecoder()
+    text = "\n" + text  # The first block may be at the very start
+    blocks = []
+    index = 0
+    while True:
+        index = text.find("\n[", index)
+        if index < 0:
+            return blocks
+        try:
+            block, end = decoder.raw_decode(text[index + 1:])
+            blocks.append(block)
+            index += end
+        except ValueError:
+            index += 1
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * fraction))], 4)
+
+
+def run_scenario(devices, scenario, args):
+    """
+    fleet_bm.run_scenario runs one scenario against the fleet and returns a
+    result dict.
+    """
+    devices.crawl = scenario == "crawl"
+    if scenario == "crawl":
+        # Only the root of the tree is given. The rest are crawled.
+        addresses = [device_address(0)]
+    else:
+        addresses = ["%s:%s" % (device_address(index), args.port)
+                     for index in range(args.devices)]
+    address_file = tempfile.NamedTemporaryFile("w", suffix=".txt",
+                                               delete=False)
+    address_file.write("\n".join(addresses) + "\n")
+    address_file.close()
+    argv = [address_file.name,
+            "-c", "%s:%s@cisco_ios" % (USERNAME, PASSWORD),
+            "-u", "-U"] + SCENARIOS[scenario] + args.extra
+    seconds, output = run_autoshell(argv)
+    os.remove(address_file.name)
+    hostinfo = []
+    metrics = []
+    for block in json_blocks(output):
+        if block and isinstance(block[0], dict):
+            if "enqueued" in block[0]:
+                metrics = block
+            elif "address" in block[0]:
+                hostinfo = block
+    timing = {}
+    connected = 0
+    for host in hostinfo:
+        if host.get("hostname"):
+            connected += 1
+        for entry in host.get("timing", []):
+            if entry["phase"] not in timing:
+                timing.update({entry["phase"]: []})
+            timing[entry["phase"]].append(entry["seconds"])
+    result = {
+        "commit": args.commit,
+        "scenario": scenario,
+        "devices": args.devices,
+        "latency": args.latency,
+        "login_latency": args.login_latency,
+        "fail_rate": args.fail_rate,
+        "seconds": round(seconds, 3),
+        "connected": connected,
+        "hosts_per_second": round(connected / seconds, 3),
+        "phases": {},
+        "threads": sum([each["threads"] for each in metrics])
+    }
+    for phase in timing:
+        result["phases"].update({phase: {
+            "p50": percentile(timing[phase], 0.5),
+            "p95": percentile(timing[phase], 0.95)
+        }})
+    return result
+
+
+def compare(results, baseline_file, threshold):
+    """
+    fleet_bm.compare compares the results with the most recent matching
+    results in the baseline file, logging any which are slower by more than
+    threshold (a fraction). Returns the number of regressions.
+    """
+    keys = ["scenario", "devices", "latency", "login_latency", "fail_rate"]
+    baseline = {}
+    with open(baseline_file) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                baseline.update({tuple(row[key] for key in keys): row})
+    regressions = 0
+    for result in results:
+        old = baseline.get(tuple(result[key] for key in keys))
+        if not old:
+            log.info("fleet_bm.compare: (%s) has no baseline"
+                     % result["scenario"])
+            continue
+        change = (result["seconds"] - old["seconds"]) / old["seconds"]
+        message = "fleet_bm.compare: (%s) %.3fs vs %.3fs (%s) %+.1f%%" % (
+            result["scenario"], result["seconds"], old["seconds"],
+            old["commit"], change * 100)
+        if change > threshold:
+            regressions += 1
+            log.warning(message + " REGRESSION")
+        else:
+            log.info(message)
+    return regressions
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(args):
+    if not args.commit:
+        args.commit = current_commit()
+    scenarios = args.scenarios or ["connect", "cmd", "neighbors", "crawl"]
+    if "crawl" in scenarios and args.port != 22:
+        log.warning("fleet_bm.run_benchmarks:\
+ Skipping crawl scenario. It needs the fleet on port 22 ('-p 22')")
+        scenarios.remove("crawl")
+    devices = fleet(args.devices, args.port, args.latency,
+                    args.login_latency, args.fail_rate)
+    devices.start()
+    results = []
+    try:
+        for scenario in scenarios:
+            for repeat in range(args.repeat):
+                result = run_scenario(devices, scenario, args)
+                log.info("fleet_bm.run_benchmarks: Result:\n%s"
+                         % json.dumps(result, indent=4))
+                results.append(result)
+    finally:
+        devices.stop()
+    if args.results:
+        with open(args.results, "a") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    if args.baseline:
+        if compare(results, args.baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='AutoShell - Simulated Fleet Benchmarks',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+                        '-n', "--devices",
+                        help="Number of fake devices (default 20)",
+                        metavar='COUNT',
+                        type=int,
+                        default=20,
+                        dest="devices")
+    parser.add_argument(
+                        '-p', "--port",
+                        help="TCP port for the devices (default 2222)",
+                        metavar='PORT',
+                        type=int,
+                        default=2222,
+                        dest="port")
+    parser.add_argument(
+                        '-s', "--scenario",
+                        help="""Scenario to run (default is all of them)
+    Choices: %s""" % ", ".join(SCENARIOS),
+                        metavar='SCENARIO',
+                        choices=list(SCENARIOS),
+                        dest="scenarios",
+                        action='append')
+    parser.add_argument(
+                        '-l', "--latency",
+                        help="Seconds before each command is answered",
+                        metavar='SECONDS',
+                        type=float,
+                        default=0.05,
+                        dest="latency")
+    parser.add_argument(
+                        '-L', "--login_latency",
+                        help="Seconds added to each login",
+                        metavar='SECONDS',
+                        type=float,
+                        default=0.1,
+                        dest="login_latency")
+    parser.add_argument(
+                        '-f', "--fail_rate",
+                        help="Chance (0 to 1) of dropping a new connection",
+                        metavar='RATE',
+                        type=float,
+                        default=0,
+                        dest="fail_rate")
+    parser.add_argument(
+                        '-r', "--repeat",
+                        help="Times to run each scenario (default 1)",
+                        metavar='COUNT',
+                        type=int,
+                        default=1,
+                        dest="repeat")
+    parser.add_argument(
+                        '-o', "--results",
+                        help="JSON-lines file to append the results to",
+                        metavar='FILE',
+                        dest="results")
+    parser.add_argument(
+                        '-b', "--baseline",
+                        help="Results file from an earlier run to compare to",
+                        metavar='FILE',
+                        dest="baseline")
+    parser.add_argument(
+                        '-t', "--threshold",
+                        help="Slowdown (0 to 1) flagged as a regression",
+                        metavar='FRACTION',
+                        type=float,
+                        default=0.2,
+                        dest="threshold")
+    parser.add_argument(
+                        '-c', "--commit",
+                        help="Label for the results (default is git HEAD)",
+                        metavar='LABEL',
+                        dest="commit")
+    parser.add_argument(
+                        '-x', "--extra",
+                        help="""Extra argument passed to autoshell
+    Example: -x=-ch -x=2""",
+                        metavar='ARG',
+                        default=[],
+                        dest="extra",
+                        action='append')
+    args = parser.parse_args()
+    run_benchmarks(args)
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+
+"""
+import_bm is a benchmark of AutoShell's start-up time. Each case is run in
+a new Python process (so nothing is already imported) several times, and
+the best time is reported after taking away the start-up time of Python
+itself. Each case also checks that the heavy libraries which it should not
+need (netmiko, paramiko, jinja2) were not imported.
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir))
+
+log = logging.getLogger("shared")
+consoleHandler = logging.StreamHandler()
+fmt = """\
+%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s"""
+format = logging.Formatter(fmt)
+consoleHandler.setFormatter(format)
+log.addHandler(consoleHandler)
+log.setLevel(logging.INFO)
+
+
+# Heavy libraries checked for after each case
+HEAVY = ["netmiko", "paramiko", "jinja2"]
+
+# Python snippet which reports the heavy libraries imported by a case.
+#  Printed from atexit since the CLI cases exit through argparse.
+REPORT = """
+import sys, atexit
+atexit.register(lambda: sys.stderr.write(
+    "\\nIMPORTED:%s\\n" % ",".join(m for m in {heavy} if m in sys.modules)))
+""".format(heavy=HEAVY)
+
+# Each case: (name, Python code, heavy libraries it is allowed to import)
+CASES = [
+    ("import autoshell", "import autoshell", []),
+    ("import autoshell.common", "import autoshell.common", []),
+    ("autoshell -h", "import sys; sys.argv = ['autoshell', '-h'];"
+     " from autoshell.__main__ import start; start()", []),
+    ("autoshell -v", "import sys; sys.argv = ['autoshell', '-v'];"
+     " from autoshell.__main__ import start; start()",
+     ["netmiko", "paramiko"]),
+    ("import connectors", "import autoshell.connectors",
+     ["netmiko", "paramiko"]),
+]
+
+
+def run_case(code):
+    """
+    import_bm.run_case runs code in a new Python process and returns the
+    seconds it took and the heavy libraries it imported.
+    """
+    env = dict(os.environ)
+    env.update({"PYTHONPATH": ROOT})
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-c", REPORT + code],
+                             cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, universal_newlines=True)
+    seconds = time.perf_counter() - start
+    imported = []
+    for line in process.stderr.splitlines():
+        if line.startswith("IMPORTED:") and line[9:]:
+            imported = line[9:].split(",")
+    return seconds, imported
+
+
+def run_benchmarks(args):
+    # Python's own start-up time is taken away from each case
+    python = min([run_case("pass")[0] for each in range(args.repeat)])
+    results = []
+    failures = 0
+    for name, code, allowed in CASES:
+        times = []
+        for each in range(args.repeat):
+            seconds, imported = run_case(code)
+            times.append(seconds)
+        unexpected = [lib for lib in imported if lib not in allowed]
+        if unexpected:
+            log.error("import_bm.run_benchmarks:\
+ (%s) imported (%s)" % (name, ", ".join(unexpected)))
+            failures += 1
+        results.append({
+            "case": name,
+            "milliseconds": round((min(times) - python) * 1000, 1),
+            "imported": imported
+        })
+    log.info("Python start-up: %.1f ms" % (python * 1000))
+    for result in results:
+        log.info("%-26s %8.1f ms   imported: %s" % (
+            result["case"], result["milliseconds"],
+            ", ".join(result["imported"]) or "-"))
+    if args.results:
+        with open(args.results, "a") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='AutoShell - Start-Up Time Benchmarks')
+    parser.add_argument(
+                        '-r', "--repeat",
+                        help="Runs of each case, keeping the best (default 5)",
+                        metavar='COUNT',
+                        type=int,
+                        default=5,
+                        dest="repeat")
+    parser.add_argument(
+                        '-o', "--results",
+                        help="JSON-lines file to append the results to",
+                        metavar='FILE',
+                        dest="results")
+    args = parser.parse_args()
+    run_benchmarks(args)
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+"""
+modules_cmd_ut contains unit tests for the output files of the cmd module
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+
+# Autoshell Libraries
+for each in os.walk(os.path.pardir):
+    sys.path.append(each[0])
+import autoshell.modules.cmd as cmd
+
+log = logging.getLogger("modules")
+consoleHandler = logging.StreamHandler()
+fmt = """\
+%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s"""
+format = logging.Formatter(fmt)
+consoleHandler.setFormatter(format)
+log.addHandler(consoleHandler)
+log.setLevel(logging.INFO)
+
+
+class fake_host:
+    """
+    modules_cmd_ut.fake_host has the host attributes used by the output
+    files.
+    """
+    def __init__(self, index):
+        self.hostname = "router%s" % index
+        self.address = "10.0.%s.%s" % (index // 256, index % 256)
+        self.info = {"hostname": self.hostname, "address": self.address}
+
+    def get_address(self):
+        return self.address
+
+    def update_info(self):
+        pass
+
+
+def test_shared_file(count, threads, lines):
+    # Write a block for each of COUNT hosts into one file from many
+    #  threads, then check that no blocks were interleaved
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "output.txt")
+    out_files = cmd.output_files([path], None)
+    hosts = [fake_host(index) for index in range(count)]
+    output = "\n".join(["show line %s" % line for line in range(lines)])
+
+    def worker(chunk):
+        for host in chunk:
+            out_files.write(host, cmd.wrap_output(host, output, "show run"))
+    start = time.time()
+    workers = [threading.Thread(target=worker, args=(hosts[each::threads],))
+               for each in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    queued = time.time() - start
+    out_files.close_all()
+    log.info("Result: Queued (%s) blocks in (%.3f) seconds and wrote them\
+ in (%.3f) seconds" % (count, queued, time.time() - start))
+    with open(path) as f:
+        data = f.read()
+    # Walk through the file block by block. Each block must be exactly the
+    #  one written for the host named in its header.
+    blocks = dict([(host.hostname, cmd.wrap_output(host, output, "show run"))
+                   for host in hosts])
+    broken = 0
+    position = 0
+    while position < len(data):
+        # Blocks start with three newlines, then the header line
+        header = data[position + 3:data.find("\n", position + 3)]
+        block = blocks.pop(header.strip("#").split()[0], None)
+        if block is None or not data.startswith(block, position):
+            broken += 1
+            break
+        position += len(block)
+    broken += len(blocks)  # Any blocks which were not found
+    log.info("Result: (%s) of (%s) blocks were broken or missing"
+             % (broken, count))
+
+
+def test_per_host_files(count):
+    # Write a block into a Jinja2-named file for each host
+    directory = tempfile.mkdtemp()
+    out_files = cmd.output_files(
+        None, [os.path.join(directory, "{{hostname}}.txt")])
+    for index in range(count):
+        host = fake_host(index)
+        out_files.write(host, "output of %s\n" % host.hostname)
+    out_files.close_all()
+    log.info("Result: Wrote (%s) per-host files into (%s)"
+             % (len(os.listdir(directory)), directory))
+
+
+def run_tests(args):
+    if args.shared_file:
+        test_shared_file(args.shared_file, args.threads, args.lines)
+    if args.per_host_files:
+        test_per_host_files(args.per_host_files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='AutoShell - Module Library Test Suite',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+                        '-s', "--shared_file",
+                        help="Run test_shared_file with COUNT hosts",
+                        metavar='COUNT',
+                        type=int,
+                        dest="shared_file")
+    parser.add_argument(
+                        '-t', "--threads",
+                        help="Threads writing hosts (default 10)",
+                        metavar='COUNT',
+                        type=int,
+                        default=10,
+                        dest="threads")
+    parser.add_argument(
+                        '-l', "--lines",
+                        help="Lines of output in each block (default 50)",
+                        metavar='COUNT',
+                        type=int,
+                        default=50,
+                        dest="lines")
+    parser.add_argument(
+                        '-p', "--per_host_files",
+                        help="Run test_per_host_files with COUNT hosts",
+                        metavar='COUNT',
+                        type=int,
+                        dest="per_host_files")
+    args = parser.parse_args()
+    run_tests(args)
@@ -0,0 +1,322 @@
+#!/usr/bin/python
+
+"""
+neighbors_scrapers_bm contains benchmarks for the Cisco and HP neighbor
+scrapers. Synthetic neighbor tables (10 to 10,000 neighbors by default) are
+generated for each scraper and the parse time and peak memory of each run
+are measured. The per-neighbor cost at each size is compared with the
+smallest size to check that the scrapers scale linearly.
+"""
+
+
+# Built-In Libraries
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tracemalloc
+
+# Autoshell Libraries
+for each in os.walk(os.path.pardir):
+    sys.path.append(each[0])
+import autoshell.cisco.neighbors.cli.scrapers as cisco_scrapers
+import autoshell.hp.neighbors.cli.scrapers as hp_scrapers
+
+log = logging.getLogger("modules")
+consoleHandler = logging.StreamHandler()
+fmt = """\
+%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s"""
+format = logging.Formatter(fmt)
+consoleHandler.setFormatter(format)
+log.addHandler(consoleHandler)
+log.setLevel(logging.INFO)
+
+
+# Neighbor table sizes benchmarked by default
+SIZES = [10, 100, 1000, 10000]
+
+# Templates for a single neighbor in the output of each command. Formatted
+#  with the neighbor number (index), an address (ip), and a MAC (mac).
+CISCO_CDP_DETAIL = """-------------------------
+Device ID: SWITCH{index}
+Entry address(es):
+  IP address: {ip}
+Platform: cisco WS-C3850-48P,  Capabilities: Switch IGMP
+Interface: GigabitEthernet{slot}/0/{port},  Port ID (outgoing port): \
+GigabitEthernet1/0/48
+Holdtime : 129 sec
+
+Version :
+Cisco IOS Software, IOS-XE Software, Catalyst L3 Switch Software
+Technical Support: http://www.cisco.com/techsupport
+Copyright (c) 1986-2018 by Cisco Systems, Inc.
+
+advertisement version: 2
+Duplex: full
+Management address(es):
+  IP address: {ip}
+
+"""
+
+CISCO_LLDP_DETAIL = """------------------------------------------------
+Chassis id: {mac}
+Port id: Gi1/0/48
+Port Description: GigabitEthernet1/0/48
+System Name: SWITCH{index}
+
+System Description:
+Cisco IOS Software, IOS-XE Software, Catalyst L3 Switch Software
+Copyright (c) 1986-2018 by Cisco Systems, Inc.
+
+Time remaining: 104 seconds
+System Capabilities: B,R
+Enabled Capabilities: B
+Management Addresses:
+    IP: {ip}
+Auto Negotiation - supported, enabled
+Media Attachment Unit type: 30
+Vlan ID: 1
+
+"""
+
+CISCO_LLDP_BRIEF_HEADER = """\
+Capability codes:
+    (R) Router, (B) Bridge, (T) Telephone, (C) DOCSIS Cable Device
+    (W) WLAN Access Point, (P) Repeater, (S) Station, (O) Other
+
+Device ID           Local Intf     Hold-time  Capability      Port ID
+"""
+
+CISCO_LLDP_BRIEF = \
+    "{name:<20}{localif:<15}120        B,R             Gi1/0/48\n"
+
+# HP devices separate (rather than start) each neighbor with this line
+HP_SEPARATOR = "-" * 78
+
+HP_LLDP_DETAIL = """
+  Local Port   : {port}
+  ChassisType  : mac-address
+  ChassisId    : {mac}
+  PortType     : local
+  PortId       : {port}
+  SysName      : SWITCH{index}
+  System Descr : HP J9727A 2920-24G-PoE+ Switch, revision WB.16.02.0012
+  PortDescr    : {port}
+
+  System Capabilities Supported  : bridge, router
+  System Capabilities Enabled    : bridge
+
+  Remote Management Address
+     Type    : ipv4
+     Address : {ip}
+"""
+
+HP_CDP_DETAIL = """
+  Port : {port}
+  Device ID : SWITCH{index}
+  Address Type : IP
+  Address      : {ip}
+  Platform     : HP J9727A 2920-24G-PoE+ Switch
+  Capability   : Switch
+  Device Port  : {port}
+  Version      : WB.16.02.0012
+"""
+
+
+def _fields(index):
+    """
+    neighbors_scrapers_bm._fields returns the template values for neighbor
+    number index.
+    """
+    return {
+        "index": index,
+        "ip": "10.%s.%s.%s" % (index // 65536 % 256, index // 256 % 256,
+                               index % 256),
+        "mac": "%04x.%04x.%04x" % (index // 4294967296 % 65536,
+                                   index // 65536 % 65536, index % 65536),
+        "slot": index // 48 + 1,
+        "port": index % 48 + 1
+    }
+
+
+def cisco_cdp_detail(count):
+    return "".join([CISCO_CDP_DETAIL.format(**_fields(index))
+                    for index in range(count)])
+
+
+def cisco_lldp_detail(count):
+    return "".join([CISCO_LLDP_DETAIL.format(**_fields(index))
+                    for index in range(count)])
+
+
+def cisco_lldp_brief(count):
+    lines = []
+    for index in range(count):
+        fields = _fields(index)
+        lines.append(CISCO_LLDP_BRIEF.format(
+            name="SWITCH%s" % index,
+            localif="Gi%s/0/%s" % (fields["slot"], fields["port"])))
+    return CISCO_LLDP_BRIEF_HEADER + "".join(lines) + \
+        "\nTotal entries displayed: %s\n" % count
+
+
+def hp_lldp_detail(count):
+    return HP_SEPARATOR.join([HP_LLDP_DETAIL.format(**_fields(index))
+                              for index in range(count)])
+
+
+def hp_cdp_detail(count):
+    return HP_SEPARATOR.join([HP_CDP_DETAIL.format(**_fields(index))
+                              for index in range(count)])
+
+
+# Each benchmark: (name, output generator, scraper)
+BENCHMARKS = [
+    ("cisco_ios_cdp_scraper", cisco_cdp_detail,
+     cisco_scrapers.cisco_ios_cdp_scraper),
+    ("cisco_ios_lldp_de_scraper", cisco_lldp_detail,
+     cisco_scrapers.cisco_ios_lldp_de_scraper),
+    ("cisco_ios_lldp_br_scraper", cisco_lldp_brief,
+     cisco_scrapers.cisco_ios_lldp_br_scraper),
+    ("hp_lldp_de_scraper", hp_lldp_detail,
+     hp_scrapers.hp_lldp_de_scraper),
+    ("hp_cdp_scraper", hp_cdp_detail,
+     hp_scrapers.hp_cdp_scraper),
+]
+
+
+def measure(scraper, data, repeat):
+    """
+    neighbors_scrapers_bm.measure runs the scraper on data and returns the
+    best time of repeat runs, the peak memory allocated during a run, and
+    the number of neighbors returned.
+    """
+    best = None
+    for attempt in range(repeat):
+        start = time.perf_counter()
+        result = scraper(data)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    # Memory is measured in a separate run since tracing slows it down
+    tracemalloc.start()
+    scraper(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, len(result)
+
+
+def run_benchmark(name, generator, scraper, args):
+    """
+    neighbors_scrapers_bm.run_benchmark benchmarks one scraper at each
+    size and checks its scaling. Returns a list of result dicts and the
+    number of scaling failures.
+    """
+    results = []
+    failures = 0
+    for size in args.sizes:
+        data = generator(size)
+        seconds, peak, found = measure(scraper, data, args.repeat)
+        if found != size:
+            log.error("neighbors_scrapers_bm.run_benchmark:\
+ (%s) found (%s) of (%s) neighbors" % (name, found, size))
+            failures += 1
+        results.append({
+            "scraper": name,
+            "neighbors": size,
+            "bytes": len(data),
+            "seconds": round(seconds, 6),
+            "peak_bytes": peak,
+            "us_per_neighbor": round(seconds / size * 1000000, 3),
+            "peak_bytes_per_neighbor": round(peak / size, 1)
+        })
+    # Compare the per-neighbor costs with the smallest size
+    base = results[0]
+    for result in results[1:]:
+        time_ratio = result["us_per_neighbor"] / base["us_per_neighbor"]
+        mem_ratio = result["peak_bytes_per_neighbor"] / \
+            base["peak_bytes_per_neighbor"]
+        result.update({"time_ratio": round(time_ratio, 2),
+                       "memory_ratio": round(mem_ratio, 2)})
+        if time_ratio > args.tolerance or mem_ratio > args.tolerance:
+            log.error("neighbors_scrapers_bm.run_benchmark:\
+ (%s) is not linear at (%s) neighbors. Per-neighbor time is (%.2f)x and\
+ memory is (%.2f)x that of (%s) neighbors"
+                      % (name, result["neighbors"], time_ratio, mem_ratio,
+                         base["neighbors"]))
+            failures += 1
+    return results, failures
+
+
+def run_benchmarks(args):
+    results = []
+    failures = 0
+    for name, generator, scraper in BENCHMARKS:
+        if args.scrapers and name not in args.scrapers:
+            continue
+        log.info("neighbors_scrapers_bm.run_benchmarks: Running (%s)" % name)
+        scraper_results, scraper_failures = run_benchmark(
+            name, generator, scraper, args)
+        results += scraper_results
+        failures += scraper_failures
+    log.info("%-26s %9s %10s %12s %10s %8s" % (
+        "Scraper", "Neighbors", "Seconds", "us/Neighbor", "Peak KB",
+        "Ratio"))
+    for result in results:
+        log.info("%-26s %9s %10.4f %12.2f %10.1f %8s" % (
+            result["scraper"], result["neighbors"], result["seconds"],
+            result["us_per_neighbor"], result["peak_bytes"] / 1024.0,
+            result.get("time_ratio", "")))
+    if args.results:
+        with open(args.results, "a") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    if failures:
+        log.error("neighbors_scrapers_bm.run_benchmarks:\
+ (%s) checks failed" % failures)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='AutoShell - Neighbor Scraper Benchmarks')
+    parser.add_argument(
+                        '-s', "--scraper",
+                        help="Scraper to benchmark (default is all of them)",
+                        metavar='SCRAPER',
+                        choices=[each[0] for each in BENCHMARKS],
+                        dest="scrapers",
+                        action='append')
+    parser.add_argument(
+                        '-n', "--sizes",
+                        help="Neighbor table sizes\
+ (default 10 100 1000 10000)",
+                        metavar='COUNT',
+                        type=int,
+                        nargs='+',
+                        default=SIZES,
+                        dest="sizes")
+    parser.add_argument(
+                        '-r', "--repeat",
+                        help="Runs at each size, keeping the best (default 3)",
+                        metavar='COUNT',
+                        type=int,
+                        default=3,
+                        dest="repeat")
+    parser.add_argument(
+                        '-t', "--tolerance",
+                        help="Largest allowed growth in per-neighbor cost\
+ (default 3)",
+                        metavar='FACTOR',
+                        type=float,
+                        default=3.0,
+                        dest="tolerance")
+    parser.add_argument(
+                        '-o', "--results",
+                        help="JSON-lines file to append the results to",
+                        metavar='FILE',
+                        dest="results")
+    args = parser.parse_args()
+    run_benchmarks(args)